@@ -9,8 +9,48 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from api.http_client import get_http_client  # noqa: E402  (needs configured settings)
+from api.lifespan import LifespanApplication  # noqa: E402
+from api.local_cache import TwoTierCache  # noqa: E402
+from api.redis_client import get_redis  # noqa: E402
+from weather.views import AsyncWeatherView  # noqa: E402
+from weather.warmup import WarmupScheduler  # noqa: E402
+
+
+async def start_redis():
+    """Builds the redis client on startup instead of on import, and starts the local cache."""
+
+    redis = get_redis()
+    if isinstance(redis, TwoTierCache):
+        await redis.start()
+
+
+async def close_redis():
+    # pending request counts of the warm-up ranking are written out first
+    await AsyncWeatherView.frequency_tracker.aclose()
+    redis = get_redis()
+    if isinstance(redis, TwoTierCache):
+        await redis.aclose()
+
+
+http_client = get_http_client()
+
+on_startup = [http_client.start, start_redis]
+on_shutdown = [http_client.aclose, close_redis]
+if settings.WARMUP_SCHEDULER_ENABLED:
+    warmup_scheduler = WarmupScheduler()
+    on_startup.append(warmup_scheduler.start)
+    on_shutdown.insert(0, warmup_scheduler.aclose)
+
+application = LifespanApplication(
+    django_application,
+    on_startup=on_startup,
+    on_shutdown=on_shutdown,
+)
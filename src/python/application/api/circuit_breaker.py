@@ -0,0 +1,46 @@
+import time
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker which opens after `failure_threshold` consecutive failures.
+
+    While open, `allow` returns `False` for `cooldown_seconds` so callers skip the failing
+    dependency instead of waiting on it. Afterwards calls are let through again and the first
+    success closes the circuit, while another failure opens it for a new cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.opened_at = None
+
+    def __repr__(self):
+        return f'CircuitBreaker(failure_threshold={self.failure_threshold}, cooldown_seconds={self.cooldown_seconds})'
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.cooldown_seconds
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until calls are let through again, `0` while the circuit is closed."""
+
+        if not self.is_open:
+            return 0.0
+        return self.cooldown_seconds - (time.monotonic() - self.opened_at)
+
+    def allow(self) -> bool:
+        """To check a call may be made."""
+
+        return not self.is_open
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
@@ -0,0 +1,267 @@
+"""
+Value codecs for redis.
+
+JSON values are stored without a header so every version of the application can read them.
+Other formats start with a one byte header below `0x20`, which can never start a JSON document,
+so old and new formats coexist in the same database and readers pick the decoder per value.
+
+Values of any codec can also be compressed, see `ValueCompression`. A compressed value starts with
+the header of its compressor and holds the encoded value, which is decompressed before it is decoded.
+"""
+import json
+import zlib
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+MSGPACK_HEADER = b'\x01'
+ZLIB_HEADER = b'\x02'
+LZ4_HEADER = b'\x03'
+ZSTD_HEADER = b'\x04'
+
+
+class UnknownFormatError(ValueError):
+    """Raised when a stored value has a header this version does not know."""
+
+
+def dumps_json(value) -> bytes:
+    """Encodes a value to JSON bytes with the fastest available library."""
+
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value).encode()
+
+
+def loads_json(data: bytes):
+    """Decodes JSON bytes with the fastest available library."""
+
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class Codec:
+    """Base class of all value codecs."""
+
+    name = ''
+    header = b''
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}()'
+
+    def encode(self, value) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes):
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """Plain JSON using the standard library, the format every version can read."""
+
+    name = 'json'
+
+    def encode(self, value) -> bytes:
+        return json.dumps(value).encode()
+
+    def decode(self, data: bytes):
+        return json.loads(data)
+
+
+class OrjsonCodec(Codec):
+    """JSON using orjson, byte compatible with `JsonCodec`."""
+
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise ValueError('The `orjson` codec requires the orjson package.')
+
+    def encode(self, value) -> bytes:
+        return orjson.dumps(value)
+
+    def decode(self, data: bytes):
+        return orjson.loads(data)
+
+
+class MsgpackCodec(Codec):
+    """Compact binary values using msgpack."""
+
+    name = 'msgpack'
+    header = MSGPACK_HEADER
+
+    def __init__(self):
+        if msgpack is None:
+            raise ValueError('The `msgpack` codec requires the msgpack package.')
+
+    def encode(self, value) -> bytes:
+        return self.header + msgpack.packb(value)
+
+    def decode(self, data: bytes):
+        return msgpack.unpackb(data[1:])
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec, OrjsonCodec, MsgpackCodec)}
+
+
+def get_codec(name: str) -> Codec:
+    """Returns the codec registered under the given `name`."""
+
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f'Unknown codec: {name}. Must be one of {", ".join(CODECS)}.')
+
+
+class Compressor:
+    """Base class of all value compressors."""
+
+    name = ''
+    header = b''
+    default_level = None
+
+    def __init__(self, level: int = None):
+        self.level = self.default_level if level is None else level
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(level={self.level})'
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+
+class ZlibCompressor(Compressor):
+    """zlib of the standard library, the best ratio of the compressors always available."""
+
+    name = 'zlib'
+    header = ZLIB_HEADER
+    default_level = 6
+
+    def compress(self, data: bytes) -> bytes:
+        return self.header + zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data[1:])
+
+
+class Lz4Compressor(Compressor):
+    """LZ4 frames, the fastest to compress and decompress with a lower ratio."""
+
+    name = 'lz4'
+    header = LZ4_HEADER
+    default_level = 0
+
+    def __init__(self, level: int = None):
+        if lz4 is None:
+            raise ValueError('The `lz4` compression requires the lz4 package.')
+        super().__init__(level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.header + lz4.frame.compress(data, compression_level=self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lz4.frame.decompress(data[1:])
+
+
+class ZstdCompressor(Compressor):
+    """Zstandard, about the ratio of zlib at a multiple of its speed."""
+
+    name = 'zstd'
+    header = ZSTD_HEADER
+    default_level = 3
+
+    def __init__(self, level: int = None):
+        if zstandard is None:
+            raise ValueError('The `zstd` compression requires the zstandard package.')
+        super().__init__(level)
+        self._compressor = zstandard.ZstdCompressor(level=self.level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.header + self._compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data[1:])
+
+
+COMPRESSORS = {compressor.name: compressor for compressor in (ZlibCompressor, Lz4Compressor, ZstdCompressor)}
+COMPRESSOR_HEADERS = {compressor.header: compressor for compressor in COMPRESSORS.values()}
+# the compressors reading the values, by their header
+_decompressors = {}
+
+
+def get_compressor(name: str, level: int = None):
+    """Returns the compressor registered under the given `name`, `None` for `none`."""
+
+    if name == 'none':
+        return None
+    try:
+        return COMPRESSORS[name](level)
+    except KeyError:
+        raise ValueError(f'Unknown compression: {name}. Must be one of none, {", ".join(COMPRESSORS)}.')
+
+
+class ValueCompression:
+    """Compresses the encoded values of at least `threshold` bytes, if that makes them smaller."""
+
+    def __init__(self, compressor: Compressor = None, threshold: int = 1024):
+        self.compressor = compressor
+        self.threshold = threshold
+
+    def __repr__(self):
+        return f'ValueCompression(compressor={self.compressor}, threshold={self.threshold})'
+
+    def pack(self, data: bytes) -> bytes:
+        if self.compressor is None or len(data) < self.threshold:
+            return data
+        compressed = self.compressor.compress(data)
+        return compressed if len(compressed) < len(data) else data
+
+
+def decompress_value(data: bytes) -> bytes:
+    """Returns the encoded value of a stored value, decompressed if it was compressed."""
+
+    header = data[:1]
+    if header not in COMPRESSOR_HEADERS:
+        return data
+    try:
+        if header not in _decompressors:
+            _decompressors[header] = COMPRESSOR_HEADERS[header]()
+        return _decompressors[header].decompress(data)
+    except Exception as e:
+        # e.g. written by a worker with an optional compression package this one does not have
+        raise UnknownFormatError(f'Cannot decompress a {COMPRESSOR_HEADERS[header].name} value: {e}')
+
+
+def decode_value(data: bytes):
+    """Decodes a stored value written by any of the codecs, compressed or not."""
+
+    data = decompress_value(data)
+    if data[:1] == MSGPACK_HEADER:
+        if msgpack is None:
+            # written by a worker with `REDIS_VALUE_CODEC=msgpack` while this one does not have msgpack
+            raise UnknownFormatError('Cannot decode a msgpack value without the msgpack package.')
+        return MsgpackCodec().decode(data)
+    if data[:1] and data[0] < 0x20 and data[:1] not in b'\t\n\r':
+        raise UnknownFormatError(f'Unknown value header: {data[:1]!r}.')
+    return loads_json(data)
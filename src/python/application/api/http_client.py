@@ -0,0 +1,100 @@
+import httpx
+from django.conf import settings
+
+from api.loop_local import LoopLocal
+from api.singletonmeta import SingletonMeta
+
+
+class HttpClient(metaclass=SingletonMeta):
+    """
+    Process wide pooled `httpx.AsyncClient` for upstream requests.
+
+    The client is opened on ASGI startup and closed on shutdown so TCP/TLS connections are
+    kept alive and reused between requests instead of being handshaken on every cache miss.
+    """
+
+    def __init__(self):
+        self.limits = httpx.Limits(
+            max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+        )
+        self.timeout = httpx.Timeout(
+            connect=settings.UPSTREAM_CONNECT_TIMEOUT,
+            read=settings.UPSTREAM_READ_TIMEOUT,
+            write=settings.UPSTREAM_WRITE_TIMEOUT,
+            pool=settings.UPSTREAM_POOL_TIMEOUT,
+        )
+        self.http2 = settings.UPSTREAM_HTTP2
+        self.connections_created = 0
+        # connections are bound to the loop they were opened on, so each loop has its own client,
+        # closed with its loop
+        self._clients = LoopLocal(self._make_client, close=lambda client: client.aclose())
+
+    def __repr__(self):
+        return f'HttpClient(http2={self.http2}, limits={self.limits}, timeout={self.timeout})'
+
+    async def start(self):
+        """Open the pooled client on the running event loop."""
+
+        self._clients.get()
+
+    async def aclose(self):
+        """Close the pooled client of the running event loop and all of its connections."""
+
+        await self._clients.aclose()
+
+    def _make_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Returns the pooled client for the running event loop.
+
+        Connections are bound to the loop they were opened on, so servers without a lifespan
+        (e.g. `runserver`, which runs each async view on its own loop) get a fresh client, which
+        is closed when its loop is torn down.
+        """
+
+        client = self._clients.get()
+        if client.is_closed:
+            self._clients.discard()
+            client = self._clients.get()
+        return client
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        """Send a GET request through the pooled client."""
+
+        extensions = kwargs.pop('extensions', {})
+        extensions.setdefault('trace', self._trace)
+        return await self.client.get(url, extensions=extensions, **kwargs)
+
+    async def _trace(self, event_name: str, info: dict):
+        if event_name == 'connection.connect_tcp.complete':
+            self.connections_created += 1
+
+    def pool_stats(self) -> dict:
+        """Returns the number of in use, idle and created upstream connections of the clients of all loops."""
+
+        connections = []
+        for client in self._clients.values():
+            if not client.is_closed:
+                # httpx does not expose its httpcore pool publicly, custom transports have none.
+                pool = getattr(client._transport, '_pool', None)
+                connections.extend(pool.connections if pool is not None else [])
+        idle = sum(1 for connection in connections if connection.is_idle())
+        in_use = sum(1 for connection in connections if not connection.is_idle() and not connection.is_closed())
+        return {
+            'in_use': in_use,
+            'idle': idle,
+            'created': self.connections_created,
+            'max_connections': self.limits.max_connections,
+            'max_keepalive_connections': self.limits.max_keepalive_connections,
+        }
+
+
+def get_http_client() -> HttpClient:
+    """ get the pooled upstream http client to use. """
+
+    return HttpClient()
@@ -0,0 +1,181 @@
+"""
+Bulk invalidation of redis keys matching a pattern.
+
+Keys are found with `SCAN` and a large `COUNT`, so the server is never blocked like with `KEYS`,
+and deleted with one `UNLINK` per batch of keys instead of one per key. The optional Lua
+variant runs a `SCAN` step and the `UNLINK` of its keys on the server, one round trip per step.
+Both stop once the time budget is used up and report the cursor to resume from.
+
+A Redis Cluster has one cursor per primary, its keys are deleted from a `scan_iter` over all
+primaries instead, see `invalidate_keys`. That run can not be resumed.
+"""
+import time
+from dataclasses import (
+    dataclass,
+    field,
+)
+from typing import (
+    Callable,
+    Optional,
+)
+
+# one SCAN step plus the UNLINK of the matched keys, returns the next cursor and the deleted count
+SCAN_UNLINK_SCRIPT = """
+local unpack = table.unpack or unpack
+local result = redis.call('SCAN', ARGV[1], 'MATCH', ARGV[2], 'COUNT', ARGV[3])
+local deleted = 0
+if #result[2] > 0 then
+    deleted = redis.call('UNLINK', unpack(result[2]))
+end
+return {result[1], deleted}
+"""
+
+
+@dataclass
+class InvalidationResult:
+    """Progress of a pattern invalidation."""
+
+    pattern: str
+    matched: int = 0
+    deleted: int = 0
+    cursor: int = 0
+    complete: bool = False
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+
+ProgressCallback = Optional[Callable[[InvalidationResult], None]]
+
+
+def _batches(keys: list, batch_size: int):
+    for index in range(0, len(keys), batch_size):
+        yield keys[index:index + batch_size]
+
+
+def _is_done(result: InvalidationResult, time_budget: Optional[float]) -> bool:
+    if result.cursor == 0:
+        result.complete = True
+        return True
+    return bool(time_budget) and result.elapsed >= time_budget
+
+
+def invalidate_pattern(
+        client,
+        match: str,
+        scan_count: int = 1000,
+        batch_size: int = 500,
+        time_budget: float = None,
+        progress: ProgressCallback = None,
+        use_lua: bool = False,
+        cursor: int = 0,
+) -> InvalidationResult:
+    """Deletes all keys matching the glob `match` with a blocking redis client."""
+
+    result = InvalidationResult(pattern=match)
+    while True:
+        if use_lua:
+            cursor, deleted = client.eval(SCAN_UNLINK_SCRIPT, 0, cursor, match, scan_count)
+            result.matched += deleted
+            result.deleted += deleted
+        else:
+            cursor, keys = client.scan(cursor, match=match, count=scan_count)
+            result.matched += len(keys)
+            for batch in _batches(keys, batch_size):
+                result.deleted += client.unlink(*batch)
+        # the progress reports the cursor to resume from
+        result.cursor = cursor = int(cursor)
+        if progress is not None:
+            progress(result)
+        if _is_done(result, time_budget):
+            return result
+
+
+async def async_invalidate_pattern(
+        client,
+        match: str,
+        scan_count: int = 1000,
+        batch_size: int = 500,
+        time_budget: float = None,
+        progress: ProgressCallback = None,
+        use_lua: bool = False,
+        cursor: int = 0,
+) -> InvalidationResult:
+    """Deletes all keys matching the glob `match` with an asyncio redis client."""
+
+    result = InvalidationResult(pattern=match)
+    while True:
+        if use_lua:
+            cursor, deleted = await client.eval(SCAN_UNLINK_SCRIPT, 0, cursor, match, scan_count)
+            result.matched += deleted
+            result.deleted += deleted
+        else:
+            cursor, keys = await client.scan(cursor, match=match, count=scan_count)
+            result.matched += len(keys)
+            for batch in _batches(keys, batch_size):
+                result.deleted += await client.unlink(*batch)
+        # the progress reports the cursor to resume from
+        result.cursor = cursor = int(cursor)
+        if progress is not None:
+            progress(result)
+        if _is_done(result, time_budget):
+            return result
+
+
+def invalidate_keys(
+        client,
+        keys,
+        match: str,
+        batch_size: int = 500,
+        time_budget: float = None,
+        progress: ProgressCallback = None,
+) -> InvalidationResult:
+    """Deletes the keys yielded by `keys` with one UNLINK per batch, the cluster client splits a batch by slot."""
+
+    result = InvalidationResult(pattern=match)
+    batch = []
+    for key in keys:
+        batch.append(key)
+        if len(batch) >= batch_size:
+            _unlink_batch(result, batch, client.unlink(*batch), progress)
+            batch = []
+            if time_budget and result.elapsed >= time_budget:
+                return result
+    if batch:
+        _unlink_batch(result, batch, client.unlink(*batch), progress)
+    result.complete = True
+    return result
+
+
+async def async_invalidate_keys(
+        client,
+        keys,
+        match: str,
+        batch_size: int = 500,
+        time_budget: float = None,
+        progress: ProgressCallback = None,
+) -> InvalidationResult:
+    """Deletes the keys yielded by the async iterator `keys` with one UNLINK per batch."""
+
+    result = InvalidationResult(pattern=match)
+    batch = []
+    async for key in keys:
+        batch.append(key)
+        if len(batch) >= batch_size:
+            _unlink_batch(result, batch, await client.unlink(*batch), progress)
+            batch = []
+            if time_budget and result.elapsed >= time_budget:
+                return result
+    if batch:
+        _unlink_batch(result, batch, await client.unlink(*batch), progress)
+    result.complete = True
+    return result
+
+
+def _unlink_batch(result: InvalidationResult, batch: list, deleted: int, progress: ProgressCallback):
+    result.matched += len(batch)
+    result.deleted += deleted
+    if progress is not None:
+        progress(result)
@@ -0,0 +1,31 @@
+import threading
+
+
+class cached_classproperty:
+    """
+    Class attribute computed by the decorated function on first access instead of at class definition.
+
+    The value is stored on the class which defines the attribute, so subclasses share it. Keeps
+    clients such as the redis client from being built when their module is imported.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        self._lock = threading.Lock()
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        owner = owner or type(instance)
+        with self._lock:
+            for cls in owner.__mro__:
+                if cls.__dict__.get(self.name) is self:
+                    value = self.func(cls)
+                    # replaces this descriptor, later lookups are plain attribute lookups
+                    setattr(cls, self.name, value)
+                    return value
+            # the value was set by another thread while this one waited for the lock
+            return getattr(owner, self.name)
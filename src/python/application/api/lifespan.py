@@ -0,0 +1,45 @@
+from typing import (
+    Awaitable,
+    Callable,
+    Iterable,
+)
+
+Hook = Callable[[], Awaitable]
+
+
+class LifespanApplication:
+    """
+    ASGI wrapper which adds lifespan support to the django ASGI application.
+
+    Django ignores the `lifespan` scope, so process wide resources (pooled clients) are opened
+    in the `on_startup` hooks and released in the `on_shutdown` hooks.
+    """
+
+    def __init__(self, app, on_startup: Iterable[Hook] = (), on_shutdown: Iterable[Hook] = ()):
+        self.app = app
+        self.on_startup = list(on_startup)
+        self.on_shutdown = list(on_shutdown)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'lifespan':
+            return await self.app(scope, receive, send)
+
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    for hook in self.on_startup:
+                        await hook()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                try:
+                    for hook in self.on_shutdown:
+                        await hook()
+                except Exception as e:
+                    await send({'type': 'lifespan.shutdown.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,291 @@
+import asyncio
+import fnmatch
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from api.singletonmeta import SingletonMeta
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCache:
+    """
+    In-process LRU cache with a per entry TTL, bounded by entry count and bytes.
+
+    Values are kept as python objects so hits skip the redis round trip and the `json.loads`.
+    Callers must treat returned values as read-only since they are shared between requests.
+    """
+
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 32 * 1024 * 1024, ttl_seconds: float = 30):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size_bytes = 0
+        # key -> (expires_at, size, value), ordered from least to most recently used
+        self._entries = OrderedDict()
+
+    def __repr__(self):
+        return f'LocalCache(max_entries={self.max_entries}, max_bytes={self.max_bytes}, ttl_seconds={self.ttl_seconds})'
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the value of a key or `None` when it is missing or expired."""
+
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl_seconds=None):
+        """Stores the value of a key, evicting expired and least recently used entries when full."""
+
+        size = len(value) if isinstance(value, bytes) else len(json.dumps(value))
+        if size > self.max_bytes:
+            return False
+        self._pop(key)
+        ttl_seconds = min(ttl_seconds or self.ttl_seconds, self.ttl_seconds)
+        self._entries[key] = (time.monotonic() + ttl_seconds, size, value)
+        self.size_bytes += size
+        if len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            self._evict()
+        return True
+
+    def delete(self, key) -> int:
+        return 1 if self._pop(key) is not None else 0
+
+    def clear_on_pattern(self, pattern: str) -> int:
+        """Deletes all keys containing the given `pattern`, same as `RedisClient.clear_on_pattern`."""
+
+        pattern = f'*{pattern}*'
+        keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+        for key in keys:
+            self._pop(key)
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[1]
+        return entry
+
+    def _evict(self):
+        # expired entries go first, then the least recently used ones
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _, _) in self._entries.items() if expires_at <= now]:
+            self._pop(key)
+        while self._entries and (len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes):
+            self._pop(next(iter(self._entries)))
+
+
+class TwoTierCache(metaclass=SingletonMeta):
+    """
+    Two tier cache: an in-process `LocalCache` (L1) in front of the async redis client (L2).
+
+    It has the same API as `AsyncRedisClient`. Invalidations done by `delete`, `drop_index`, `clear_on_pattern`
+    and the flushes are published on a redis channel so the L1 of every other worker drops them too.
+    When the subscription is lost it is resubscribed with a backoff of `reconnect_seconds` up to
+    `max_reconnect_seconds`, the local cache is cleared then since invalidations may have been missed.
+    """
+
+    def __init__(self, redis, local_cache: LocalCache = None, invalidation_channel: str = None,
+                 reconnect_seconds: float = 0.1, max_reconnect_seconds: float = 5.0):
+        self.redis = redis
+        self.local_cache = local_cache or LocalCache(
+            max_entries=settings.L1_CACHE_MAX_ENTRIES,
+            max_bytes=settings.L1_CACHE_MAX_BYTES,
+            # the local copy must never outlive the redis one
+            ttl_seconds=min(settings.L1_CACHE_TTL_SECONDS, getattr(redis, 'ex_seconds', settings.L1_CACHE_TTL_SECONDS)),
+        )
+        if invalidation_channel is None:
+            invalidation_channel = settings.L1_CACHE_INVALIDATION_CHANNEL
+        self.invalidation_channel = invalidation_channel
+        self.reconnect_seconds = reconnect_seconds
+        self.max_reconnect_seconds = max_reconnect_seconds
+        self.stats = {'l1_hits': 0, 'l1_misses': 0, 'l2_hits': 0, 'l2_misses': 0, 'l1_invalidation_errors': 0}
+        self._listener = None
+
+    def __repr__(self):
+        return f'TwoTierCache(redis={self.redis}, local_cache={self.local_cache})'
+
+    async def start(self):
+        """Start listening for invalidations published by other workers."""
+
+        if self.invalidation_channel and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def aclose(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _listen(self):
+        delay = self.reconnect_seconds
+        while True:
+            try:
+                async for message in self.redis.subscribe(self.invalidation_channel):
+                    delay = self.reconnect_seconds
+                    self.apply_invalidation(message)
+                error = 'the subscription ended'
+            except Exception as e:
+                error = e
+            self.stats['l1_invalidation_errors'] += 1
+            logger.warning('Lost the L1 invalidation channel %s, resubscribing in %.1fs: %s',
+                           self.invalidation_channel, delay, error)
+            # the invalidations published until it is resubscribed are missed
+            self.local_cache.clear()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_seconds)
+
+    def apply_invalidation(self, message: dict):
+        """Apply an invalidation message to the local cache."""
+
+        if 'key' in message:
+            self.local_cache.delete(message['key'])
+        elif 'keys' in message:
+            for key in message['keys']:
+                self.local_cache.delete(key)
+        elif 'pattern' in message:
+            self.local_cache.clear_on_pattern(message['pattern'])
+        elif message.get('flush'):
+            self.local_cache.clear()
+
+    async def _invalidate(self, message: dict):
+        self.apply_invalidation(message)
+        if self.invalidation_channel:
+            await self.redis.publish(self.invalidation_channel, message)
+
+    async def get(self, key, raw=False):
+        # a key is always read the same way, raw or decoded, so the local copy has the right form
+        value = self.local_cache.get(key)
+        if value is not None:
+            self.stats['l1_hits'] += 1
+            return value
+        self.stats['l1_misses'] += 1
+
+        value = await self.redis.get(key, raw=raw)
+        if value is None:
+            self.stats['l2_misses'] += 1
+            return None
+        self.stats['l2_hits'] += 1
+        self.local_cache.set(key, value)
+        return value
+
+    async def set(self, key, value, ex_seconds=None, nx=False, raw=False, index=None):
+        result = await self.redis.set(key, value, ex_seconds=ex_seconds, nx=nx, raw=raw, index=index)
+        # locks and other conditional writes stay in redis only
+        if result and not nx:
+            self.local_cache.set(key, value, ttl_seconds=ex_seconds)
+        return result
+
+    async def get_many(self, keys: list, raw=False) -> list:
+        values = [self.local_cache.get(key) for key in keys]
+        missing = [index for index, value in enumerate(values) if value is None]
+        self.stats['l1_hits'] += len(keys) - len(missing)
+        self.stats['l1_misses'] += len(missing)
+        if not missing:
+            return values
+
+        for index, value in zip(missing, await self.redis.get_many([keys[index] for index in missing], raw=raw)):
+            if value is None:
+                self.stats['l2_misses'] += 1
+                continue
+            self.stats['l2_hits'] += 1
+            self.local_cache.set(keys[index], value)
+            values[index] = value
+        return values
+
+    async def set_many(self, mapping: dict, ex_seconds=None, raw=False, indexes: dict = None) -> list:
+        result = await self.redis.set_many(mapping, ex_seconds=ex_seconds, raw=raw, indexes=indexes)
+        for key, value in mapping.items():
+            self.local_cache.set(key, value, ttl_seconds=ex_seconds)
+        return result
+
+    async def delete(self, key):
+        result = await self.redis.delete(key)
+        await self._invalidate({'key': key})
+        return result
+
+    async def exists(self, key):
+        if self.local_cache.get(key) is not None:
+            return 1
+        return await self.redis.exists(key)
+
+    async def get_ttls(self, keys: list) -> list:
+        return await self.redis.get_ttls(keys)
+
+    async def increment_scores(self, key, increments: dict):
+        return await self.redis.increment_scores(key, increments)
+
+    async def get_top_scores(self, key, count: int) -> list:
+        return await self.redis.get_top_scores(key, count)
+
+    async def decay_scores(self, key, factor: float, keep: int):
+        return await self.redis.decay_scores(key, factor, keep)
+
+    async def run_script(self, script: str, keys: list = (), args: list = ()):
+        return await self.redis.run_script(script, keys=keys, args=args)
+
+    async def get_fields(self, key, fields: list) -> list:
+        return await self.redis.get_fields(key, fields)
+
+    async def set_fields(self, key, mapping: dict):
+        return await self.redis.set_fields(key, mapping)
+
+    async def get_index_members(self, index):
+        return await self.redis.get_index_members(index)
+
+    async def drop_index(self, index):
+        members = await self.redis.get_index_members(index)
+        result = await self.redis.drop_index(index)
+        if members:
+            await self._invalidate({'keys': members})
+        return result
+
+    async def invalidate_pattern(self, pattern: str, **kwargs):
+        result = await self.redis.invalidate_pattern(pattern, **kwargs)
+        await self._invalidate({'pattern': pattern})
+        return result
+
+    async def clear_on_pattern(self, pattern: str):
+        result = await self.redis.clear_on_pattern(pattern)
+        await self._invalidate({'pattern': pattern})
+        return result
+
+    async def flush_db(self):
+        await self.redis.flush_db()
+        await self._invalidate({'flush': True})
+
+    async def flush_all(self):
+        await self.redis.flush_all()
+        await self._invalidate({'flush': True})
+
+    async def iter_matching_keys(self, pattern: str, scan_count=None):
+        async for key in self.redis.iter_matching_keys(pattern, scan_count=scan_count):
+            yield key
+
+    async def get_matching_keys(self, pattern: str):
+        return await self.redis.get_matching_keys(pattern)
+
+    def cache_stats(self) -> dict:
+        """Returns hit/miss counters per tier and the local cache usage."""
+
+        return {
+            **self.stats,
+            'l1_entries': len(self.local_cache),
+            'l1_bytes': self.local_cache.size_bytes,
+        }
@@ -0,0 +1,48 @@
+import atexit
+import logging
+import queue
+import random
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets only a `rate` fraction of the records through.
+
+    Meant for high volume per-key messages (cache hits, misses and writes), attached to their
+    logger so a sample is enough to see the traffic without flooding the log pipeline.
+    """
+
+    def __init__(self, rate: float = 1.0, name: str = ''):
+        super().__init__(name)
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class QueuedStreamHandler(QueueHandler):
+    """
+    Stream handler which writes from a background thread.
+
+    Records are formatted by the logging thread and put on an in-memory queue, the stream I/O
+    happens in a `QueueListener` thread so the event loop never blocks on stdout/stderr.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.listener = QueueListener(self.queue, logging.StreamHandler(stream))
+        self.listener.start()
+        self._listening = True
+        atexit.register(self.close)
+
+    def close(self):
+        """Stop the listener once all queued records are written."""
+
+        if self._listening:
+            self._listening = False
+            self.listener.stop()
+        super().close()
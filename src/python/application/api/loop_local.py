@@ -0,0 +1,102 @@
+"""
+Objects bound to the event loop they were created on, e.g. connection pools.
+
+`runserver` and the WSGI servers run every async view with `async_to_sync` on a new event loop,
+which is closed after the view. `LoopLocal` keeps one object per running loop and closes it while
+its loop is torn down: `asyncio.run` and `async_to_sync` cancel the pending tasks of a loop before
+they close it, so a task waiting on each loop closes its object when it is cancelled.
+"""
+import asyncio
+import logging
+import weakref
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ('value', 'closer')
+
+    def __init__(self, value):
+        self.value = value
+        self.closer = None
+
+
+class LoopLocal:
+    """One object per running event loop, made by `factory` on first use and closed by `close` with its loop."""
+
+    def __init__(self, factory, close=None):
+        self.factory = factory
+        self.close = close
+        # the `_Entry` of each loop
+        self._entries = weakref.WeakKeyDictionary()
+
+    def __repr__(self):
+        return f'LoopLocal(factory={self.factory}, loops={len(self._entries)})'
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self):
+        """Returns the object of the running loop, made on first use."""
+
+        loop = asyncio.get_running_loop()
+        entry = self._entries.get(loop)
+        if entry is None:
+            entry = self._entries[loop] = _Entry(self.factory())
+            if self.close is not None:
+                entry.closer = loop.create_task(self._close_with_loop(loop, entry))
+        return entry.value
+
+    def peek(self, loop=None):
+        """Returns the object of `loop`, by default the running one, `None` if it has none."""
+
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        entry = self._entries.get(loop)
+        return entry.value if entry is not None else None
+
+    def values(self) -> list:
+        """Returns the objects of all loops."""
+
+        return [entry.value for entry in list(self._entries.values())]
+
+    def set(self, value):
+        """Replaces the object of the running loop, a replaced object is still closed with the loop."""
+
+        self._entries[asyncio.get_running_loop()] = _Entry(value)
+
+    def discard(self):
+        """Forgets the object of the running loop without closing it, e.g. when it was closed elsewhere."""
+
+        entry = self._entries.pop(asyncio.get_running_loop(), None)
+        if entry is not None and entry.closer is not None:
+            entry.closer.cancel()
+            entry.closer = None
+
+    async def aclose(self):
+        """Closes the object of the running loop now, the next `get` makes a new one."""
+
+        entry = self._entries.pop(asyncio.get_running_loop(), None)
+        if entry is None:
+            return
+        if entry.closer is not None:
+            entry.closer.cancel()
+            entry.closer = None
+        if self.close is not None:
+            await self._close(entry.value)
+
+    async def _close_with_loop(self, loop, entry: _Entry):
+        try:
+            await loop.create_future()
+        finally:
+            if self._entries.get(loop) is entry:
+                del self._entries[loop]
+            # unless `aclose` closed it already
+            if entry.closer is not None:
+                await self._close(entry.value)
+
+    async def _close(self, value):
+        try:
+            await self.close(value)
+        except Exception as e:
+            logger.warning('Could not close %r: %s', value, e)
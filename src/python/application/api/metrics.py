@@ -0,0 +1,177 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import (
+    Callable,
+    Iterable,
+)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in labels.items()
+    )
+    return f'{{{pairs}}}'
+
+
+class Metric:
+    """Base class for all metrics, values are kept per label values."""
+
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(name={self.name}, labelnames={self.labelnames})'
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> Iterable[tuple]:
+        """Yields `(name, labels, value)` for every sample of the metric."""
+
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for name, labels, value in self.samples():
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """A monotonically increasing counter."""
+
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        for key, value in list(self._values.items()):
+            yield f'{self.name}_total', dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    """A histogram of observed values, e.g. latencies in seconds."""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._values.get(key)
+            if child is None:
+                # one count per bucket plus the `+Inf` bucket, then the sum
+                child = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            child[index] += 1
+            child[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the `with` block, labels may be updated inside of it."""
+
+        start = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get_count(self, **labels) -> int:
+        child = self._values.get(self._key(labels))
+        return sum(child[:-1]) if child else 0
+
+    def samples(self):
+        for key, child in list(self._values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f'{self.name}_bucket', {**labels, 'le': le}, cumulative
+            yield f'{self.name}_count', labels, cumulative
+            yield f'{self.name}_sum', labels, child[-1]
+
+
+class GaugeCollector(Metric):
+    """A gauge whose values are read from `collect` at scrape time."""
+
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], dict], labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def samples(self):
+        for key, value in self.collect().items():
+            key = key if isinstance(key, tuple) else (key,)
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class MetricsRegistry:
+    """Registry of all metrics, rendered in the prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Metric:
+        return self._metrics[name]
+
+    def clear(self):
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Total time spent handling a request.', ('view', 'method', 'status_code')))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'weather_cache_lookups', 'Weather cache lookups by result (hit, stale or miss).', ('result',)))
+REDIS_OPERATION_DURATION = REGISTRY.register(Histogram(
+    'redis_operation_duration_seconds', 'Latency of redis operations.', ('operation', 'outcome')))
+UPSTREAM_REQUEST_DURATION = REGISTRY.register(Histogram(
+    'upstream_request_duration_seconds', 'Latency of upstream weather API requests.', ('status_code',)))
+SERIALIZER_VALIDATION_DURATION = REGISTRY.register(Histogram(
+    'serializer_validation_duration_seconds', 'Time spent validating serializers.', ('serializer', 'outcome')))
+CACHE_WARMUP_REFRESHES = REGISTRY.register(Counter(
+    'weather_cache_warmup_refreshes', 'Hot weather keys refreshed by the warm-up by outcome.', ('outcome',)))
+UPSTREAM_RATE_LIMIT_DECISIONS = REGISTRY.register(Counter(
+    'upstream_rate_limit_decisions', 'Upstream rate limiter decisions by outcome and bucket backend.',
+    ('outcome', 'backend')))
+UPSTREAM_ATTEMPTS = REGISTRY.register(Counter(
+    'upstream_attempts', 'Upstream request attempts by kind (first, retry or hedge) and outcome.', ('kind', 'outcome')))
+UPSTREAM_GROUP_SIZE = REGISTRY.register(Histogram(
+    'upstream_group_size', 'Cities per upstream group request.', buckets=(1, 2, 5, 10, 15, 20)))
@@ -0,0 +1,41 @@
+import time
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+)
+
+from api.metrics import REQUEST_DURATION
+
+
+class MetricsMiddleware:
+    """Records the total time spent on every request, labeled by view name, method and status code."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started_at = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, started_at)
+        return response
+
+    async def __acall__(self, request):
+        started_at = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, started_at)
+        return response
+
+    @staticmethod
+    def _observe(request, response, started_at: float):
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.view_name if resolver_match is not None else 'unmatched'
+        REQUEST_DURATION.observe(
+            time.perf_counter() - started_at, view=view, method=request.method, status_code=response.status_code)
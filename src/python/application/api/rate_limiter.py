@@ -0,0 +1,170 @@
+import asyncio
+import math
+import time
+
+from django.conf import settings
+
+from api.metrics import UPSTREAM_RATE_LIMIT_DECISIONS
+from api.redis_client import get_redis
+from api.singletonmeta import SingletonMeta
+
+# token bucket kept in a redis hash, refilled from the time passed since its last update.
+# Returns if the tokens were taken, the tokens left and the seconds until enough tokens are back.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local requested = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    allowed = 1
+else
+    retry_after = (requested - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+class RateLimitExceeded(Exception):
+    """The upstream call budget is used up, `retry_after` is the time in seconds until it has room again."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f'Upstream rate limit reached, retry after {retry_after:.2f}s.')
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """In-process token bucket holding up to `capacity` tokens refilled at `rate` tokens per second."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def __repr__(self):
+        return f'TokenBucket(capacity={self.capacity}, rate={self.rate})'
+
+    def take(self, tokens: float = 1) -> tuple:
+        """Takes `tokens` if there are enough, returns if they were taken, the tokens left and the retry delay."""
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True, self.tokens, 0.0
+        return False, self.tokens, (tokens - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the upstream calls of all workers to `calls_per_minute`.
+
+    The bucket lives in redis and is updated atomically by a Lua script, so every worker draws
+    from the same budget. While redis is not available each worker falls back to a local bucket
+    with its share of the budget, `1 / workers`. Callers queue for at most `max_wait_seconds`
+    for a token before `RateLimitExceeded` is raised.
+    """
+
+    def __init__(
+            self,
+            redis=None,
+            key: str = 'ratelimit:upstream',
+            calls_per_minute: int = 60,
+            burst: int = 10,
+            max_wait_seconds: float = 0.0,
+            workers: int = 1,
+    ):
+        self.redis = redis
+        self.key = key
+        self.calls_per_minute = calls_per_minute
+        self.capacity = max(burst, 1)
+        self.rate = calls_per_minute / 60
+        self.max_wait_seconds = max_wait_seconds
+        self.local_bucket = TokenBucket(max(self.capacity / workers, 1), self.rate / workers)
+        self.tokens = float(self.capacity)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(calls_per_minute={self.calls_per_minute}, capacity={self.capacity})'
+
+    @property
+    def enabled(self) -> bool:
+        return self.calls_per_minute > 0
+
+    async def acquire(self, max_wait_seconds: float = None):
+        """Takes a token for one upstream call, waiting up to `max_wait_seconds` for it."""
+
+        if not self.enabled:
+            return
+        if max_wait_seconds is None:
+            max_wait_seconds = self.max_wait_seconds
+        deadline = time.monotonic() + max_wait_seconds
+        queued = False
+        while True:
+            allowed, retry_after, backend = await self._take()
+            if allowed:
+                UPSTREAM_RATE_LIMIT_DECISIONS.inc(outcome='queued' if queued else 'allowed', backend=backend)
+                return
+            if time.monotonic() + retry_after > deadline:
+                UPSTREAM_RATE_LIMIT_DECISIONS.inc(outcome='rejected', backend=backend)
+                raise RateLimitExceeded(retry_after)
+            queued = True
+            await asyncio.sleep(retry_after)
+
+    async def _take(self) -> tuple:
+        result = None
+        if self.redis is not None:
+            result = await self.redis.run_script(
+                TOKEN_BUCKET_SCRIPT, keys=[self.key], args=[self.capacity, self.rate, time.time(), 1])
+        if result is None:
+            # redis is not available, each worker keeps to its share of the budget
+            allowed, self.tokens, retry_after = self.local_bucket.take()
+            return allowed, retry_after, 'local'
+
+        allowed, tokens, retry_after = result
+        self.tokens = float(tokens)
+        return bool(allowed), float(retry_after), 'redis'
+
+    def quota_stats(self) -> dict:
+        """Returns the configured quota and the tokens left at the last call."""
+
+        return {
+            'calls_per_minute': self.calls_per_minute,
+            'capacity': self.capacity,
+            'tokens_available': self.tokens,
+            'used_ratio': 1 - self.tokens / self.capacity,
+        }
+
+
+class UpstreamRateLimiter(RateLimiter, metaclass=SingletonMeta):
+    """Process wide rate limiter of the upstream weather API, configured by the `UPSTREAM_RATE_LIMIT_*` settings."""
+
+    def __init__(self, redis=None):
+        super().__init__(
+            redis=redis,
+            calls_per_minute=settings.UPSTREAM_RATE_LIMIT_PER_MINUTE,
+            burst=settings.UPSTREAM_RATE_LIMIT_BURST,
+            max_wait_seconds=settings.UPSTREAM_RATE_LIMIT_MAX_WAIT_SECONDS,
+            workers=settings.UPSTREAM_RATE_LIMIT_WORKERS,
+        )
+
+
+def get_rate_limiter() -> UpstreamRateLimiter:
+    """ get the upstream rate limiter shared by all views. """
+
+    return UpstreamRateLimiter(get_redis())
+
+
+def retry_after_header(retry_after: float) -> str:
+    """Formats a delay for the `Retry-After` header, which only takes whole seconds."""
+
+    return str(max(math.ceil(retry_after), 1))
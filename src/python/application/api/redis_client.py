@@ -1,15 +1,95 @@
+import asyncio
+import itertools
 import json
+import logging
 import os
+import time
 from functools import wraps
-from unittest.mock import MagicMock
 
-import fakeredis
 import redis
+import redis.asyncio as async_redis
 from environs import Env
 from django.conf import settings
 
+from api import invalidation
+from api.circuit_breaker import CircuitBreaker
+from api.codecs import (
+    JsonCodec,
+    UnknownFormatError,
+    ValueCompression,
+    decode_value,
+    decompress_value,
+    get_codec,
+    get_compressor,
+)
+from api.local_cache import TwoTierCache
+from api.loop_local import LoopLocal
+from api.metrics import REDIS_OPERATION_DURATION
 from api.singletonmeta import SingletonMeta
 
+logger = logging.getLogger(__name__)
+# failures of redis, an unreachable cluster is not a `RedisError`
+REDIS_ERRORS = (redis.RedisError, redis.exceptions.RedisClusterException)
+# per-key messages, sampled by the `LOGGING` settings
+key_logger = logging.getLogger(f'{__name__}.keys')
+
+
+def decode(data: bytes, raw: bool = False):
+    """
+    Decodes a stored value, `raw` values are only decompressed. Values in a format unknown to this
+    version count as missing.
+    """
+
+    try:
+        if raw:
+            return decompress_value(data)
+        return decode_value(data)
+    except UnknownFormatError as e:
+        logger.warning('Could not decode Redis value: %s', e)
+        return None
+
+
+def encode(value, codec, compression: ValueCompression, raw: bool = False) -> bytes:
+    """Encodes a value with the codec, `raw` values are bytes which are only compressed."""
+
+    return compression.pack(value if raw else codec.encode(value))
+
+
+def encode_key(key):
+    """Keys are stored as they are, other than strings and bytes they are JSON encoded."""
+
+    if isinstance(key, (str, bytes)):
+        return key
+    return json.dumps(key)
+
+
+def group_by_index(indexes: dict = None) -> dict:
+    """Turns a mapping of keys to their index into a mapping of indexes to their keys."""
+
+    grouped = {}
+    for key, index in (indexes or {}).items():
+        grouped.setdefault(encode_key(index), []).append(encode_key(key))
+    return grouped
+
+
+def add_to_index(pipe, index, keys: list, ex_seconds: int):
+    """Queues adding `keys` to the set `index` on a pipeline, the index lives as long as its newest key."""
+
+    index = encode_key(index)
+    pipe.sadd(index, *keys)
+    if ex_seconds:
+        pipe.expire(index, ex_seconds)
+
+
+def parse_addresses(addresses: list) -> list:
+    """Turns `host:port` strings into `(host, port)` tuples, the port defaults to 6379."""
+
+    parsed = []
+    for address in addresses:
+        host, _, port = address.strip().partition(':')
+        parsed.append((host, int(port or 6379)))
+    return parsed
+
 
 def ensure_serializable_key(func):
     """A decorator which ensure that redis keys can be properly serialized."""
@@ -18,188 +98,822 @@ def ensure_serializable_key(func):
     def _check_key(_self, key, *args, **kwargs):
         """Check if the key is of a serializable type. """
         if not isinstance(key, str) and not isinstance(key, bytes):
-            key = json.dumps(key)
+            key = encode_key(key)
 
         return func(_self, key, *args, **kwargs)
 
     return _check_key
 
 
-class RedisClient(metaclass=SingletonMeta):
-    """
-    RedisClient to communicate with redis Server
-    Redis Commands: https://redis.io/commands
-    """
+class BaseRedisClient(metaclass=SingletonMeta):
+    """Common configuration shared by the sync and async redis clients."""
 
     class RedisContextManager:
-        """A context manager for redis connection."""
+        """
+        A context manager handing out the long-lived redis client, a replica client for `read` operations.
+
+        It yields `None` while the circuit breaker is open, so redis is skipped instead of
+        waited on. Redis errors are counted, reported to the circuit breaker and suppressed,
+        which makes the operation return `None` like a cache miss.
+        """
 
-        def __init__(self, connection_pool):
-            self.connection_pool = connection_pool
+        def __init__(self, redis_client, operation: str, read: bool = False):
+            self.redis_client = redis_client
+            self.operation = operation
+            # reads may be served by a replica, see `BaseRedisClient.read_client`
+            self.read = read
+            self.client = None
+            self.connect_error = None
 
         def __enter__(self):
-            self.redis = redis.Redis(connection_pool=self.connection_pool)
-            try:
-                self.redis.ping()
-            except redis.ConnectionError:
-                self.redis = None
-            return self.redis
+            self.started_at = time.perf_counter()
+            if self.redis_client.circuit_breaker.allow():
+                try:
+                    self.client = self.redis_client.read_client if self.read else self.redis_client.client
+                except REDIS_ERRORS as e:
+                    # e.g. a cluster client which can not reach any of its nodes to discover the cluster
+                    self.connect_error = e
+                    self._record_failure(e)
+            else:
+                self.redis_client.stats['skipped'] += 1
+            return self.client
 
         def __exit__(self, exc_type, exc_val, exc_tb):
-            if exc_tb:
-                print(f'Error in Redis connection: {exc_type} {exc_val} {exc_tb}')
-            if self.redis is not None:
-                self.redis.close()
+            suppress = False
+            if self.connect_error is not None:
+                outcome = 'error'
+            elif self.client is None:
+                outcome = 'skipped'
+            elif exc_type is None:
+                outcome = 'ok'
+                self.redis_client.circuit_breaker.record_success()
+            elif issubclass(exc_type, REDIS_ERRORS):
+                outcome = 'error'
+                suppress = True
+                self._record_failure(exc_val)
+            else:
+                outcome = 'error'
+            REDIS_OPERATION_DURATION.observe(
+                time.perf_counter() - self.started_at, operation=self.operation, outcome=outcome)
+            return suppress
+
+        def _record_failure(self, error: Exception):
+            logger.warning('Redis operation failed on %r: %s', self.redis_client, error)
+            self.redis_client.stats['failures'] += 1
+            self.redis_client.circuit_breaker.record_failure()
+
+        async def __aenter__(self):
+            return self.__enter__()
+
+        async def __aexit__(self, exc_type, exc_val, exc_tb):
+            return self.__exit__(exc_type, exc_val, exc_tb)
+
+    MODES = ('standalone', 'sentinel', 'cluster')
+    # the `redis` module the clients are made with, sync or asyncio
+    redis_module = None
 
-    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0):
+    def __init__(
+            self, host: str = 'localhost', port: int = 6379, db: int = 0, mode: str = 'standalone',
+            nodes: list = (), sentinels: list = (), service_name: str = 'mymaster', replicas: list = (),
+            read_from_replicas: bool = False):
+        if mode not in self.MODES:
+            raise ValueError(f'Unknown redis mode {mode!r}, expected one of {", ".join(self.MODES)}.')
+        if mode == 'sentinel' and not sentinels:
+            raise ValueError('The sentinel mode needs at least one sentinel address.')
         self.host = host
         self.port = port
         self.db = db
+        self.mode = mode
+        # startup nodes of a cluster, the rest of the cluster is discovered from them
+        self.nodes = list(nodes) or [(host, int(port))]
+        self.sentinels = list(sentinels)
+        self.service_name = service_name
+        # replicas of a standalone primary
+        self.replicas = list(replicas)
+        self.read_from_replicas = read_from_replicas
+        self._reads = itertools.count()
         # a global expiry time in seconds for all keys.
         self._env = Env()
         self.ex_seconds = self._env.int('REDIS_TTL_SECONDS', 60 * 60)
-        self.connection_pool = redis.ConnectionPool(
-            host=self.host,
-            port=self.port,
-            db=self.db,
-            max_connections=1024,
-            socket_timeout=5,
-            health_check_interval=self.ex_seconds
+        self.health_check_interval = self._env.int('REDIS_HEALTH_CHECK_INTERVAL', 30)
+        # SCAN COUNT hint and keys per UNLINK of the pattern invalidation
+        self.scan_count = self._env.int('REDIS_SCAN_COUNT', 1000)
+        self.unlink_batch_size = self._env.int('REDIS_UNLINK_BATCH_SIZE', 500)
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=self._env.int('REDIS_CIRCUIT_FAILURE_THRESHOLD', 5),
+            cooldown_seconds=self._env.float('REDIS_CIRCUIT_COOLDOWN_SECONDS', 30),
         )
+        self.stats = {'failures': 0, 'skipped': 0}
+        # registered Lua scripts by their source, they are run with EVALSHA
+        self.scripts = {}
+        # codec used to write values, values of all codecs can be read
+        self.codec = get_codec(self._env.str('REDIS_VALUE_CODEC', 'json'))
+        # compression of the encoded values of at least the threshold bytes, see `api.codecs`
+        self.compression = ValueCompression(
+            get_compressor(self._env.str('REDIS_VALUE_COMPRESSION', 'none'),
+                           self._env.int('REDIS_VALUE_COMPRESSION_LEVEL', None)),
+            threshold=self._env.int('REDIS_VALUE_COMPRESSION_THRESHOLD', 1024),
+        )
+        self._open()
+
+    def _open(self):
+        # long-lived clients, connections are health checked by their pools
+        self.client, self.read_clients = self._make_clients()
 
     def __repr__(self):
-        return f'RedisClient(host={self.host}, port={self.port}, db={self.db})'
+        return f'{self.__class__.__name__}(mode={self.mode}, host={self.host}, port={self.port}, db={self.db})'
 
     @classmethod
     def make_from_env(cls):
         """Instantiate redis instance from env variables."""
 
+        env = Env()
         redis_host = os.getenv('REDIS_HOST', 'localhost')
         redis_port = os.getenv('REDIS_PORT', 6379)
         redis_cache_db = os.getenv('REDIS_CACHE_DB', 0)
 
-        return cls(host=redis_host, port=redis_port, db=redis_cache_db)
+        return cls(
+            host=redis_host,
+            port=redis_port,
+            db=redis_cache_db,
+            # `standalone`, `sentinel` (failover of a primary) or `cluster` (keys hashed over many primaries)
+            mode=env.str('REDIS_MODE', 'standalone'),
+            # `host:port` startup nodes of the cluster, `REDIS_HOST:REDIS_PORT` when not given
+            nodes=parse_addresses(env.list('REDIS_CLUSTER_NODES', [])),
+            # `host:port` of the sentinels and the name of the primary they watch
+            sentinels=parse_addresses(env.list('REDIS_SENTINELS', [])),
+            service_name=env.str('REDIS_SENTINEL_SERVICE', 'mymaster'),
+            # `host:port` of the replicas of a standalone primary
+            replicas=parse_addresses(env.list('REDIS_REPLICAS', [])),
+            # send GET, MGET, HMGET and EXISTS to the replicas, writes always go to the primary
+            read_from_replicas=env.bool('REDIS_READ_FROM_REPLICAS', False),
+        )
+
+    @property
+    def cluster(self) -> bool:
+        return self.mode == 'cluster'
+
+    @property
+    def read_client(self):
+        """The client of the next replica when reads go to replicas, otherwise the primary one."""
+
+        read_clients = self.read_clients
+        if not read_clients:
+            return self.client
+        return read_clients[next(self._reads) % len(read_clients)]
+
+    def _connection_kwargs(self) -> dict:
+        return dict(
+            max_connections=1024,
+            socket_timeout=5,
+            health_check_interval=self.health_check_interval
+        )
+
+    def _make_node_client(self, host: str, port: int):
+        """Returns a client of the single node `host:port`."""
+
+        module = self.redis_module
+        return module.Redis(
+            connection_pool=module.ConnectionPool(host=host, port=port, db=self.db, **self._connection_kwargs()))
+
+    def _make_clients(self) -> tuple:
+        """Returns the client of the primary and the clients reads are spread over, empty to read from the primary."""
+
+        module = self.redis_module
+        if self.mode == 'cluster':
+            client = module.cluster.RedisCluster(
+                startup_nodes=[module.cluster.ClusterNode(host, port) for host, port in self.nodes],
+                read_from_replicas=self.read_from_replicas, **self._connection_kwargs())
+            # the cluster client sends read commands to the replicas of a key's slot itself
+            return client, []
+        if self.mode == 'sentinel':
+            sentinel = module.sentinel.Sentinel(self.sentinels, sentinel_kwargs={'socket_timeout': 5})
+            client = sentinel.master_for(self.service_name, db=self.db, **self._connection_kwargs())
+            # the replica pool spreads connections over the replicas and falls back to the primary
+            read_clients = [sentinel.slave_for(self.service_name, db=self.db, **self._connection_kwargs())]
+            return client, read_clients if self.read_from_replicas else []
+        client = self._make_node_client(self.host, self.port)
+        if not self.read_from_replicas:
+            return client, []
+        return client, [self._make_node_client(host, port) for host, port in self.replicas]
+
+    def _make_pubsub_client(self):
+        """
+        Returns the client to subscribe with. Published messages are broadcast to all nodes of a
+        cluster, so a subscription to its first node is enough.
+        """
+
+        if self.mode == 'cluster':
+            return self._make_node_client(*self.nodes[0])
+        return self.client
+
+
+class RedisClient(BaseRedisClient):
+    """
+    RedisClient to communicate with redis Server
+    Redis Commands: https://redis.io/commands
+    """
+
+    redis_module = redis
+
+    def _open(self):
+        # a cluster client discovers the cluster when it is made, so the clients are made on first use,
+        # where a failure is handled like the one of an operation
+        self._clients = None
+
+    def _connected_clients(self) -> tuple:
+        if self._clients is None:
+            self._clients = self._make_clients()
+        return self._clients
+
+    @property
+    def client(self):
+        """The long-lived client of the primary."""
+
+        return self._connected_clients()[0]
 
-    def set(self, key, value, ex_seconds=None):
-        """SET the string value of a key."""
+    @client.setter
+    def client(self, client):
+        self._clients = (client, [])
+
+    @property
+    def read_clients(self) -> list:
+        """The long-lived clients of the replicas."""
+
+        return self._connected_clients()[1]
+
+    def set(self, key, value, ex_seconds=None, nx=False, raw=False, index=None):
+        """
+        SET the string value of a key, only if it does not exist yet when `nx` is set.
+        `raw` values are bytes which are stored without the codec, values are compressed above the threshold.
+        The key is also added to the set `index` in the same round trip, see `drop_index`.
+        """
 
         # use the expiry time if client passes it or set it to global expiry time
         ex_seconds = ex_seconds or self.ex_seconds
-        key = json.dumps(key)
-        with self.RedisContextManager(self.connection_pool) as client:
+        key = encode_key(key)
+        with self.RedisContextManager(self, 'set') as client:
             if client is not None:
-                result = client.set(key, json.dumps(value), ex=ex_seconds)
-                print(f'Created new Redis cache with key: {key}.')
+                value = encode(value, self.codec, self.compression, raw)
+                if index is None:
+                    result = client.set(key, value, ex=ex_seconds, nx=nx)
+                else:
+                    with client.pipeline(transaction=False) as pipe:
+                        pipe.set(key, value, ex=ex_seconds, nx=nx)
+                        add_to_index(pipe, index, [key], ex_seconds)
+                        result = pipe.execute()[0]
+                key_logger.debug('Created new Redis cache with key: %s.', key)
 
                 return result
 
-    def get(self, key):
-        """GET the value of a key."""
+    def get(self, key, raw=False):
+        """GET the value of a key, `raw` returns the stored bytes without decoding them."""
 
-        key = json.dumps(key)
-        with self.RedisContextManager(self.connection_pool) as client:
+        key = encode_key(key)
+        with self.RedisContextManager(self, 'get', read=True) as client:
             if client is not None:
                 data = client.get(key)
                 result = None
                 if data:
-                    print(f'Found Redis data for the given key: {key} from cache.')
-                    result = json.loads(data)
+                    key_logger.debug('Found Redis data for the given key: %s from cache.', key)
+                    result = decode(data, raw)
                 else:
-                    print(f'Given key: {key} was not found.')
+                    key_logger.debug('Given key: %s was not found.', key)
                 return result
 
     def delete(self, key):
         """DELETE a key."""
 
-        key = json.dumps(key)
-        with self.RedisContextManager(self.connection_pool) as client:
+        key = encode_key(key)
+        with self.RedisContextManager(self, 'delete') as client:
             if client is not None:
                 return client.delete(key)
 
     def exists(self, key):
         """To check the given key exists in Redis db."""
 
-        key = json.dumps(key)
-        with self.RedisContextManager(self.connection_pool) as client:
+        key = encode_key(key)
+        with self.RedisContextManager(self, 'exists', read=True) as client:
             if client is not None:
                 return client.exists(key)
 
+    def get_index_members(self, index):
+        """Returns the keys of the set `index`."""
+
+        with self.RedisContextManager(self, 'get_index_members') as client:
+            if client is not None:
+                return [member.decode() for member in client.smembers(encode_key(index))]
+        return []
+
+    def drop_index(self, index):
+        """Deletes the set `index` and all keys in it, returns the number of deleted keys."""
+
+        index = encode_key(index)
+        with self.RedisContextManager(self, 'drop_index') as client:
+            if client is not None:
+                members = client.smembers(index)
+                # empty sets do not exist in redis, so the index is always one of the unlinked keys
+                deleted = client.unlink(index, *members) - 1 if members else 0
+                logger.info('Cleared %d keys of the index %s.', deleted, index)
+                return deleted
+
+    def invalidate_pattern(
+            self, pattern: str, time_budget: float = None, progress=None, use_lua=False, cursor=0, scan_count=None,
+            batch_size=None):
+        """
+        Deletes the keys containing the given `pattern` in batches, see `api.invalidation`.
+        Returns an `InvalidationResult` with the cursor to resume from if the time budget ran out.
+        In a cluster the run can not be resumed and neither `use_lua` nor `cursor` apply.
+        """
+
+        with self.RedisContextManager(self, 'invalidate_pattern') as client:
+            if client is not None:
+                match, scan_count = f'*{pattern}*', scan_count or self.scan_count
+                if self.cluster:
+                    result = invalidation.invalidate_keys(
+                        client, client.scan_iter(match=match, count=scan_count), match,
+                        batch_size=batch_size or self.unlink_batch_size, time_budget=time_budget, progress=progress)
+                else:
+                    result = invalidation.invalidate_pattern(
+                        client, match, scan_count=scan_count, batch_size=batch_size or self.unlink_batch_size,
+                        time_budget=time_budget, progress=progress, use_lua=use_lua, cursor=cursor)
+                logger.info('Cleared %d keys for %s in %.3fs.', result.deleted, result.pattern, result.elapsed)
+                return result
+
     def clear_on_pattern(self, pattern: str):
         """
         This Function matches the input search pattern and deletes that
         specific redis resource containing the given `pattern`.
         """
 
-        count = 1
-        pattern = f'*{pattern}*'
-        with self.RedisContextManager(self.connection_pool) as client:
-            if client is not None:
-                for key in client.scan_iter(match=pattern, count=1):
-                    client.unlink(key)
-                    count += 1
-                print(f'Cleared cache for {pattern}.')
-                return count
+        result = self.invalidate_pattern(pattern)
+        if result is not None:
+            return result.deleted
 
     def flush_db(self):
         """Deletes all cache from current."""
-        with self.RedisContextManager(self.connection_pool) as client:
+        with self.RedisContextManager(self, 'flush_db') as client:
             if client is not None:
                 client.flushdb()
 
     def flush_all(self):
         """Deletes all cache."""
-        with self.RedisContextManager(self.connection_pool) as client:
+        with self.RedisContextManager(self, 'flush_all') as client:
             if client is not None:
                 client.flushall(asynchronous=True)
 
     # @ensure_connection
+    def iter_matching_keys(self, pattern: str, scan_count=None):
+        """Yields the cache keys containing `pattern`, with SCAN instead of the blocking KEYS."""
+        with self.RedisContextManager(self, 'iter_matching_keys') as client:
+            if client is not None:
+                yield from client.scan_iter(match=f'*{pattern}*', count=scan_count or self.scan_count)
+
+    def get_memory_usage(self, keys: list) -> list:
+        """
+        Returns the `MEMORY USAGE` in bytes and the stored value of keys in one pipeline, the value is
+        `None` for keys which are not strings.
+        """
+
+        with self.RedisContextManager(self, 'get_memory_usage') as client:
+            if client is not None:
+                with client.pipeline(transaction=False) as pipe:
+                    for key in keys:
+                        pipe.memory_usage(encode_key(key), samples=0)
+                        pipe.get(encode_key(key))
+                    results = pipe.execute(raise_on_error=False)
+                return [
+                    (usage, value if isinstance(value, bytes) else None)
+                    for usage, value in zip(results[::2], results[1::2])
+                ]
+        return []
+
     def get_matching_keys(self, pattern: str):
         """Returns cache keys"""
-        with self.RedisContextManager(self.connection_pool) as client:
+        return list(self.iter_matching_keys(pattern))
+
+    def publish(self, channel: str, message):
+        """PUBLISH a json message on a channel."""
+        with self.RedisContextManager(self, 'publish') as client:
+            if client is not None:
+                return client.publish(channel, json.dumps(message))
+
+
+class AsyncRedisClient(BaseRedisClient):
+    """
+    Asyncio RedisClient to communicate with redis Server without blocking the event loop.
+    Redis Commands: https://redis.io/commands
+    """
+
+    redis_module = async_redis
+
+    def _open(self):
+        # connections can only be used on the event loop they were opened on, so each loop gets its own
+        # clients, which are closed with their loop, e.g. after each request of `runserver` and WSGI servers
+        self._clients = LoopLocal(self._make_clients, close=self._close_clients)
+
+    def _loop_clients(self) -> tuple:
+        return self._clients.get()
+
+    @staticmethod
+    async def _close_clients(clients: tuple):
+        client, read_clients = clients
+        for each in (client, *read_clients):
+            await each.aclose()
+
+    @property
+    def client(self):
+        """The long-lived client of the primary on the running event loop."""
+
+        return self._loop_clients()[0]
+
+    @client.setter
+    def client(self, client):
+        self._clients.set((client, []))
+
+    @property
+    def read_clients(self) -> list:
+        """The long-lived clients of the replicas on the running event loop."""
+
+        return self._loop_clients()[1]
+
+    async def set(self, key, value, ex_seconds=None, nx=False, raw=False, index=None):
+        """
+        SET the string value of a key, only if it does not exist yet when `nx` is set.
+        `raw` values are bytes which are stored without the codec, values are compressed above the threshold.
+        The key is also added to the set `index` in the same round trip, see `drop_index`.
+        """
+
+        # use the expiry time if client passes it or set it to global expiry time
+        ex_seconds = ex_seconds or self.ex_seconds
+        key = encode_key(key)
+        async with self.RedisContextManager(self, 'set') as client:
+            if client is not None:
+                value = encode(value, self.codec, self.compression, raw)
+                if index is None:
+                    result = await client.set(key, value, ex=ex_seconds, nx=nx)
+                else:
+                    async with client.pipeline(transaction=False) as pipe:
+                        pipe.set(key, value, ex=ex_seconds, nx=nx)
+                        add_to_index(pipe, index, [key], ex_seconds)
+                        result = (await pipe.execute())[0]
+                key_logger.debug('Created new Redis cache with key: %s.', key)
+
+                return result
+
+    async def get(self, key, raw=False):
+        """GET the value of a key, `raw` returns the stored bytes without decoding them."""
+
+        key = encode_key(key)
+        async with self.RedisContextManager(self, 'get', read=True) as client:
+            if client is not None:
+                data = await client.get(key)
+                result = None
+                if data:
+                    key_logger.debug('Found Redis data for the given key: %s from cache.', key)
+                    result = decode(data, raw)
+                else:
+                    key_logger.debug('Given key: %s was not found.', key)
+                return result
+
+    async def get_many(self, keys: list, raw=False) -> list:
+        """GET the values of many keys with a single MGET."""
+
+        if not keys:
+            return []
+        async with self.RedisContextManager(self, 'get_many', read=True) as client:
+            if client is not None:
+                keys = [encode_key(key) for key in keys]
+                # the keys of a cluster MGET have to share a slot, the non-atomic one splits them by slot
+                values = await (client.mget_nonatomic(keys) if self.cluster else client.mget(keys))
+                return [decode(value, raw) if value else None for value in values]
+        return [None] * len(keys)
+
+    async def set_many(self, mapping: dict, ex_seconds=None, raw=False, indexes: dict = None) -> list:
+        """
+        SET many keys with their expiry in a single pipeline round trip.
+        `indexes` maps keys to the set index they are added to.
+        """
+
+        ex_seconds = ex_seconds or self.ex_seconds
+        async with self.RedisContextManager(self, 'set_many') as client:
+            if client is not None:
+                async with client.pipeline(transaction=False) as pipe:
+                    for key, value in mapping.items():
+                        pipe.set(encode_key(key), encode(value, self.codec, self.compression, raw), ex=ex_seconds)
+                    for index, keys in group_by_index(indexes).items():
+                        add_to_index(pipe, index, keys, ex_seconds)
+                    return (await pipe.execute())[:len(mapping)]
+
+    async def delete(self, key):
+        """DELETE a key."""
+
+        key = encode_key(key)
+        async with self.RedisContextManager(self, 'delete') as client:
+            if client is not None:
+                return await client.delete(key)
+
+    async def exists(self, key):
+        """To check the given key exists in Redis db."""
+
+        key = encode_key(key)
+        async with self.RedisContextManager(self, 'exists', read=True) as client:
+            if client is not None:
+                return await client.exists(key)
+
+    async def get_fields(self, key, fields: list) -> list:
+        """HMGET the string values of `fields` of the hash `key`, `None` for missing fields."""
+
+        if not fields:
+            return []
+        async with self.RedisContextManager(self, 'get_fields', read=True) as client:
+            if client is not None:
+                values = await client.hmget(encode_key(key), fields)
+                return [value.decode() if value is not None else None for value in values]
+        return [None] * len(fields)
+
+    async def set_fields(self, key, mapping: dict):
+        """HSET the string values of `mapping` in the hash `key`."""
+
+        if not mapping:
+            return
+        async with self.RedisContextManager(self, 'set_fields') as client:
+            if client is not None:
+                return await client.hset(encode_key(key), mapping=mapping)
+
+    async def get_index_members(self, index):
+        """Returns the keys of the set `index`."""
+
+        async with self.RedisContextManager(self, 'get_index_members') as client:
+            if client is not None:
+                return [member.decode() for member in await client.smembers(encode_key(index))]
+        return []
+
+    async def drop_index(self, index):
+        """Deletes the set `index` and all keys in it, returns the number of deleted keys."""
+
+        index = encode_key(index)
+        async with self.RedisContextManager(self, 'drop_index') as client:
+            if client is not None:
+                members = await client.smembers(index)
+                # empty sets do not exist in redis, so the index is always one of the unlinked keys
+                deleted = await client.unlink(index, *members) - 1 if members else 0
+                logger.info('Cleared %d keys of the index %s.', deleted, index)
+                return deleted
+
+    async def get_ttls(self, keys: list) -> list:
+        """Returns the remaining TTL in seconds of each key, `-2` for missing keys."""
+
+        if not keys:
+            return []
+        async with self.RedisContextManager(self, 'get_ttls') as client:
+            if client is not None:
+                async with client.pipeline(transaction=False) as pipe:
+                    for key in keys:
+                        pipe.ttl(encode_key(key))
+                    return await pipe.execute()
+        return [-2] * len(keys)
+
+    async def increment_scores(self, key, increments: dict):
+        """ZINCRBY the members of the sorted set `key` in a single pipeline round trip."""
+
+        if not increments:
+            return
+        key = encode_key(key)
+        async with self.RedisContextManager(self, 'increment_scores') as client:
+            if client is not None:
+                async with client.pipeline(transaction=False) as pipe:
+                    for member, increment in increments.items():
+                        pipe.zincrby(key, increment, encode_key(member))
+                    await pipe.execute()
+
+    async def get_top_scores(self, key, count: int) -> list:
+        """Returns the `count` highest scored members of the sorted set `key` with their score."""
+
+        async with self.RedisContextManager(self, 'get_top_scores') as client:
+            if client is not None:
+                members = await client.zrevrange(encode_key(key), 0, count - 1, withscores=True)
+                return [(member.decode(), score) for member, score in members]
+        return []
+
+    async def decay_scores(self, key, factor: float, keep: int):
+        """Multiplies all scores of the sorted set `key` by `factor` and keeps only its `keep` best members."""
+
+        key = encode_key(key)
+        async with self.RedisContextManager(self, 'decay_scores') as client:
+            if client is not None:
+                # a cluster has no MULTI over its pipeline, both commands still run in order on the key's node
+                async with client.pipeline(transaction=not self.cluster) as pipe:
+                    pipe.zunionstore(key, {key: factor})
+                    pipe.zremrangebyrank(key, 0, -keep - 1)
+                    await pipe.execute()
+
+    async def invalidate_pattern(
+            self, pattern: str, time_budget: float = None, progress=None, use_lua=False, cursor=0, scan_count=None,
+            batch_size=None):
+        """
+        Deletes the keys containing the given `pattern` in batches, see `api.invalidation`.
+        Returns an `InvalidationResult` with the cursor to resume from if the time budget ran out.
+        In a cluster the run can not be resumed and neither `use_lua` nor `cursor` apply.
+        """
+
+        async with self.RedisContextManager(self, 'invalidate_pattern') as client:
+            if client is not None:
+                match, scan_count = f'*{pattern}*', scan_count or self.scan_count
+                if self.cluster:
+                    result = await invalidation.async_invalidate_keys(
+                        client, client.scan_iter(match=match, count=scan_count), match,
+                        batch_size=batch_size or self.unlink_batch_size, time_budget=time_budget, progress=progress)
+                else:
+                    result = await invalidation.async_invalidate_pattern(
+                        client, match, scan_count=scan_count, batch_size=batch_size or self.unlink_batch_size,
+                        time_budget=time_budget, progress=progress, use_lua=use_lua, cursor=cursor)
+                logger.info('Cleared %d keys for %s in %.3fs.', result.deleted, result.pattern, result.elapsed)
+                return result
+
+    async def clear_on_pattern(self, pattern: str):
+        """
+        This Function matches the input search pattern and deletes that
+        specific redis resource containing the given `pattern`.
+        """
+
+        result = await self.invalidate_pattern(pattern)
+        if result is not None:
+            return result.deleted
+
+    async def flush_db(self):
+        """Deletes all cache from current."""
+        async with self.RedisContextManager(self, 'flush_db') as client:
+            if client is not None:
+                await client.flushdb()
+
+    async def flush_all(self):
+        """Deletes all cache."""
+        async with self.RedisContextManager(self, 'flush_all') as client:
+            if client is not None:
+                await client.flushall(asynchronous=True)
+
+    async def iter_matching_keys(self, pattern: str, scan_count=None):
+        """Yields the cache keys containing `pattern`, with SCAN instead of the blocking KEYS."""
+        async with self.RedisContextManager(self, 'iter_matching_keys') as client:
+            if client is not None:
+                async for key in client.scan_iter(match=f'*{pattern}*', count=scan_count or self.scan_count):
+                    yield key
+
+    async def get_matching_keys(self, pattern: str):
+        """Returns cache keys"""
+        return [key async for key in self.iter_matching_keys(pattern)]
+
+    async def run_script(self, script: str, keys: list = (), args: list = ()):
+        """Runs a Lua script with EVALSHA, it is loaded into redis when it is not known there yet."""
+
+        async with self.RedisContextManager(self, 'run_script') as client:
             if client is not None:
-                return client.keys(f'*{pattern}*')
+                if script not in self.scripts:
+                    self.scripts[script] = client.register_script(script)
+                return await self.scripts[script](keys=keys, args=args, client=client)
+
+    async def publish(self, channel: str, message):
+        """PUBLISH a json message on a channel."""
+        async with self.RedisContextManager(self, 'publish') as client:
+            if client is not None:
+                return await client.publish(channel, json.dumps(message))
+
+    async def subscribe(self, channel: str):
+        """SUBSCRIBE to a channel and yield its json messages."""
+        client = self._make_pubsub_client()
+        try:
+            async with client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    yield json.loads(message['data'])
+        finally:
+            # the node client of a cluster is made for this subscription
+            if client is not self.client:
+                await client.aclose()
 
 
 class FakeRedisClient(metaclass=SingletonMeta):
     """Fake Redis Client for tests."""
 
     def __init__(self, connected=True):
+        # test-only dependency, only imported when a fake client is used
+        import fakeredis
+
         self.server = fakeredis.FakeServer()
         self.connected = connected
         self.client = None
+        self.codec = JsonCodec()
+        self.compression = ValueCompression()
 
         if connected:
             self.fake_redis()
 
     def fake_redis(self):
         """Fake Redis Client for tests."""
+
+        import fakeredis
+
         self.server.connected = self.connected
         self.client = fakeredis.FakeRedis(server=self.server)
         return self.client
 
     @ensure_serializable_key
-    def get(self, key):
+    def get(self, key, raw=False):
         key = key.strip('"')
         data = self.client.get(key)
         res = None
         if data:
-            res = json.loads(data)
+            res = decode(data, raw)
         return res
 
     @ensure_serializable_key
-    def set(self, key, value):
+    def set(self, key, value, ex_seconds=None, nx=False, raw=False, index=None):
+        from unittest.mock import MagicMock
+
         key = key.strip('"')
         if isinstance(value, MagicMock):
             return True
-        return self.client.set(key, json.dumps(value))
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(key, encode(value, self.codec, self.compression, raw), ex=ex_seconds, nx=nx)
+            if index is not None:
+                add_to_index(pipe, index, [key], ex_seconds)
+            return pipe.execute()[0]
+
+    def get_many(self, keys: list, raw=False) -> list:
+        values = self.client.mget(keys) if keys else []
+        return [decode(value, raw) if value else None for value in values]
+
+    def set_many(self, mapping: dict, ex_seconds=None, raw=False, indexes: dict = None) -> list:
+        with self.client.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, encode(value, self.codec, self.compression, raw), ex=ex_seconds)
+            for index, keys in group_by_index(indexes).items():
+                add_to_index(pipe, index, keys, ex_seconds)
+            return pipe.execute()[:len(mapping)]
+
+    def get_ttls(self, keys: list) -> list:
+        with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.ttl(encode_key(key))
+            return pipe.execute()
+
+    def increment_scores(self, key, increments: dict):
+        with self.client.pipeline(transaction=False) as pipe:
+            for member, increment in increments.items():
+                pipe.zincrby(encode_key(key), increment, encode_key(member))
+            pipe.execute()
+
+    def get_top_scores(self, key, count: int) -> list:
+        members = self.client.zrevrange(encode_key(key), 0, count - 1, withscores=True)
+        return [(member.decode(), score) for member, score in members]
+
+    def decay_scores(self, key, factor: float, keep: int):
+        key = encode_key(key)
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.zunionstore(key, {key: factor})
+            pipe.zremrangebyrank(key, 0, -keep - 1)
+            pipe.execute()
+
+    def run_script(self, script: str, keys: list = (), args: list = ()):
+        return self.client.eval(script, len(keys), *keys, *args)
+
+    def get_fields(self, key, fields: list) -> list:
+        values = self.client.hmget(encode_key(key), fields) if fields else []
+        return [value.decode() if value is not None else None for value in values]
+
+    def set_fields(self, key, mapping: dict):
+        if mapping:
+            return self.client.hset(encode_key(key), mapping=mapping)
+
+    def get_index_members(self, index):
+        return [member.decode() for member in self.client.smembers(encode_key(index))]
+
+    def drop_index(self, index):
+        index = encode_key(index)
+        members = self.client.smembers(index)
+        return self.client.unlink(index, *members) - 1 if members else 0
+
+    def invalidate_pattern(
+            self, pattern: str, time_budget: float = None, progress=None, use_lua=False, cursor=0, scan_count=None,
+            batch_size=None):
+        return invalidation.invalidate_pattern(
+            self.client, f'*{pattern}*', scan_count=scan_count or 1000, batch_size=batch_size or 500,
+            time_budget=time_budget, progress=progress, use_lua=use_lua, cursor=cursor)
 
     def clear_on_pattern(self, pattern: str):
-        count = 1
-        pattern = f'*{pattern}*'
-        for key in self.client.scan_iter(match=pattern, count=1):
-            self.client.unlink(key)
-            count += 1
-        return count
+        return self.invalidate_pattern(pattern).deleted
+
+    def iter_matching_keys(self, pattern: str, scan_count=None):
+        yield from self.client.scan_iter(match=f'*{pattern}*', count=scan_count)
+
+    def get_memory_usage(self, keys: list) -> list:
+        # fakeredis has no MEMORY USAGE, the lengths of the key and the value stand in for it
+        results = []
+        for key in keys:
+            value = self.client.get(key) if self.client.type(key) == b'string' else None
+            results.append((len(encode_key(key)) + len(value or b''), value))
+        return results
 
     def get_all_keys(self):
         key_list = self.client.keys('*')
@@ -234,13 +948,135 @@ class FakeRedisClient(metaclass=SingletonMeta):
         return self.client.exists(key)
 
     def get_matching_keys(self, pattern: str):
-        return [json.dumps(key.decode()) for key in self.client.keys(f'*{pattern}*')]
+        return [key.decode() for key in self.client.keys(f'*{pattern}*')]
+
+    def publish(self, channel: str, message):
+        return self.client.publish(channel, json.dumps(message))
+
+
+class AsyncFakeRedisClient(metaclass=SingletonMeta):
+    """
+    Async Fake Redis Client for tests.
+
+    Wraps the `FakeRedisClient` so that awaiting code can be tested without binding
+    the fake server to a single event loop.
+    """
+
+    def __init__(self, connected=True):
+        self.sync_client = FakeRedisClient(connected=connected)
+
+    async def get(self, key, raw=False):
+        return self.sync_client.get(key, raw=raw)
+
+    async def set(self, key, value, ex_seconds=None, nx=False, raw=False, index=None):
+        return self.sync_client.set(key, value, ex_seconds=ex_seconds, nx=nx, raw=raw, index=index)
+
+    async def get_many(self, keys: list, raw=False) -> list:
+        return self.sync_client.get_many(keys, raw=raw)
+
+    async def set_many(self, mapping: dict, ex_seconds=None, raw=False, indexes: dict = None) -> list:
+        return self.sync_client.set_many(mapping, ex_seconds=ex_seconds, raw=raw, indexes=indexes)
+
+    async def get_ttls(self, keys: list) -> list:
+        return self.sync_client.get_ttls(keys)
+
+    async def increment_scores(self, key, increments: dict):
+        return self.sync_client.increment_scores(key, increments)
+
+    async def get_top_scores(self, key, count: int) -> list:
+        return self.sync_client.get_top_scores(key, count)
+
+    async def decay_scores(self, key, factor: float, keep: int):
+        return self.sync_client.decay_scores(key, factor, keep)
+
+    async def run_script(self, script: str, keys: list = (), args: list = ()):
+        return self.sync_client.run_script(script, keys=keys, args=args)
+
+    async def get_fields(self, key, fields: list) -> list:
+        return self.sync_client.get_fields(key, fields)
+
+    async def set_fields(self, key, mapping: dict):
+        return self.sync_client.set_fields(key, mapping)
+
+    async def get_index_members(self, index):
+        return self.sync_client.get_index_members(index)
+
+    async def drop_index(self, index):
+        return self.sync_client.drop_index(index)
+
+    async def invalidate_pattern(
+            self, pattern: str, time_budget: float = None, progress=None, use_lua=False, cursor=0, scan_count=None,
+            batch_size=None):
+        return self.sync_client.invalidate_pattern(
+            pattern, time_budget=time_budget, progress=progress, use_lua=use_lua, cursor=cursor, scan_count=scan_count,
+            batch_size=batch_size)
+
+    async def clear_on_pattern(self, pattern: str):
+        return self.sync_client.clear_on_pattern(pattern)
+
+    async def iter_matching_keys(self, pattern: str, scan_count=None):
+        for key in self.sync_client.iter_matching_keys(pattern, scan_count=scan_count):
+            yield key
+
+    async def get_all_keys(self):
+        return self.sync_client.get_all_keys()
+
+    async def delete(self, key):
+        return self.sync_client.delete(key)
+
+    async def get_pattern_keys(self, pattern: str):
+        return self.sync_client.get_pattern_keys(pattern)
+
+    async def flush_all(self):
+        """Deletes all cache."""
+
+        self.sync_client.flush_all()
+
+    async def flush_db(self):
+        """Deletes all cache from current."""
+
+        self.sync_client.flush_db()
+
+    async def exists(self, key):
+        return self.sync_client.exists(key)
+
+    async def get_matching_keys(self, pattern: str):
+        return self.sync_client.get_matching_keys(pattern)
+
+    async def publish(self, channel: str, message):
+        return self.sync_client.client.publish(channel, json.dumps(message))
+
+    async def subscribe(self, channel: str):
+        pubsub = self.sync_client.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        while True:
+            message = pubsub.get_message()
+            if message is None:
+                await asyncio.sleep(0.01)
+                continue
+            yield json.loads(message['data'])
+
+
+def get_redis(local_cache: bool = True):
+    """
+    get the async redis client to use. Without `local_cache` the client bypasses the L1 cache and its
+    invalidations, e.g. for locks which are never cached locally.
+    """
+
+    if settings.IS_TEST_ENV or settings.REDIS_FAKE:
+        redis_client = AsyncFakeRedisClient()
+    else:
+        redis_client = AsyncRedisClient.make_from_env()
+
+    if settings.L1_CACHE_ENABLED and local_cache:
+        return TwoTierCache(redis_client)
+    return redis_client
 
 
-def get_redis():
-    """ get the redis client to use. """
+def get_sync_redis():
+    """ get the blocking redis client to use outside the event loop (e.g. management commands). """
 
-    if settings.IS_TEST_ENV:
+    if settings.IS_TEST_ENV or settings.REDIS_FAKE:
         return FakeRedisClient()
 
     return RedisClient.make_from_env()
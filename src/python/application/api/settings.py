@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 import os
 import sys
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from environs import Env
 
 env = Env()
@@ -26,8 +27,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = env.str('SECRET_KEY', '')
 
+# api-only serving profile: only what the weather endpoints need on the request path, no admin,
+# sessions, auth, templates, database or API documentation
+API_ONLY = env.bool('API_ONLY', False)
+
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = env.bool('DEBUG', True)
+DEBUG = env.bool('DEBUG', not API_ONLY)
 
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', [])
 
@@ -44,8 +49,14 @@ INSTALLED_APPS = [
     'drf_spectacular',
     'weather.apps.WeatherConfig',
 ]
+if API_ONLY:
+    # serializers and schema decorators of DRF and drf_spectacular work without their apps
+    INSTALLED_APPS = [
+        'weather.apps.WeatherConfig',
+    ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,6 +65,13 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+if API_ONLY:
+    # stateless JSON endpoints: no sessions, users, forms or frames to handle
+    MIDDLEWARE = [
+        'api.middleware.MetricsMiddleware',
+        'django.middleware.security.SecurityMiddleware',
+        'django.middleware.common.CommonMiddleware',
+    ]
 
 ROOT_URLCONF = 'api.urls'
 
@@ -73,6 +91,10 @@ TEMPLATES = [
     },
 ]
 
+if API_ONLY:
+    # error pages fall back to django's built-in ones
+    TEMPLATES = []
+
 WSGI_APPLICATION = 'api.wsgi.application'
 
 # Database
@@ -84,6 +106,9 @@ DATABASES = {
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
+if API_ONLY:
+    # nothing is stored in a database, skips the connection handling on every request
+    DATABASES = {}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -103,6 +128,52 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Logging
+# https://docs.djangoproject.com/en/5.0/topics/logging/
+
+LOG_LEVEL = env.str('LOG_LEVEL', 'INFO')
+# write logs from a background thread instead of the request path
+LOG_QUEUE_HANDLER = env.bool('LOG_QUEUE_HANDLER', False)
+# fraction of the per-key cache messages which are logged
+LOG_KEY_SAMPLE_RATE = env.float('LOG_KEY_SAMPLE_RATE', 0.01)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'default': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'filters': {
+        'key_sampling': {
+            '()': 'api.log.SamplingFilter',
+            'rate': LOG_KEY_SAMPLE_RATE,
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'api.log.QueuedStreamHandler' if LOG_QUEUE_HANDLER else 'logging.StreamHandler',
+            'formatter': 'default',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'api.redis_client.keys': {
+            'filters': ['key_sampling'],
+        },
+        'weather': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_PARSER_CLASSES': (
         'rest_framework.parsers.JSONParser',
@@ -120,12 +191,15 @@ LANGUAGE_CODE = env.str('LANGUAGE_CODE', 'en-us')
 
 TIME_ZONE = env.str('TIME_ZONE', 'UTC')
 
-USE_I18N = env.bool('USE_I18N', True)
+USE_I18N = env.bool('USE_I18N', not API_ONLY)
 
 USE_TZ = env.bool('USE_TZ', True)
 
+# expose prometheus metrics on `/metrics`
+METRICS_ENABLED = env.bool('METRICS_ENABLED', True)
+
 # show Swagger and Open api spec endpoint
-SHOW_API_DOCUMENTATION = env.bool('SHOW_API_DOCUMENTATION', True)
+SHOW_API_DOCUMENTATION = env.bool('SHOW_API_DOCUMENTATION', True) and not API_ONLY
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
@@ -138,7 +212,92 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 DATA_ACCESS_URL = env.str('URL', 'https://api.openweathermap.org/data/2.5/weather')
+GROUP_DATA_ACCESS_URL = env.str('GROUP_URL', 'https://api.openweathermap.org/data/2.5/group')
 API_KEY = env.str('API_KEY')
+
+# pooled upstream http client
+UPSTREAM_HTTP2 = env.bool('UPSTREAM_HTTP2', True)
+UPSTREAM_MAX_CONNECTIONS = env.int('UPSTREAM_MAX_CONNECTIONS', 100)
+UPSTREAM_MAX_KEEPALIVE_CONNECTIONS = env.int('UPSTREAM_MAX_KEEPALIVE_CONNECTIONS', 20)
+UPSTREAM_KEEPALIVE_EXPIRY = env.float('UPSTREAM_KEEPALIVE_EXPIRY', 30.0)
+UPSTREAM_CONNECT_TIMEOUT = env.float('UPSTREAM_CONNECT_TIMEOUT', 2.0)
+UPSTREAM_READ_TIMEOUT = env.float('UPSTREAM_READ_TIMEOUT', 5.0)
+UPSTREAM_WRITE_TIMEOUT = env.float('UPSTREAM_WRITE_TIMEOUT', 5.0)
+UPSTREAM_POOL_TIMEOUT = env.float('UPSTREAM_POOL_TIMEOUT', 1.0)
+
+# total time budget of an upstream request including its retries
+UPSTREAM_DEADLINE_SECONDS = env.float('UPSTREAM_DEADLINE_SECONDS', 8.0)
+# retries of transport errors and 5xx responses, with full jitter exponential backoff
+UPSTREAM_RETRIES = env.int('UPSTREAM_RETRIES', 2)
+UPSTREAM_RETRY_BACKOFF_SECONDS = env.float('UPSTREAM_RETRY_BACKOFF_SECONDS', 0.1)
+UPSTREAM_RETRY_BACKOFF_MAX_SECONDS = env.float('UPSTREAM_RETRY_BACKOFF_MAX_SECONDS', 1.0)
+# send a second request when the first one is slower than this, `0` uses the observed p95 latency
+UPSTREAM_HEDGE_ENABLED = env.bool('UPSTREAM_HEDGE_ENABLED', False)
+UPSTREAM_HEDGE_DELAY_SECONDS = env.float('UPSTREAM_HEDGE_DELAY_SECONDS', 0.0)
+# fail fast for the cooldown after this many failed upstream requests in a row
+UPSTREAM_CIRCUIT_FAILURE_THRESHOLD = env.int('UPSTREAM_CIRCUIT_FAILURE_THRESHOLD', 5)
+UPSTREAM_CIRCUIT_COOLDOWN_SECONDS = env.float('UPSTREAM_CIRCUIT_COOLDOWN_SECONDS', 30)
+
+# token bucket shared by all workers in redis, limiting the upstream calls to the API key quota, e.g. `60` for
+# the free plan. `0`, the default, disables it
+UPSTREAM_RATE_LIMIT_PER_MINUTE = env.int('UPSTREAM_RATE_LIMIT_PER_MINUTE', 0)
+UPSTREAM_RATE_LIMIT_BURST = env.int('UPSTREAM_RATE_LIMIT_BURST', 10)
+# a cache miss waits this long for the budget before it is rejected
+UPSTREAM_RATE_LIMIT_MAX_WAIT_SECONDS = env.float('UPSTREAM_RATE_LIMIT_MAX_WAIT_SECONDS', 0.5)
+# status of rejected requests, 429 or 503, sent with a `Retry-After` header
+UPSTREAM_RATE_LIMIT_STATUS = env.int('UPSTREAM_RATE_LIMIT_STATUS', 429)
+# number of workers sharing the budget, each keeps to its share while redis is not available
+UPSTREAM_RATE_LIMIT_WORKERS = env.int('UPSTREAM_RATE_LIMIT_WORKERS', 1)
+
+# lock time in seconds to coalesce cache misses across workers, `0` only coalesces in-process
+SINGLE_FLIGHT_LOCK_SECONDS = env.int('SINGLE_FLIGHT_LOCK_SECONDS', 0)
+
+# serve cached data older than this many seconds while refreshing it in the background,
+# `0` disables it. `REDIS_TTL_SECONDS` is the hard TTL after which data is fetched synchronously.
+CACHE_SOFT_TTL_SECONDS = env.int('CACHE_SOFT_TTL_SECONDS', 0)
+
+# batch weather endpoint limits
+WEATHER_BATCH_MAX_SIZE = env.int('WEATHER_BATCH_MAX_SIZE', 200)
+WEATHER_BATCH_UPSTREAM_CONCURRENCY = env.int('WEATHER_BATCH_UPSTREAM_CONCURRENCY', 10)
+
+# city index of `python manage.py build_city_index`, see `weather.city_index`. With it the cities are
+# cached and fetched by their upstream id and unknown cities are answered with 404, empty disables it.
+CITY_INDEX_PATH = env.str('CITY_INDEX_PATH', '')
+# group the upstream requests of cities by id, which needs the city index, into requests of up to
+# `UPSTREAM_GROUP_MAX_SIZE` (at most 20) cities, sent this many seconds after the first one.
+# See `weather.upstream_batcher`
+UPSTREAM_GROUP_ENABLED = env.bool('UPSTREAM_GROUP_ENABLED', False)
+UPSTREAM_GROUP_WINDOW_SECONDS = env.float('UPSTREAM_GROUP_WINDOW_SECONDS', 0.005)
+UPSTREAM_GROUP_MAX_SIZE = env.int('UPSTREAM_GROUP_MAX_SIZE', 20)
+if UPSTREAM_GROUP_ENABLED and not CITY_INDEX_PATH:
+    raise ImproperlyConfigured('UPSTREAM_GROUP_ENABLED needs a CITY_INDEX_PATH, only cities by id are grouped.')
+
+# optional in-process (L1) cache in front of redis, its TTL is capped by `REDIS_TTL_SECONDS`
+L1_CACHE_ENABLED = env.bool('L1_CACHE_ENABLED', False)
+L1_CACHE_MAX_ENTRIES = env.int('L1_CACHE_MAX_ENTRIES', 10_000)
+L1_CACHE_MAX_BYTES = env.int('L1_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+L1_CACHE_TTL_SECONDS = env.int('L1_CACHE_TTL_SECONDS', 30)
+# redis pub/sub channel to fan out invalidations to other workers, empty disables it
+L1_CACHE_INVALIDATION_CHANNEL = env.str('L1_CACHE_INVALIDATION_CHANNEL', 'cache-invalidation')
+
+# request frequency tracking and refresh of the hottest weather keys before they expire, see `weather.warmup`
+WARMUP_TRACKING_ENABLED = env.bool('WARMUP_TRACKING_ENABLED', True)
+# each worker counts requests locally and writes them to redis at most this often
+WARMUP_TRACKING_FLUSH_SECONDS = env.float('WARMUP_TRACKING_FLUSH_SECONDS', 1.0)
+WARMUP_TOP_N = env.int('WARMUP_TOP_N', 200)
+WARMUP_CONCURRENCY = env.int('WARMUP_CONCURRENCY', 5)
+# upstream requests per second the warm-up may start
+WARMUP_RATE_PER_SECOND = env.float('WARMUP_RATE_PER_SECOND', 10.0)
+# keys which expire within this many seconds are refreshed
+WARMUP_REFRESH_BEFORE_SECONDS = env.int('WARMUP_REFRESH_BEFORE_SECONDS', 300)
+WARMUP_INTERVAL_SECONDS = env.int('WARMUP_INTERVAL_SECONDS', 60)
+# scores are multiplied by this after each run so the ranking follows recent traffic
+WARMUP_SCORE_DECAY = env.float('WARMUP_SCORE_DECAY', 0.5)
+WARMUP_TRACKED_KEYS = env.int('WARMUP_TRACKED_KEYS', 10_000)
+# run the warm-up scheduler inside the ASGI workers, one worker runs each cycle
+WARMUP_SCHEDULER_ENABLED = env.bool('WARMUP_SCHEDULER_ENABLED', False)
+# in-process fakeredis instead of a redis server, e.g. for benchmarks
+REDIS_FAKE = env.bool('REDIS_FAKE', False)
 IS_TEST_ENV = False
 if len(sys.argv) > 1 and sys.argv[1] == 'test':
     IS_TEST_ENV = True
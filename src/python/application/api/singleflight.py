@@ -0,0 +1,111 @@
+import asyncio
+import secrets
+import weakref
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Optional,
+)
+
+# deletes the lock only while it is still held with the token of the caller, not after it expired
+# and another worker took it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls for the same key.
+
+    The first caller for a key runs `func`, every concurrent caller with the same key awaits
+    that result instead of running `func` again. Flights are tracked per event loop. When a
+    redis client and `lock_seconds` are given, callers on other workers are coalesced too
+    through a short lived `SET NX` lock: the lock holder fetches and the others poll
+    `read_cached` until the result shows up in the cache or the lock expires. Callers without
+    `read_cached`, e.g. background refreshes, return `None` instead while another worker holds the
+    lock. The lock holds a random token and is only released by its holder.
+    """
+
+    def __init__(self, redis=None, lock_seconds: int = 0, poll_interval: float = 0.05):
+        self.redis = redis
+        self.lock_seconds = lock_seconds
+        self.poll_interval = poll_interval
+        self._flights = weakref.WeakKeyDictionary()
+
+    def __repr__(self):
+        return f'SingleFlight(lock_seconds={self.lock_seconds}, poll_interval={self.poll_interval})'
+
+    def in_flight(self, key) -> bool:
+        """To check a call for the given key is running on the current event loop."""
+
+        return key in self._flights.get(asyncio.get_running_loop(), {})
+
+    def start(
+            self,
+            key,
+            func: Callable[[], Awaitable[Any]],
+            read_cached: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> asyncio.Task:
+        """Start the call for `key` unless it is already running and return its task."""
+
+        loop = asyncio.get_running_loop()
+        flights = self._flights.setdefault(loop, {})
+        task = flights.get(key)
+        if task is None:
+            # the fetch runs in its own task so a cancelled caller does not cancel the others
+            task = loop.create_task(self._call(key, func, read_cached))
+            flights[key] = task
+            task.add_done_callback(lambda done: self._done(flights, key, done))
+
+        return task
+
+    async def do(
+            self,
+            key,
+            func: Callable[[], Awaitable[Any]],
+            read_cached: Optional[Callable[[], Awaitable[Any]]] = None,
+    ):
+        """Run `func` once for all concurrent callers of `key` and return its result."""
+
+        result = await asyncio.shield(self.start(key, func, read_cached))
+        if result is None and read_cached is not None:
+            # joined a call without `read_cached`, which left the fetch to another worker
+            result = await self._call(key, func, read_cached)
+        return result
+
+    @staticmethod
+    def _done(flights: dict, key, task: asyncio.Task):
+        flights.pop(key, None)
+        # background calls may have no one awaiting them, mark their errors as retrieved
+        if not task.cancelled():
+            task.exception()
+
+    async def _call(self, key, func, read_cached):
+        if self.redis is None or not self.lock_seconds:
+            return await func()
+
+        lock_key = f'lock:{key}'
+        token = secrets.token_hex(16).encode()
+        if await self.redis.set(lock_key, token, ex_seconds=self.lock_seconds, nx=True, raw=True):
+            try:
+                return await func()
+            finally:
+                await self.redis.run_script(RELEASE_LOCK_SCRIPT, keys=[lock_key], args=[token])
+
+        # another worker holds the lock, a best-effort call leaves the fetch to it
+        if read_cached is None:
+            return None
+        # otherwise wait for it to fill the cache
+        deadline = asyncio.get_running_loop().time() + self.lock_seconds
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            result = await read_cached()
+            if result is not None:
+                return result
+
+        return await func()
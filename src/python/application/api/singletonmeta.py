@@ -1,14 +1,35 @@
+import os
 import threading
 
 
 class SingletonMeta(type):
-    """Singleton metaclass (thread-safe)"""
+    """
+    Singleton metaclass (thread-safe).
+
+    An existing instance is returned without taking a lock, the first one is created under the
+    lock with double-checked locking. Instances are per process: a forked child, e.g. a gunicorn
+    worker, creates its own instead of sharing the sockets of its parent's.
+    """
     _instances = {}
+    # reentrant, creating an instance may create other singletons
+    _lock = threading.RLock()
 
     def __call__(cls, *args, **kwargs):
-        _lock = threading.Lock()
-        with _lock:
-            if cls not in cls._instances:
-                instance = super().__call__(*args, **kwargs)
-                cls._instances[cls] = instance
-        return cls._instances[cls]
+        instance = cls._instances.get(cls)
+        if instance is None:
+            with SingletonMeta._lock:
+                instance = cls._instances.get(cls)
+                if instance is None:
+                    instance = super().__call__(*args, **kwargs)
+                    cls._instances[cls] = instance
+        return instance
+
+    @staticmethod
+    def _reset_after_fork():
+        SingletonMeta._instances.clear()
+        # another thread of the parent may have held the lock while forking
+        SingletonMeta._lock = threading.RLock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=SingletonMeta._reset_after_fork)
@@ -0,0 +1,42 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api.circuit_breaker import CircuitBreaker
+
+
+class TestCircuitBreaker(TestCase):
+
+    def test_opens_after_consecutive_failures(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=2, cooldown_seconds=10)
+        circuit_breaker.record_failure()
+        self.assertTrue(circuit_breaker.allow())
+        circuit_breaker.record_failure()
+        self.assertFalse(circuit_breaker.allow())
+
+    def test_success_resets_failures(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=2, cooldown_seconds=10)
+        circuit_breaker.record_failure()
+        circuit_breaker.record_success()
+        circuit_breaker.record_failure()
+        self.assertTrue(circuit_breaker.allow())
+
+    def test_cooldown(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=10)
+        with mock.patch('api.circuit_breaker.time.monotonic', return_value=100):
+            circuit_breaker.record_failure()
+        with mock.patch('api.circuit_breaker.time.monotonic', return_value=109):
+            self.assertFalse(circuit_breaker.allow())
+        with mock.patch('api.circuit_breaker.time.monotonic', return_value=110):
+            self.assertTrue(circuit_breaker.allow())
+            # a failure after the cooldown opens the circuit again
+            circuit_breaker.record_failure()
+            self.assertFalse(circuit_breaker.allow())
+
+    def test_retry_after(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=10)
+        self.assertEqual(circuit_breaker.retry_after, 0)
+        with mock.patch('api.circuit_breaker.time.monotonic', return_value=100):
+            circuit_breaker.record_failure()
+        with mock.patch('api.circuit_breaker.time.monotonic', return_value=104):
+            self.assertEqual(circuit_breaker.retry_after, 6)
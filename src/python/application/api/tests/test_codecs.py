@@ -0,0 +1,101 @@
+from unittest import (
+    mock,
+    skipIf,
+)
+
+from django.test import TestCase
+
+from api.codecs import (
+    MSGPACK_HEADER,
+    ZLIB_HEADER,
+    UnknownFormatError,
+    ValueCompression,
+    decode_value,
+    decompress_value,
+    dumps_json,
+    get_codec,
+    get_compressor,
+    loads_json,
+    lz4,
+    msgpack,
+    zstandard,
+)
+from api.redis_client import decode
+
+value = {'city_name': 'Texarkana', 'temperature': 17.87, 'humidity': 74}
+
+
+class TestCodecs(TestCase):
+
+    def test_json_codecs_are_compatible(self):
+        json_codec = get_codec('json')
+        orjson_codec = get_codec('orjson')
+
+        self.assertDictEqual(orjson_codec.decode(json_codec.encode(value)), value)
+        self.assertDictEqual(json_codec.decode(orjson_codec.encode(value)), value)
+        # plain JSON has no header, so values written before codecs existed can be read
+        self.assertDictEqual(decode_value(b'{"humidity": 74}'), {'humidity': 74})
+        self.assertEqual(decode_value(b'"data1"'), 'data1')
+
+    @skipIf(msgpack is None, 'msgpack is not installed')
+    def test_msgpack_codec(self):
+        encoded = get_codec('msgpack').encode(value)
+        self.assertEqual(encoded[:1], MSGPACK_HEADER)
+        self.assertDictEqual(decode_value(encoded), value)
+
+    def test_unknown_header(self):
+        with self.assertRaises(UnknownFormatError):
+            decode_value(b'\x1f\x00')
+
+    def test_msgpack_value_without_msgpack(self):
+        # written by a worker with the msgpack codec, read by one without the package
+        with mock.patch('api.codecs.msgpack', None):
+            with self.assertRaises(UnknownFormatError):
+                decode_value(MSGPACK_HEADER + b'\x80')
+            with self.assertLogs('api.redis_client', 'WARNING'):
+                self.assertIsNone(decode(MSGPACK_HEADER + b'\x80'))
+
+    def test_compression_above_threshold(self):
+        compression = ValueCompression(get_compressor('zlib'), threshold=100)
+        large = {**value, 'description': 'overcast clouds ' * 20}
+
+        self.assertEqual(compression.pack(b'{"humidity": 74}'), b'{"humidity": 74}')
+        packed = compression.pack(get_codec('json').encode(large))
+        self.assertEqual(packed[:1], ZLIB_HEADER)
+        self.assertLess(len(packed), len(get_codec('json').encode(large)))
+        self.assertDictEqual(decode_value(packed), large)
+        # values which do not get smaller are stored as they are
+        self.assertEqual(compression.pack(bytes(range(128))), bytes(range(128)))
+        self.assertEqual(decompress_value(b'{"humidity": 74}'), b'{"humidity": 74}')
+
+    @skipIf(msgpack is None, 'msgpack is not installed')
+    def test_compressed_msgpack(self):
+        encoded = get_codec('msgpack').encode({**value, 'description': 'overcast clouds ' * 20})
+        packed = ValueCompression(get_compressor('zlib'), threshold=0).pack(encoded)
+
+        self.assertEqual(packed[:1], ZLIB_HEADER)
+        self.assertEqual(decompress_value(packed), encoded)
+
+    @skipIf(lz4 is None or zstandard is None, 'lz4 or zstandard is not installed')
+    def test_optional_compressors(self):
+        data = get_codec('json').encode({**value, 'description': 'overcast clouds ' * 20})
+        for name in ('lz4', 'zstd'):
+            with self.subTest(name=name):
+                packed = ValueCompression(get_compressor(name), threshold=0).pack(data)
+                self.assertLess(len(packed), len(data))
+                self.assertEqual(decompress_value(packed), data)
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            get_compressor('brotli')
+        self.assertIsNone(get_compressor('none'))
+        # corrupt values, or ones of a compression package which is not installed
+        with self.assertRaises(UnknownFormatError):
+            decode_value(ZLIB_HEADER + b'not zlib')
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            get_codec('pickle')
+
+    def test_dumps_and_loads_json(self):
+        self.assertDictEqual(loads_json(dumps_json(value)), value)
@@ -0,0 +1,84 @@
+import httpx
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from api.http_client import get_http_client
+from api.lifespan import LifespanApplication
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json={'path': request.url.path})
+
+
+class TestHttpClient(TestCase):
+
+    def setUp(self) -> None:
+        self.http_client = get_http_client()
+
+    async def test_client_is_reused_on_the_same_loop(self):
+        await self.http_client.start()
+        self.assertIs(self.http_client.client, self.http_client.client)
+        self.assertTrue(self.http_client.http2)
+        client = self.http_client.client
+        await self.http_client.aclose()
+        self.assertTrue(client.is_closed)
+        self.assertIsNot(self.http_client.client, client)
+        await self.http_client.aclose()
+
+    def test_client_is_closed_with_its_loop(self):
+        async def open_client():
+            return self.http_client.client
+
+        first = async_to_sync(open_client)()
+        second = async_to_sync(open_client)()
+        self.assertIsNot(first, second)
+        self.assertTrue(first.is_closed)
+        self.assertTrue(second.is_closed)
+
+    async def test_closed_client_is_replaced(self):
+        client = self.http_client.client
+        await client.aclose()
+        self.assertFalse(self.http_client.client.is_closed)
+        await self.http_client.aclose()
+
+    async def test_pool_stats(self):
+        await self.http_client.start()
+        self.assertDictEqual(self.http_client.pool_stats(), {
+            'in_use': 0, 'idle': 0, 'created': self.http_client.connections_created,
+            'max_connections': 100, 'max_keepalive_connections': 20,
+        })
+        await self.http_client.aclose()
+
+    async def test_get_uses_the_pooled_client(self):
+        await self.http_client.start()
+        self.http_client.client._transport = httpx.MockTransport(handler)
+        response = await self.http_client.get('https://example.com/weather')
+        self.assertEqual(response.json(), {'path': '/weather'})
+        await self.http_client.aclose()
+
+
+class TestLifespanApplication(TestCase):
+
+    async def test_lifespan_hooks(self):
+        calls = []
+
+        async def startup():
+            calls.append('startup')
+
+        async def shutdown():
+            calls.append('shutdown')
+
+        messages = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        application = LifespanApplication(None, on_startup=[startup], on_shutdown=[shutdown])
+        await application({'type': 'lifespan'}, receive, send)
+
+        self.assertListEqual(calls, ['startup', 'shutdown'])
+        self.assertListEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
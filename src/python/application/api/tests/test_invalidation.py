@@ -0,0 +1,119 @@
+from unittest import mock
+
+import fakeredis
+from django.test import TestCase
+
+from api.invalidation import (
+    async_invalidate_keys,
+    async_invalidate_pattern,
+    invalidate_keys,
+    invalidate_pattern,
+)
+
+
+class TestInvalidation(TestCase):
+
+    def setUp(self) -> None:
+        self.client = fakeredis.FakeRedis()
+        for index in range(50):
+            self.client.set(f'lang_en_q_London{index}_units_metric', index)
+        self.client.set('lang_en_q_Paris_units_metric', 1)
+
+    def test_invalidate_pattern(self):
+        progress = []
+        with mock.patch.object(self.client, 'unlink', wraps=self.client.unlink) as unlink:
+            result = invalidate_pattern(self.client, '*London*', scan_count=100, batch_size=7, progress=progress.append)
+
+        self.assertTrue(result.complete)
+        self.assertEqual(result.deleted, 50)
+        self.assertEqual(result.matched, 50)
+        self.assertEqual(result.cursor, 0)
+        self.assertEqual(len(progress), 1)
+        # 50 keys in batches of 7
+        self.assertEqual(unlink.call_count, 8)
+        self.assertListEqual(self.client.keys('*'), [b'lang_en_q_Paris_units_metric'])
+
+    def test_invalidate_pattern_with_lua(self):
+        result = invalidate_pattern(self.client, '*London*', scan_count=100, use_lua=True)
+
+        self.assertTrue(result.complete)
+        self.assertEqual(result.deleted, 50)
+        self.assertListEqual(self.client.keys('*'), [b'lang_en_q_Paris_units_metric'])
+
+    def test_time_budget_and_resume(self):
+        client = mock.MagicMock()
+        client.scan.side_effect = [(5, [b'key1', b'key2']), (9, [b'key3']), (0, [b'key4'])]
+        client.unlink.side_effect = lambda *keys: len(keys)
+
+        with mock.patch('api.invalidation.InvalidationResult.elapsed', new_callable=mock.PropertyMock) as elapsed:
+            elapsed.return_value = 10
+            result = invalidate_pattern(client, '*key*', time_budget=1)
+
+        self.assertFalse(result.complete)
+        self.assertEqual(result.cursor, 5)
+        self.assertEqual(result.deleted, 2)
+
+        resumed = invalidate_pattern(client, '*key*', cursor=result.cursor)
+        self.assertTrue(resumed.complete)
+        self.assertEqual(resumed.deleted, 2)
+        self.assertEqual(client.scan.call_args_list[1], mock.call(5, match='*key*', count=1000))
+
+    def test_progress_reports_the_cursor_to_resume_from(self):
+        client = mock.MagicMock()
+        client.scan.side_effect = [(5, [b'key1']), (9, [b'key2']), (0, [b'key3'])]
+        client.unlink.side_effect = lambda *keys: len(keys)
+
+        cursors = []
+        invalidate_pattern(client, '*key*', progress=lambda progress: cursors.append(progress.cursor))
+
+        self.assertListEqual(cursors, [5, 9, 0])
+
+    async def test_async_invalidate_pattern(self):
+        client = mock.AsyncMock()
+        client.scan.side_effect = [(5, [b'key1', b'key2']), (0, [b'key3'])]
+        client.unlink.side_effect = lambda *keys: len(keys)
+
+        cursors = []
+        result = await async_invalidate_pattern(
+            client, '*key*', batch_size=1, progress=lambda progress: cursors.append(progress.cursor))
+
+        self.assertTrue(result.complete)
+        self.assertEqual(result.deleted, 3)
+        self.assertEqual(client.unlink.await_count, 3)
+        self.assertListEqual(cursors, [5, 0])
+
+    def test_invalidate_keys(self):
+        progress = []
+        keys = self.client.scan_iter(match='*London*', count=100)
+        with mock.patch.object(self.client, 'unlink', wraps=self.client.unlink) as unlink:
+            result = invalidate_keys(self.client, keys, '*London*', batch_size=7, progress=progress.append)
+
+        self.assertTrue(result.complete)
+        self.assertEqual(result.deleted, 50)
+        self.assertEqual(result.matched, 50)
+        self.assertEqual(unlink.call_count, 8)
+        self.assertEqual(len(progress), 8)
+        self.assertListEqual(self.client.keys('*'), [b'lang_en_q_Paris_units_metric'])
+
+    def test_invalidate_keys_time_budget(self):
+        with mock.patch('api.invalidation.InvalidationResult.elapsed', new_callable=mock.PropertyMock) as elapsed:
+            elapsed.return_value = 10
+            result = invalidate_keys(self.client, self.client.scan_iter(match='*London*'), '*London*',
+                                     batch_size=10, time_budget=1)
+
+        self.assertFalse(result.complete)
+        self.assertEqual(result.deleted, 10)
+
+    async def test_async_invalidate_keys(self):
+        async def keys():
+            for key in [b'key1', b'key2', b'key3']:
+                yield key
+
+        client = mock.AsyncMock()
+        client.unlink.side_effect = lambda *keys: len(keys)
+
+        result = await async_invalidate_keys(client, keys(), '*key*', batch_size=2)
+
+        self.assertTrue(result.complete)
+        self.assertEqual(result.deleted, 3)
+        self.assertEqual(client.unlink.await_count, 2)
@@ -0,0 +1,24 @@
+from django.test import SimpleTestCase
+
+from api.lazy import cached_classproperty
+
+
+class TestCachedClassproperty(SimpleTestCase):
+
+    def test_built_once_on_first_access_and_shared_with_subclasses(self):
+        calls = []
+
+        class Base:
+            @cached_classproperty
+            def client(cls):
+                calls.append(cls)
+                return object()
+
+        class Child(Base):
+            pass
+
+        self.assertListEqual(calls, [])
+        client = Child.client
+        self.assertIs(Base.client, client)
+        self.assertIs(Child().client, client)
+        self.assertListEqual(calls, [Base])
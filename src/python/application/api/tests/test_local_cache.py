@@ -0,0 +1,191 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import (
+    TestCase,
+    override_settings,
+)
+
+from api.local_cache import (
+    LocalCache,
+    TwoTierCache,
+)
+from api.redis_client import get_redis
+
+
+class TestLocalCache(TestCase):
+
+    def test_get_and_set(self):
+        cache = LocalCache()
+        self.assertTrue(cache.set('test1', {'data': 1}))
+        self.assertDictEqual(cache.get('test1'), {'data': 1})
+        self.assertIsNone(cache.get('test2'))
+
+    def test_ttl_expiry(self):
+        cache = LocalCache(ttl_seconds=10)
+        with mock.patch('api.local_cache.time.monotonic', return_value=100):
+            cache.set('test1', 'data1')
+        with mock.patch('api.local_cache.time.monotonic', return_value=109):
+            self.assertEqual(cache.get('test1'), 'data1')
+        with mock.patch('api.local_cache.time.monotonic', return_value=110):
+            self.assertIsNone(cache.get('test1'))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size_bytes, 0)
+
+    def test_ttl_is_capped(self):
+        cache = LocalCache(ttl_seconds=10)
+        with mock.patch('api.local_cache.time.monotonic', return_value=100):
+            cache.set('test1', 'data1', ttl_seconds=3600)
+        with mock.patch('api.local_cache.time.monotonic', return_value=110):
+            self.assertIsNone(cache.get('test1'))
+
+    def test_lru_eviction_by_entries(self):
+        cache = LocalCache(max_entries=2)
+        cache.set('test1', 'data1')
+        cache.set('test2', 'data2')
+        # touch test1 so test2 becomes the least recently used entry
+        cache.get('test1')
+        cache.set('test3', 'data3')
+
+        self.assertEqual(cache.get('test1'), 'data1')
+        self.assertIsNone(cache.get('test2'))
+        self.assertEqual(cache.get('test3'), 'data3')
+
+    def test_eviction_by_bytes(self):
+        # every value below is 7 bytes once json encoded
+        cache = LocalCache(max_bytes=14)
+        cache.set('test1', 'data1')
+        cache.set('test2', 'data2')
+        cache.set('test3', 'data3')
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size_bytes, 14)
+        self.assertIsNone(cache.get('test1'))
+        self.assertFalse(cache.set('too_big', 'x' * 20))
+
+    def test_expired_entries_are_evicted_first(self):
+        cache = LocalCache(max_entries=2, ttl_seconds=10)
+        with mock.patch('api.local_cache.time.monotonic', return_value=100):
+            cache.set('test1', 'data1', ttl_seconds=1)
+            cache.set('test2', 'data2')
+        with mock.patch('api.local_cache.time.monotonic', return_value=105):
+            cache.get('test1')
+            cache.set('test3', 'data3')
+            self.assertEqual(cache.get('test2'), 'data2')
+            self.assertEqual(cache.get('test3'), 'data3')
+
+    def test_delete_and_clear_on_pattern(self):
+        cache = LocalCache()
+        cache.set('lang_en_q_London_units_metric', 'data1')
+        cache.set('lang_de_q_London_units_metric', 'data2')
+        cache.set('lang_en_q_Paris_units_metric', 'data3')
+
+        self.assertEqual(cache.delete('lang_en_q_Paris_units_metric'), 1)
+        self.assertEqual(cache.delete('notAvailable'), 0)
+        self.assertEqual(cache.clear_on_pattern('London'), 2)
+        self.assertEqual(len(cache), 0)
+
+
+class TestTwoTierCache(TestCase):
+
+    def setUp(self) -> None:
+        self.redis = get_redis()
+        self.cache = TwoTierCache(self.redis)
+        self.cache.local_cache.clear()
+        self.cache.stats = dict.fromkeys(self.cache.stats, 0)
+
+    def tearDown(self) -> None:
+        async_to_sync(self.cache.flush_all)()
+
+    async def test_hit_and_miss_counters(self):
+        await self.redis.set('test1', 'data1')
+
+        self.assertEqual(await self.cache.get('test1'), 'data1')
+        self.assertEqual(await self.cache.get('test1'), 'data1')
+        self.assertIsNone(await self.cache.get('test2'))
+
+        stats = self.cache.cache_stats()
+        self.assertEqual(stats['l1_hits'], 1)
+        self.assertEqual(stats['l1_misses'], 2)
+        self.assertEqual(stats['l2_hits'], 1)
+        self.assertEqual(stats['l2_misses'], 1)
+        self.assertEqual(stats['l1_entries'], 1)
+
+    async def test_set_writes_through(self):
+        self.assertTrue(await self.cache.set('test1', 'data1'))
+        self.assertEqual(await self.redis.get('test1'), 'data1')
+        self.assertEqual(self.cache.local_cache.get('test1'), 'data1')
+
+        # conditional writes are not kept locally
+        await self.cache.set('lock:test1', 1, nx=True)
+        self.assertIsNone(self.cache.local_cache.get('lock:test1'))
+
+    async def test_get_many_and_set_many(self):
+        await self.redis.set('test1', 'data1')
+        await self.cache.set_many({'test2': 'data2'})
+
+        self.assertListEqual(await self.cache.get_many(['test1', 'test2', 'test3']), ['data1', 'data2', None])
+        self.assertEqual(self.cache.local_cache.get('test1'), 'data1')
+        self.assertEqual(self.cache.stats['l1_hits'], 1)
+        self.assertEqual(self.cache.stats['l2_hits'], 1)
+        self.assertEqual(self.cache.stats['l2_misses'], 1)
+
+    async def test_delete_and_clear_on_pattern_invalidate(self):
+        await self.cache.set('test1', 'data1')
+        await self.cache.set('test55', 'data5')
+
+        await self.cache.delete('test1')
+        self.assertIsNone(await self.cache.get('test1'))
+
+        await self.cache.clear_on_pattern('test5')
+        self.assertIsNone(self.cache.local_cache.get('test55'))
+        self.assertIsNone(await self.cache.get('test55'))
+
+    async def test_drop_index_invalidates(self):
+        await self.cache.set('w1:london:m:en', 'data1', index='w1:i:london')
+        await self.cache.set_many({'w1:london:i:de': 'data2'}, indexes={'w1:london:i:de': 'w1:i:london'})
+
+        self.assertEqual(await self.cache.drop_index('w1:i:london'), 2)
+        self.assertIsNone(self.cache.local_cache.get('w1:london:m:en'))
+        self.assertListEqual(await self.cache.get_many(['w1:london:m:en', 'w1:london:i:de']), [None, None])
+
+    @override_settings(L1_CACHE_ENABLED=True)
+    def test_get_redis_without_local_cache(self):
+        self.assertIsInstance(get_redis(), TwoTierCache)
+        self.assertIs(get_redis(local_cache=False), self.redis)
+
+    async def test_invalidation_from_other_workers(self):
+        self.cache.local_cache.set('test1', 'data1')
+        await self.cache.start()
+        # give the listener a chance to subscribe before another worker publishes
+        await asyncio.sleep(0.02)
+        await self.redis.publish(self.cache.invalidation_channel, {'key': 'test1'})
+        await asyncio.sleep(0.05)
+        await self.cache.aclose()
+
+        self.assertIsNone(self.cache.local_cache.get('test1'))
+
+    async def test_invalidation_listener_resubscribes(self):
+        subscriptions = []
+
+        async def subscribe(channel):
+            subscriptions.append(channel)
+            if len(subscriptions) == 1:
+                raise ConnectionError('connection reset')
+            await asyncio.Event().wait()
+            yield
+
+        self.cache.local_cache.set('test2', 'data2')
+        with mock.patch.object(self.cache.redis, 'subscribe', subscribe), \
+                mock.patch.object(self.cache, 'reconnect_seconds', 0.01), \
+                self.assertLogs('api.local_cache', 'WARNING'):
+            await self.cache.start()
+            await asyncio.sleep(0.05)
+            await self.cache.aclose()
+
+        self.assertEqual(len(subscriptions), 2)
+        self.assertEqual(self.cache.stats['l1_invalidation_errors'], 1)
+        # the keys cached while unsubscribed are dropped
+        self.assertIsNone(self.cache.local_cache.get('test2'))
+
@@ -0,0 +1,45 @@
+import io
+import logging
+from unittest import mock
+
+from django.test import TestCase
+
+from api.log import (
+    QueuedStreamHandler,
+    SamplingFilter,
+)
+
+
+class TestSamplingFilter(TestCase):
+
+    def setUp(self) -> None:
+        self.record = logging.LogRecord('api.redis_client.keys', logging.DEBUG, __file__, 1, 'key: %s', ('k',), None)
+
+    def test_full_rate_lets_everything_through(self):
+        self.assertTrue(SamplingFilter(rate=1).filter(self.record))
+
+    def test_rate_samples_records(self):
+        sampling_filter = SamplingFilter(rate=0.1)
+        with mock.patch('api.log.random.random', return_value=0.05):
+            self.assertTrue(sampling_filter.filter(self.record))
+        with mock.patch('api.log.random.random', return_value=0.5):
+            self.assertFalse(sampling_filter.filter(self.record))
+
+
+class TestQueuedStreamHandler(TestCase):
+
+    def test_records_are_written_by_the_listener(self):
+        stream = io.StringIO()
+        handler = QueuedStreamHandler(stream=stream)
+        handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        logger = logging.getLogger('api.tests.queued')
+        logger.addHandler(handler)
+        logger.propagate = False
+        try:
+            logger.warning('Cleared cache for %s.', '*London*')
+        finally:
+            logger.removeHandler(handler)
+            # closing the handler flushes the queue
+            handler.close()
+
+        self.assertEqual(stream.getvalue(), 'WARNING Cleared cache for *London*.\n')
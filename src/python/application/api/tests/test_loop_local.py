@@ -0,0 +1,69 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from api.loop_local import LoopLocal
+
+
+class Pool:
+
+    def __init__(self):
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+class TestLoopLocal(TestCase):
+
+    def setUp(self) -> None:
+        self.pools = LoopLocal(Pool, close=lambda pool: pool.aclose())
+
+    def test_one_object_per_loop_closed_with_its_loop(self):
+        async def get():
+            return self.pools.get(), self.pools.get()
+
+        first, same = asyncio.run(get())
+        other, _ = async_to_sync(get)()
+
+        self.assertIs(first, same)
+        self.assertIsNot(first, other)
+        self.assertTrue(first.closed)
+        self.assertTrue(other.closed)
+        self.assertEqual(len(self.pools), 0)
+
+    async def test_aclose(self):
+        pool = self.pools.get()
+
+        await self.pools.aclose()
+
+        self.assertTrue(pool.closed)
+        self.assertIsNone(self.pools.peek())
+        self.assertIsNot(self.pools.get(), pool)
+        await self.pools.aclose()
+
+    def test_replaced_objects_are_closed_with_the_loop(self):
+        replacement = Pool()
+
+        async def replace():
+            pool = self.pools.get()
+            self.pools.set(replacement)
+            self.assertIs(self.pools.get(), replacement)
+            return pool
+
+        pool = asyncio.run(replace())
+
+        self.assertTrue(pool.closed)
+        self.assertFalse(replacement.closed)
+
+    def test_close_errors_are_logged(self):
+        pools = LoopLocal(Pool, close=mock.AsyncMock(side_effect=OSError('reset')))
+
+        async def get():
+            return pools.get()
+
+        with self.assertLogs('api.loop_local', 'WARNING'):
+            asyncio.run(get())
+        self.assertEqual(len(pools), 0)
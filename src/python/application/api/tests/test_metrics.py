@@ -0,0 +1,76 @@
+from django.test import (
+    override_settings,
+    AsyncClient,
+    TestCase,
+)
+from django.urls import reverse
+
+from api.metrics import (
+    REGISTRY,
+    Counter,
+    GaugeCollector,
+    Histogram,
+)
+
+
+class TestMetrics(TestCase):
+
+    def test_counter(self):
+        counter = Counter('lookups', 'Lookups.', ('result',))
+        counter.inc(result='hit')
+        counter.inc(2, result='hit')
+        counter.inc(result='miss')
+
+        self.assertEqual(counter.get(result='hit'), 3)
+        self.assertEqual(counter.render(), '\n'.join([
+            '# HELP lookups Lookups.',
+            '# TYPE lookups counter',
+            'lookups_total{result="hit"} 3',
+            'lookups_total{result="miss"} 1',
+        ]))
+
+    def test_histogram(self):
+        histogram = Histogram('latency_seconds', 'Latency.', ('operation',), buckets=(0.1, 1))
+        histogram.observe(0.05, operation='get')
+        histogram.observe(0.5, operation='get')
+        histogram.observe(5, operation='get')
+
+        self.assertEqual(histogram.get_count(operation='get'), 3)
+        self.assertEqual(histogram.render(), '\n'.join([
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{operation="get",le="0.1"} 1',
+            'latency_seconds_bucket{operation="get",le="1"} 2',
+            'latency_seconds_bucket{operation="get",le="+Inf"} 3',
+            'latency_seconds_count{operation="get"} 3',
+            'latency_seconds_sum{operation="get"} 5.55',
+        ]))
+
+    def test_histogram_time_updates_labels(self):
+        histogram = Histogram('upstream_seconds', 'Upstream.', ('status_code',))
+        with histogram.time(status_code='error') as labels:
+            labels['status_code'] = 200
+
+        self.assertEqual(histogram.get_count(status_code=200), 1)
+        self.assertEqual(histogram.get_count(status_code='error'), 0)
+
+    def test_gauge_collector(self):
+        gauge = GaugeCollector('pool', 'Pool.', lambda: {'idle': 2, 'in_use': 1}, ('state',))
+        self.assertIn('pool{state="idle"} 2', gauge.render())
+
+
+@override_settings(ROOT_URLCONF='api.urls')
+class TestMetricsView(TestCase):
+
+    async def test_metrics_endpoint(self):
+        client = AsyncClient()
+        await client.get(reverse('weather'))
+        response = await client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', content)
+        self.assertIn('view="weather",method="GET",status_code="400"', content)
+        self.assertIn('serializer="WeatherQuerySerializer",outcome="invalid"', content)
+        self.assertIn('upstream_pool_connections{state="idle"}', content)
+        self.assertEqual(REGISTRY.get('http_request_duration_seconds').type, 'histogram')
@@ -0,0 +1,90 @@
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from api.metrics import UPSTREAM_RATE_LIMIT_DECISIONS
+from api.rate_limiter import (
+    RateLimiter,
+    RateLimitExceeded,
+    TokenBucket,
+    get_rate_limiter,
+    retry_after_header,
+)
+from api.redis_client import get_redis
+
+
+class TestTokenBucket(TestCase):
+
+    def test_take(self):
+        bucket = TokenBucket(capacity=2, rate=1)
+        self.assertTrue(bucket.take()[0])
+        self.assertTrue(bucket.take()[0])
+
+        allowed, tokens, retry_after = bucket.take()
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 1 - tokens)
+
+    def test_refill(self):
+        bucket = TokenBucket(capacity=2, rate=1)
+        bucket.tokens = 0
+        bucket.updated_at = time.monotonic() - 10
+        self.assertTrue(bucket.take()[0])
+        self.assertEqual(bucket.tokens, 1)
+
+
+class TestRateLimiter(TestCase):
+
+    def setUp(self) -> None:
+        self.redis = get_redis()
+
+    def tearDown(self) -> None:
+        async_to_sync(self.redis.flush_all)()
+
+    async def test_budget_is_shared_through_redis(self):
+        limiter = RateLimiter(self.redis, calls_per_minute=60, burst=2)
+        other_worker = RateLimiter(self.redis, calls_per_minute=60, burst=2)
+        await limiter.acquire()
+        await other_worker.acquire()
+
+        with self.assertRaises(RateLimitExceeded) as context:
+            await limiter.acquire()
+        self.assertTrue(0 < context.exception.retry_after <= 1)
+        self.assertLess(limiter.quota_stats()['tokens_available'], 1)
+        self.assertGreater(UPSTREAM_RATE_LIMIT_DECISIONS.get(outcome='rejected', backend='redis'), 0)
+
+    async def test_queues_briefly(self):
+        limiter = RateLimiter(self.redis, calls_per_minute=600, burst=1, max_wait_seconds=0.5)
+        await limiter.acquire()
+
+        started_at = time.monotonic()
+        await limiter.acquire()
+        self.assertGreater(time.monotonic() - started_at, 0.05)
+
+        with self.assertRaises(RateLimitExceeded):
+            await limiter.acquire(max_wait_seconds=0)
+
+    async def test_local_fallback(self):
+        redis = mock.MagicMock()
+        redis.run_script = mock.AsyncMock(return_value=None)
+        limiter = RateLimiter(redis, calls_per_minute=60, burst=4, workers=2)
+
+        await limiter.acquire()
+        await limiter.acquire()
+        # each of the two workers only takes its half of the burst
+        with self.assertRaises(RateLimitExceeded):
+            await limiter.acquire()
+        self.assertGreater(UPSTREAM_RATE_LIMIT_DECISIONS.get(outcome='allowed', backend='local'), 0)
+
+    async def test_disabled(self):
+        limiter = RateLimiter(self.redis, calls_per_minute=0)
+        for _ in range(20):
+            await limiter.acquire()
+
+    def test_singleton(self):
+        self.assertIs(get_rate_limiter(), get_rate_limiter())
+
+    def test_retry_after_header(self):
+        self.assertEqual(retry_after_header(0.2), '1')
+        self.assertEqual(retry_after_header(2.5), '3')
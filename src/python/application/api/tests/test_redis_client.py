@@ -1,12 +1,64 @@
+import asyncio
+import os
+from unittest import mock
+
+import fakeredis
+import redis.asyncio as async_redis
+from asgiref.sync import async_to_sync
 from django.test import TestCase
 
-from api.redis_client import get_redis
+from api.codecs import ZLIB_HEADER
+from api.redis_client import (
+    AsyncRedisClient,
+    RedisClient,
+    get_redis,
+    get_sync_redis,
+    parse_addresses,
+)
+from api.singletonmeta import SingletonMeta
+
+# the nodes of the local multi-node harness, one fake server per `host:port`
+FAKE_NODES = {}
+
+
+def fake_server(host, port) -> fakeredis.FakeServer:
+    return FAKE_NODES.setdefault((host, int(port)), fakeredis.FakeServer())
+
+
+class MultiNodeRedisClient(RedisClient):
+    """A `RedisClient` whose nodes are fake servers, replication is left to the tests."""
+
+    def _make_node_client(self, host, port):
+        return fakeredis.FakeRedis(server=fake_server(host, port))
+
+
+class AsyncMultiNodeRedisClient(AsyncRedisClient):
+    """An `AsyncRedisClient` whose nodes are fake servers, replication is left to the tests."""
+
+    def _make_node_client(self, host, port):
+        return fakeredis.aioredis.FakeRedis(server=fake_server(host, port))
+
+
+class MultiNodeTestCase(TestCase):
+
+    def setUp(self) -> None:
+        FAKE_NODES.clear()
+
+    def make_client(self, cls, **kwargs):
+        """Returns a new instance of the singleton `cls`, it is dropped after the test."""
+
+        SingletonMeta._instances.pop(cls, None)
+        self.addCleanup(SingletonMeta._instances.pop, cls, None)
+        return cls(**kwargs)
+
+    def node(self, port: int, host: str = 'localhost') -> fakeredis.FakeRedis:
+        return fakeredis.FakeRedis(server=fake_server(host, port))
 
 
 class TestRedisClient(TestCase):
 
     def setUp(self) -> None:
-        self.redis = get_redis()
+        self.redis = get_sync_redis()
         self.redis.set('test1', 'data1')
         self.redis.set('test5', 'data5')
         self.redis.set('test55', 'data5')
@@ -35,3 +87,296 @@ class TestRedisClient(TestCase):
     def test_delete_method(self):
         self.assertEqual(self.redis.delete('test5'), 1)
         self.assertEqual(self.redis.delete('notAvailable'), 0)
+
+
+class TestRedisClientConnection(TestCase):
+
+    def setUp(self) -> None:
+        self.redis = RedisClient()
+        self.server = fakeredis.FakeServer()
+        self.redis.client = fakeredis.FakeRedis(server=self.server)
+        self.redis.circuit_breaker.record_success()
+        self.redis.stats = dict.fromkeys(self.redis.stats, 0)
+
+    def test_operations_use_the_long_lived_client(self):
+        self.assertTrue(self.redis.set('test1', 'data1'))
+        self.assertEqual(self.redis.get('test1'), 'data1')
+        self.assertEqual(self.redis.exists('test1'), 1)
+
+    def test_keys_are_stored_as_they_are(self):
+        self.redis.set('w1:london:m:en', 'data1')
+        self.assertListEqual(self.redis.client.keys('*'), [b'w1:london:m:en'])
+
+    def test_index(self):
+        self.assertTrue(self.redis.set('w1:london:m:en', 'data1', index='w1:i:london'))
+        self.assertTrue(self.redis.set('w1:london:i:de', 'data2', index='w1:i:london'))
+        self.assertTrue(self.redis.set('w1:paris:m:en', 'data3', index='w1:i:paris'))
+        self.assertCountEqual(self.redis.get_index_members('w1:i:london'), ['w1:london:m:en', 'w1:london:i:de'])
+        self.assertGreater(self.redis.client.ttl('w1:i:london'), 0)
+
+        self.assertEqual(self.redis.drop_index('w1:i:london'), 2)
+        self.assertCountEqual(self.redis.client.keys('*'), [b'w1:paris:m:en', b'w1:i:paris'])
+        self.assertEqual(self.redis.drop_index('w1:i:london'), 0)
+
+    def test_values_are_compressed_above_the_threshold(self):
+        self.redis.set('plain', 'data1')
+        SingletonMeta._instances.pop(RedisClient, None)
+        self.addCleanup(SingletonMeta._instances.pop, RedisClient, None)
+        env = {'REDIS_VALUE_COMPRESSION': 'zlib', 'REDIS_VALUE_COMPRESSION_THRESHOLD': '64'}
+        with mock.patch.dict(os.environ, env):
+            redis = RedisClient()
+        redis.client = self.redis.client
+        value = {'description': 'overcast clouds ' * 10}
+
+        self.assertTrue(redis.set('large', value))
+        self.assertTrue(redis.set('raw', b'{"v":1,"data":%s}' % (b'"overcast clouds"' * 10), raw=True))
+        self.assertTrue(redis.set('small', 'data2'))
+
+        self.assertEqual(redis.client.get('large')[:1], ZLIB_HEADER)
+        self.assertEqual(redis.client.get('raw')[:1], ZLIB_HEADER)
+        self.assertEqual(redis.client.get('small'), b'"data2"')
+        self.assertDictEqual(redis.get('large'), value)
+        self.assertEqual(redis.get('raw', raw=True), b'{"v":1,"data":%s}' % (b'"overcast clouds"' * 10))
+        # clients without compression read the compressed values, and the old values are read as they are
+        self.assertDictEqual(self.redis.get('large'), value)
+        self.assertEqual(redis.get('plain'), 'data1')
+
+    def test_failures_open_the_circuit(self):
+        self.server.connected = False
+        with self.assertLogs('api.redis_client', 'WARNING') as logs:
+            for _ in range(self.redis.circuit_breaker.failure_threshold):
+                self.assertIsNone(self.redis.get('test1'))
+        self.assertIn('Redis operation failed', logs.output[0])
+        self.assertEqual(self.redis.stats['failures'], self.redis.circuit_breaker.failure_threshold)
+
+        # redis is skipped while the circuit is open
+        self.server.connected = True
+        self.assertIsNone(self.redis.get('test1'))
+        self.assertEqual(self.redis.stats['skipped'], 1)
+
+
+class TestAsyncRedisClientConnection(TestCase):
+
+    def test_client_per_event_loop(self):
+        redis = AsyncRedisClient()
+
+        async def clients():
+            return redis.client, redis.client
+
+        first, same = asyncio.run(clients())
+        other, _ = asyncio.run(clients())
+        self.assertIs(first, same)
+        self.assertIsNot(first, other)
+        self.assertIsNot(first.connection_pool, other.connection_pool)
+
+    def test_clients_are_closed_with_their_loop(self):
+        SingletonMeta._instances.pop(AsyncMultiNodeRedisClient, None)
+        self.addCleanup(SingletonMeta._instances.pop, AsyncMultiNodeRedisClient, None)
+        redis = AsyncMultiNodeRedisClient()
+        redis._clients.close = mock.AsyncMock()
+
+        async def set_and_get():
+            await redis.set('test1', 'data1')
+            return redis.client, await redis.get('test1')
+
+        # like `runserver` and WSGI servers, every request runs on a new loop
+        first, value = async_to_sync(set_and_get)()
+        second, value_again = async_to_sync(set_and_get)()
+
+        self.assertEqual((value, value_again), ('data1', 'data1'))
+        self.assertIsNot(first, second)
+        self.assertListEqual(redis._clients.close.await_args_list, [mock.call((first, [])), mock.call((second, []))])
+        self.assertEqual(len(redis._clients), 0)
+
+    async def test_run_script_loads_it_once(self):
+        redis = AsyncRedisClient()
+        redis.client = fakeredis.aioredis.FakeRedis()
+        redis.scripts.clear()
+        redis.circuit_breaker.record_success()
+
+        script = "return redis.call('INCR', KEYS[1])"
+        self.assertEqual(await redis.run_script(script, keys=['counter']), 1)
+        self.assertEqual(await redis.run_script(script, keys=['counter']), 2)
+        self.assertEqual(len(redis.scripts), 1)
+
+
+class TestAsyncRedisClient(TestCase):
+
+    def setUp(self) -> None:
+        self.redis = get_redis()
+        async_to_sync(self.redis.set)('test1', 'data1')
+        async_to_sync(self.redis.set)('test5', 'data5')
+        async_to_sync(self.redis.set)('some_test51_text', 'data5')
+
+    def tearDown(self) -> None:
+        async_to_sync(self.redis.flush_all)()
+
+    async def test_set_method(self):
+        self.assertTrue(await self.redis.set('test_set1', 'data1'))
+        self.assertTrue(await self.redis.set('test_set2', 5))
+
+        with self.assertRaises(TypeError):
+            await self.redis.set('missing_value', )
+
+    async def test_get_method(self):
+        self.assertEqual(await self.redis.get('test1'), 'data1')
+        self.assertEqual(await self.redis.get('test4'), None)
+
+    async def test_exists_method(self):
+        self.assertEqual(await self.redis.exists('test1'), 1)
+        self.assertEqual(await self.redis.exists('notAvailable'), 0)
+
+    async def test_delete_method(self):
+        self.assertEqual(await self.redis.delete('test5'), 1)
+        self.assertEqual(await self.redis.delete('notAvailable'), 0)
+
+    async def test_clear_on_pattern_method(self):
+        await self.redis.clear_on_pattern('test5')
+        self.assertListEqual(await self.redis.get_all_keys(), ['test1'])
+
+    async def test_get_many_and_set_many_methods(self):
+        self.assertListEqual(await self.redis.set_many({'test_many1': 'data1', 'test_many2': 2}), [True, True])
+        self.assertListEqual(await self.redis.get_many(['test_many1', 'notAvailable', 'test_many2']),
+                             ['data1', None, 2])
+        self.assertListEqual(await self.redis.get_many([]), [])
+
+    async def test_set_many_with_indexes(self):
+        mapping = {'w1:london:m:en': 'data1', 'w1:london:i:de': 'data2'}
+        indexes = dict.fromkeys(mapping, 'w1:i:london')
+        self.assertListEqual(await self.redis.set_many(mapping, indexes=indexes), [True, True])
+        self.assertCountEqual(await self.redis.get_index_members('w1:i:london'), list(mapping))
+
+        self.assertEqual(await self.redis.drop_index('w1:i:london'), 2)
+        self.assertListEqual(await self.redis.get_many(list(mapping)), [None, None])
+
+    async def test_sorted_set_scores(self):
+        await self.redis.increment_scores('hot', {'a': 1, 'b': 3})
+        await self.redis.increment_scores('hot', {'a': 4, 'c': 1})
+        self.assertListEqual(await self.redis.get_top_scores('hot', 2), [('a', 5.0), ('b', 3.0)])
+
+        await self.redis.decay_scores('hot', 0.5, keep=2)
+        self.assertListEqual(await self.redis.get_top_scores('hot', 10), [('a', 2.5), ('b', 1.5)])
+
+    async def test_get_ttls(self):
+        await self.redis.set('test_ttl', 'data', ex_seconds=100)
+        ttls = await self.redis.get_ttls(['test_ttl', 'test1', 'notAvailable'])
+        self.assertTrue(0 < ttls[0] <= 100)
+        self.assertListEqual(ttls[1:], [-1, -2])
+
+
+class TestRedisTopology(MultiNodeTestCase):
+    replicas = [('localhost', 6380), ('localhost', 6381)]
+
+    def test_reads_go_to_the_replicas_and_writes_to_the_primary(self):
+        redis = self.make_client(MultiNodeRedisClient, replicas=self.replicas, read_from_replicas=True)
+
+        self.assertTrue(redis.set('key', 'primary'))
+        self.assertEqual(self.node(6379).get('key'), b'"primary"')
+        # nothing is replicated in the harness, so the replicas do not have it
+        self.assertIsNone(redis.get('key'))
+        self.assertEqual(redis.exists('key'), 0)
+
+        self.node(6380).set('key', b'"replica1"')
+        self.node(6381).set('key', b'"replica2"')
+        # reads are spread round robin over the replicas
+        self.assertCountEqual([redis.get('key'), redis.get('key')], ['replica1', 'replica2'])
+
+        self.assertEqual(redis.delete('key'), 1)
+        self.assertEqual(self.node(6379).exists('key'), 0)
+        self.assertEqual(self.node(6380).exists('key'), 1)
+
+    def test_reads_go_to_the_primary_by_default(self):
+        redis = self.make_client(MultiNodeRedisClient, replicas=self.replicas)
+
+        redis.set('key', 'primary')
+
+        self.assertEqual(redis.get('key'), 'primary')
+        self.assertIs(redis.read_client, redis.client)
+
+    async def test_async_reads_go_to_the_replicas(self):
+        redis = self.make_client(AsyncMultiNodeRedisClient, replicas=self.replicas[:1], read_from_replicas=True)
+        redis.circuit_breaker.record_success()
+        self.node(6380).set('replicated', b'"replica"')
+
+        self.assertTrue(await redis.set('key', 'primary'))
+        self.assertIsNone(await redis.get('key'))
+        self.assertListEqual(await redis.get_many(['key', 'replicated']), [None, 'replica'])
+        self.assertEqual(await redis.exists('replicated'), 1)
+        self.assertEqual(self.node(6379).get('key'), b'"primary"')
+
+    async def test_sentinel(self):
+        redis = self.make_client(
+            AsyncRedisClient, mode='sentinel', sentinels=[('sentinel', 26379)], service_name='cache',
+            read_from_replicas=True)
+
+        self.assertTrue(redis.client.connection_pool.is_master)
+        self.assertEqual(redis.client.connection_pool.service_name, 'cache')
+        self.assertFalse(redis.read_client.connection_pool.is_master)
+
+    async def test_cluster(self):
+        redis = self.make_client(
+            AsyncRedisClient, mode='cluster', nodes=[('node1', 7000), ('node2', 7001)], read_from_replicas=True)
+
+        self.assertIsInstance(redis.client, async_redis.cluster.RedisCluster)
+        self.assertTrue(redis.client.read_from_replicas)
+        # the cluster client routes reads to replicas itself
+        self.assertIs(redis.read_client, redis.client)
+        self.assertEqual(redis._make_pubsub_client().connection_pool.connection_kwargs['host'], 'node1')
+
+    def test_unreachable_cluster_is_a_cache_miss(self):
+        # nothing listens on port 1, the client can not discover the cluster
+        redis = self.make_client(RedisClient, mode='cluster', nodes=[('127.0.0.1', 1)])
+
+        with self.assertLogs('api.redis_client', 'WARNING'):
+            self.assertIsNone(redis.get('key'))
+        self.assertEqual(redis.stats['failures'], 1)
+
+    async def test_async_unreachable_cluster_is_a_cache_miss(self):
+        redis = self.make_client(AsyncRedisClient, mode='cluster', nodes=[('127.0.0.1', 1)])
+
+        with self.assertLogs('api.redis_client', 'WARNING'):
+            self.assertIsNone(await redis.get('key'))
+            self.assertIsNone(await redis.set('key', 'value'))
+        self.assertEqual(redis.stats['failures'], 2)
+
+    async def test_cluster_subscription_client_is_closed(self):
+        redis = self.make_client(AsyncMultiNodeRedisClient, mode='cluster', nodes=[('node1', 7000)])
+        node_client = fakeredis.aioredis.FakeRedis(server=fake_server('node1', 7000))
+
+        with mock.patch.object(redis, '_make_pubsub_client', return_value=node_client), \
+                mock.patch.object(node_client, 'aclose', wraps=node_client.aclose) as aclose:
+            messages = redis.subscribe('channel')
+            receive = asyncio.ensure_future(messages.__anext__())
+            await asyncio.sleep(0.02)
+            self.node(7000, 'node1').publish('channel', '{"key": "test1"}')
+            self.assertDictEqual(await receive, {'key': 'test1'})
+            await messages.aclose()
+
+        aclose.assert_awaited_once()
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            self.make_client(RedisClient, mode='replicated')
+        with self.assertRaises(ValueError):
+            self.make_client(RedisClient, mode='sentinel')
+
+    def test_make_from_env(self):
+        env = {
+            'REDIS_MODE': 'sentinel',
+            'REDIS_SENTINELS': 'sentinel1:26379,sentinel2',
+            'REDIS_SENTINEL_SERVICE': 'cache',
+            'REDIS_READ_FROM_REPLICAS': 'true',
+        }
+        SingletonMeta._instances.pop(RedisClient, None)
+        self.addCleanup(SingletonMeta._instances.pop, RedisClient, None)
+        with mock.patch.dict(os.environ, env):
+            redis = RedisClient.make_from_env()
+
+        self.assertEqual(redis.mode, 'sentinel')
+        self.assertListEqual(redis.sentinels, [('sentinel1', 26379), ('sentinel2', 6379)])
+        self.assertEqual(redis.service_name, 'cache')
+        self.assertTrue(redis.read_from_replicas)
+        self.assertEqual(len(redis.read_clients), 1)
+
+    def test_parse_addresses(self):
+        self.assertListEqual(parse_addresses(['node1:7000', ' node2 ']), [('node1', 7000), ('node2', 6379)])
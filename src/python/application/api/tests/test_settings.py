@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+# the profile is chosen when the settings are loaded, so it is checked in a fresh interpreter
+API_ONLY_CHECK = """
+import json
+import django
+django.setup()
+from django.conf import settings
+from django.test import Client
+client = Client()
+print(json.dumps({
+    'apps': settings.INSTALLED_APPS,
+    'middleware': settings.MIDDLEWARE,
+    'weather': client.get('/weather/').status_code,
+    'admin': client.get('/admin/').status_code,
+    'docs': client.get('/auto-open-api-spec/').status_code,
+}))
+"""
+
+
+class TestApiOnlyProfile(SimpleTestCase):
+
+    def test_api_only(self):
+        env = dict(os.environ, API_ONLY='true', ALLOWED_HOSTS='testserver', REDIS_FAKE='true')
+        output = subprocess.run(
+            [sys.executable, '-c', API_ONLY_CHECK], env=env, cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.splitlines()[-1])
+
+        self.assertListEqual(result['apps'], ['weather.apps.WeatherConfig'])
+        self.assertNotIn('django.contrib.sessions.middleware.SessionMiddleware', result['middleware'])
+        # the weather endpoint answers, missing `q` is a bad request
+        self.assertEqual(result['weather'], 400)
+        self.assertEqual(result['admin'], 404)
+        self.assertEqual(result['docs'], 404)
+
+
+class TestUpstreamGroupSettings(SimpleTestCase):
+
+    def test_upstream_group_needs_a_city_index(self):
+        env = dict(os.environ, UPSTREAM_GROUP_ENABLED='true', CITY_INDEX_PATH='', REDIS_FAKE='true')
+        result = subprocess.run([sys.executable, '-c', 'import django; django.setup()'], env=env,
+                                cwd=settings.BASE_DIR, capture_output=True, text=True)
+
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('UPSTREAM_GROUP_ENABLED needs a CITY_INDEX_PATH', result.stderr)
@@ -0,0 +1,118 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from api.redis_client import get_redis
+from api.singleflight import SingleFlight
+
+
+class TestSingleFlight(TestCase):
+
+    def setUp(self) -> None:
+        self.calls = 0
+
+    async def fetch(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return self.calls
+
+    async def test_concurrent_calls_are_coalesced(self):
+        single_flight = SingleFlight()
+        results = await asyncio.gather(*[single_flight.do('key', self.fetch) for _ in range(10)])
+
+        self.assertEqual(self.calls, 1)
+        self.assertListEqual(results, [1] * 10)
+        self.assertFalse(single_flight.in_flight('key'))
+
+    async def test_different_keys_are_not_coalesced(self):
+        single_flight = SingleFlight()
+        await asyncio.gather(single_flight.do('key1', self.fetch), single_flight.do('key2', self.fetch))
+
+        self.assertEqual(self.calls, 2)
+
+    async def test_start_runs_in_the_background(self):
+        single_flight = SingleFlight()
+        task = single_flight.start('key', self.fetch)
+
+        self.assertIs(single_flight.start('key', self.fetch), task)
+        self.assertTrue(single_flight.in_flight('key'))
+        self.assertEqual(await task, 1)
+        self.assertEqual(self.calls, 1)
+
+    async def test_exception_is_shared(self):
+        single_flight = SingleFlight()
+
+        async def fail():
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            raise ValueError('upstream failed')
+
+        results = await asyncio.gather(*[single_flight.do('key', fail) for _ in range(3)], return_exceptions=True)
+
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+
+class TestDistributedSingleFlight(TestCase):
+
+    def setUp(self) -> None:
+        self.redis = get_redis()
+        self.calls = 0
+
+    def tearDown(self) -> None:
+        async_to_sync(self.redis.flush_all)()
+
+    async def fetch(self):
+        self.calls += 1
+        return 'fetched'
+
+    async def test_lock_holder_fetches(self):
+        single_flight = SingleFlight(redis=self.redis, lock_seconds=1)
+
+        self.assertEqual(await single_flight.do('key', self.fetch), 'fetched')
+        self.assertEqual(self.calls, 1)
+        # lock is released after the fetch
+        self.assertEqual(await self.redis.exists('lock:key'), 0)
+
+    async def test_expired_lock_of_another_worker_is_kept(self):
+        single_flight = SingleFlight(redis=self.redis, lock_seconds=1)
+
+        async def fetch_while_lock_expires():
+            # the lock expired during the fetch and another worker took it
+            await self.redis.delete('lock:key')
+            await self.redis.set('lock:key', b'other', nx=True, raw=True)
+            return await self.fetch()
+
+        self.assertEqual(await single_flight.do('key', fetch_while_lock_expires), 'fetched')
+        self.assertEqual(await self.redis.get('lock:key', raw=True), b'other')
+
+    async def test_waits_for_other_worker(self):
+        single_flight = SingleFlight(redis=self.redis, lock_seconds=1, poll_interval=0.01)
+        # another worker holds the lock and fills the cache
+        await self.redis.set('lock:key', 1, nx=True)
+        await self.redis.set('key', 'cached')
+
+        result = await single_flight.do('key', self.fetch, read_cached=lambda: self.redis.get('key'))
+
+        self.assertEqual(result, 'cached')
+        self.assertEqual(self.calls, 0)
+
+    async def test_background_call_leaves_the_fetch_to_the_lock_holder(self):
+        single_flight = SingleFlight(redis=self.redis, lock_seconds=1)
+        await self.redis.set('lock:key', 1, nx=True)
+
+        self.assertIsNone(await single_flight.start('key', self.fetch))
+        self.assertEqual(self.calls, 0)
+
+    async def test_caller_joining_a_background_call_waits_for_the_lock_holder(self):
+        single_flight = SingleFlight(redis=self.redis, lock_seconds=1, poll_interval=0.01)
+        await self.redis.set('lock:key', 1, nx=True)
+        await self.redis.set('key', 'cached')
+
+        single_flight.start('key', self.fetch)
+        result = await single_flight.do('key', self.fetch, read_cached=lambda: self.redis.get('key'))
+
+        self.assertEqual(result, 'cached')
+        self.assertEqual(self.calls, 0)
+
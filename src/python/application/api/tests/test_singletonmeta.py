@@ -1,3 +1,9 @@
+import multiprocessing
+import os
+import threading
+import time
+import unittest
+
 from django.test import TestCase
 
 from api.singletonmeta import SingletonMeta
@@ -10,6 +16,28 @@ class SingletonClass(metaclass=SingletonMeta):
         self.value = value
 
 
+class SlowSingleton(metaclass=SingletonMeta):
+    """Singleton which takes a while to initialize, so concurrent callers overlap."""
+
+    instances_created = 0
+
+    def __init__(self):
+        time.sleep(0.01)
+        SlowSingleton.instances_created += 1
+
+
+class OuterSingleton(metaclass=SingletonMeta):
+    """Singleton which creates another singleton while it is initialized."""
+
+    def __init__(self):
+        self.inner = SingletonClass(value=1)
+
+
+def _value_in_child(connection):
+    connection.send(SingletonClass(value=2).value)
+    connection.close()
+
+
 class SingletonTestCase(TestCase):
     def test_singleton_instance(self):
         # Create two instances of SingletonClass
@@ -22,3 +50,40 @@ class SingletonTestCase(TestCase):
         # Check the values to ensure they were properly initialized
         self.assertEqual(instance1.value, 1)
         self.assertEqual(instance2.value, 1)
+
+    def test_concurrent_creation_creates_one_instance(self):
+        threads_count = 32
+        barrier = threading.Barrier(threads_count)
+        instances = []
+
+        def create():
+            barrier.wait()
+            for _ in range(1000):
+                instances.append(SlowSingleton())
+
+        threads = [threading.Thread(target=create) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(SlowSingleton.instances_created, 1)
+        self.assertEqual(len(instances), threads_count * 1000)
+        self.assertEqual(len({id(instance) for instance in instances}), 1)
+
+    def test_nested_creation(self):
+        self.assertIs(OuterSingleton().inner, SingletonClass(value=3))
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs fork')
+    def test_forked_child_creates_its_own_instance(self):
+        self.assertEqual(SingletonClass(value=1).value, 1)
+
+        context = multiprocessing.get_context('fork')
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_value_in_child, args=(sender,))
+        process.start()
+        value = receiver.recv()
+        process.join()
+
+        self.assertEqual(value, 2)
+        self.assertEqual(SingletonClass(value=2).value, 1)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from unittest import mock
+
+import httpx
+from django.test import TestCase
+
+from api.rate_limiter import RateLimitExceeded
+from api.upstream import (
+    ResilientClient,
+    UpstreamUnavailable,
+    get_upstream_client,
+)
+
+URL = 'https://example.com/weather'
+
+
+def response(status_code: int) -> httpx.Response:
+    return httpx.Response(status_code, request=httpx.Request('GET', URL))
+
+
+@mock.patch('api.upstream.get_http_client')
+class TestResilientClient(TestCase):
+
+    def setUp(self) -> None:
+        self.client = ResilientClient(backoff_seconds=0.001, failure_threshold=2)
+
+    async def test_retries_server_errors(self, mock_http_client):
+        mock_http_client.return_value.get = mock.AsyncMock(side_effect=[response(503), response(200)])
+
+        self.assertEqual((await self.client.get(URL, params={'q': 'London'})).status_code, 200)
+        self.assertEqual(mock_http_client.return_value.get.await_count, 2)
+        mock_http_client.return_value.get.assert_awaited_with(URL, params={'q': 'London'})
+
+    async def test_client_errors_are_not_retried(self, mock_http_client):
+        mock_http_client.return_value.get = mock.AsyncMock(side_effect=[response(404), response(429)])
+
+        self.assertEqual((await self.client.get(URL)).status_code, 404)
+        self.assertEqual((await self.client.get(URL)).status_code, 429)
+        self.assertEqual(mock_http_client.return_value.get.await_count, 2)
+        self.assertEqual(self.client.circuit_breaker.failures, 0)
+
+    async def test_gives_up_after_the_retries(self, mock_http_client):
+        mock_http_client.return_value.get = mock.AsyncMock(side_effect=httpx.ConnectError('refused'))
+
+        with self.assertRaises(httpx.ConnectError):
+            await self.client.get(URL)
+        self.assertEqual(mock_http_client.return_value.get.await_count, 3)
+
+        mock_http_client.return_value.get = mock.AsyncMock(return_value=response(502))
+        self.assertEqual((await self.client.get(URL)).status_code, 502)
+
+        # the circuit is open after two failed requests
+        with self.assertRaises(UpstreamUnavailable) as context:
+            await self.client.get(URL)
+        self.assertGreater(context.exception.retry_after, 0)
+        self.assertEqual(mock_http_client.return_value.get.await_count, 3)
+
+    async def test_deadline(self, mock_http_client):
+        async def slow_get(*args, **kwargs):
+            await asyncio.sleep(1)
+
+        mock_http_client.return_value.get = mock.AsyncMock(side_effect=slow_get)
+        self.client.deadline_seconds = 0.05
+
+        started_at = time.monotonic()
+        with self.assertRaises(httpx.TimeoutException):
+            await self.client.get(URL)
+        self.assertLess(time.monotonic() - started_at, 0.5)
+
+    async def test_hedged_request(self, mock_http_client):
+        calls = []
+
+        async def get(*args, **kwargs):
+            calls.append(time.monotonic())
+            # only the first request is slow
+            if len(calls) == 1:
+                await asyncio.sleep(1)
+            return response(200)
+
+        mock_http_client.return_value.get = mock.AsyncMock(side_effect=get)
+        self.client.hedge = True
+        self.client.hedge_delay_seconds = 0.02
+
+        started_at = time.monotonic()
+        self.assertEqual((await self.client.get(URL)).status_code, 200)
+        self.assertLess(time.monotonic() - started_at, 0.5)
+        self.assertEqual(len(calls), 2)
+
+    def test_hedge_delay_is_the_p95_latency(self, mock_http_client):
+        self.client.hedge = True
+        self.assertIsNone(self.client.hedge_delay())
+
+        self.client.latencies.extend(index / 100 for index in range(1, 101))
+        self.assertAlmostEqual(self.client.hedge_delay(), 0.95, delta=0.01)
+
+    async def test_extra_attempts_need_upstream_budget(self, mock_http_client):
+        mock_http_client.return_value.get = mock.AsyncMock(return_value=response(503))
+        rate_limiter = mock.MagicMock()
+        rate_limiter.acquire = mock.AsyncMock(side_effect=[None, RateLimitExceeded(1)])
+        self.client.rate_limiter = rate_limiter
+
+        self.assertEqual((await self.client.get(URL)).status_code, 503)
+        self.assertEqual(mock_http_client.return_value.get.await_count, 1)
+        self.assertEqual(rate_limiter.acquire.call_args_list, [
+            mock.call(max_wait_seconds=None), mock.call(max_wait_seconds=0)])
+
+        rate_limiter.acquire = mock.AsyncMock(side_effect=RateLimitExceeded(1))
+        with self.assertRaises(RateLimitExceeded):
+            await self.client.get(URL)
+
+    def test_singleton(self, mock_http_client):
+        self.assertIs(get_upstream_client(), get_upstream_client())
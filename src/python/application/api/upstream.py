@@ -0,0 +1,197 @@
+"""
+Resilient requests to the upstream weather API.
+
+Every request gets a total deadline. Transport errors and 5xx responses are retried with jittered
+exponential backoff, which is safe as the upstream calls are idempotent GETs. Optionally a second,
+hedged request is sent when the first one takes longer than the usual (p95) latency, and the
+first response wins. A circuit breaker fails requests fast while upstream keeps failing.
+Retries and hedged requests only go out while the upstream rate limit has room for them.
+"""
+import asyncio
+import random
+import statistics
+import time
+from collections import deque
+from typing import Optional
+
+import httpx
+from django.conf import settings
+
+from api.circuit_breaker import CircuitBreaker
+from api.http_client import get_http_client
+from api.metrics import UPSTREAM_ATTEMPTS
+from api.rate_limiter import (
+    RateLimitExceeded,
+    get_rate_limiter,
+)
+from api.singletonmeta import SingletonMeta
+
+# responses worth another attempt, 429 is not retried as it would only use up more of the quota
+RETRY_STATUS_CODES = frozenset({500, 502, 503, 504})
+
+
+class UpstreamUnavailable(Exception):
+    """Upstream is failing and is not called until `retry_after` seconds have passed."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f'Upstream is unavailable, retry after {retry_after:.2f}s.')
+        self.retry_after = retry_after
+
+
+class ResilientClient:
+    """Sends GET requests through the pooled `HttpClient` with a deadline, retries, hedging and a circuit breaker."""
+
+    def __init__(
+            self,
+            rate_limiter=None,
+            deadline_seconds: float = 8.0,
+            retries: int = 2,
+            backoff_seconds: float = 0.1,
+            backoff_max_seconds: float = 1.0,
+            hedge: bool = False,
+            hedge_delay_seconds: float = 0.0,
+            hedge_min_samples: int = 20,
+            failure_threshold: int = 5,
+            cooldown_seconds: float = 30,
+    ):
+        self.rate_limiter = rate_limiter
+        self.deadline_seconds = deadline_seconds
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.hedge = hedge
+        self.hedge_delay_seconds = hedge_delay_seconds
+        self.hedge_min_samples = hedge_min_samples
+        self.circuit_breaker = CircuitBreaker(failure_threshold=failure_threshold, cooldown_seconds=cooldown_seconds)
+        # latencies of the recent successful requests, for the hedge delay
+        self.latencies = deque(maxlen=200)
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(deadline_seconds={self.deadline_seconds}, retries={self.retries}, '
+                f'hedge={self.hedge})')
+
+    def hedge_delay(self) -> Optional[float]:
+        """Returns after how many seconds a hedged request is sent, `None` when requests are not hedged."""
+
+        if not self.hedge:
+            return None
+        if self.hedge_delay_seconds:
+            return self.hedge_delay_seconds
+        if len(self.latencies) < self.hedge_min_samples:
+            return None
+        return statistics.quantiles(self.latencies, n=20)[-1]
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        """
+        Sends a GET request, retried until it succeeds, the retries are used up or the deadline passed.
+        Raises `UpstreamUnavailable` while the circuit is open and `RateLimitExceeded` without upstream budget.
+        """
+
+        if not self.circuit_breaker.allow():
+            UPSTREAM_ATTEMPTS.inc(kind='first', outcome='circuit_open')
+            raise UpstreamUnavailable(self.circuit_breaker.retry_after)
+        await self._acquire(kind='first', max_wait_seconds=None)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline_seconds
+        attempt = 0
+        while True:
+            response, error = None, None
+            try:
+                response = await self._attempt(url, kwargs, deadline)
+            except httpx.TransportError as e:
+                error = e
+            except Exception:
+                self.circuit_breaker.record_failure()
+                raise
+            if response is not None and response.status_code not in RETRY_STATUS_CODES:
+                self.circuit_breaker.record_success()
+                return response
+
+            attempt += 1
+            backoff = random.uniform(0, min(self.backoff_max_seconds, self.backoff_seconds * 2 ** (attempt - 1)))
+            if (attempt > self.retries or loop.time() + backoff >= deadline
+                    or not await self._acquire(kind='retry', max_wait_seconds=0)):
+                self.circuit_breaker.record_failure()
+                if error is not None:
+                    raise error
+                return response
+            await asyncio.sleep(backoff)
+
+    async def _acquire(self, kind: str, max_wait_seconds: Optional[float]) -> bool:
+        """Takes upstream budget for an attempt, extra attempts are skipped instead of waiting for it."""
+
+        if self.rate_limiter is None:
+            return True
+        try:
+            await self.rate_limiter.acquire(max_wait_seconds=max_wait_seconds)
+        except RateLimitExceeded:
+            UPSTREAM_ATTEMPTS.inc(kind=kind, outcome='rate_limited')
+            if kind == 'first':
+                raise
+            return False
+        return True
+
+    async def _send(self, url: str, kwargs: dict, kind: str) -> httpx.Response:
+        started_at = time.perf_counter()
+        try:
+            response = await get_http_client().get(url, **kwargs)
+        except httpx.TransportError:
+            UPSTREAM_ATTEMPTS.inc(kind=kind, outcome='error')
+            raise
+        UPSTREAM_ATTEMPTS.inc(kind=kind, outcome='ok' if response.status_code < 500 else 'error')
+        if response.status_code < 500:
+            self.latencies.append(time.perf_counter() - started_at)
+        return response
+
+    async def _attempt(self, url: str, kwargs: dict, deadline: float) -> httpx.Response:
+        """One attempt, with a hedged request when the first one is slow. The first response wins."""
+
+        loop = asyncio.get_running_loop()
+        pending = {asyncio.ensure_future(self._send(url, kwargs, 'first'))}
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=max(min(delay, deadline - loop.time()), 0))
+                if not done and await self._acquire(kind='hedge', max_wait_seconds=0):
+                    pending.add(asyncio.ensure_future(self._send(url, kwargs, 'hedge')))
+
+            error = None
+            while pending:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            if error is not None and not pending:
+                raise error
+            raise httpx.TimeoutException(f'Upstream deadline of {self.deadline_seconds}s exceeded.')
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class UpstreamClient(ResilientClient, metaclass=SingletonMeta):
+    """Process wide client of the upstream weather API, configured by the `UPSTREAM_*` settings."""
+
+    def __init__(self):
+        super().__init__(
+            rate_limiter=get_rate_limiter(),
+            deadline_seconds=settings.UPSTREAM_DEADLINE_SECONDS,
+            retries=settings.UPSTREAM_RETRIES,
+            backoff_seconds=settings.UPSTREAM_RETRY_BACKOFF_SECONDS,
+            backoff_max_seconds=settings.UPSTREAM_RETRY_BACKOFF_MAX_SECONDS,
+            hedge=settings.UPSTREAM_HEDGE_ENABLED,
+            hedge_delay_seconds=settings.UPSTREAM_HEDGE_DELAY_SECONDS,
+            failure_threshold=settings.UPSTREAM_CIRCUIT_FAILURE_THRESHOLD,
+            cooldown_seconds=settings.UPSTREAM_CIRCUIT_COOLDOWN_SECONDS,
+        )
+
+
+def get_upstream_client() -> UpstreamClient:
+    """ get the resilient upstream client to use. """
+
+    return UpstreamClient()
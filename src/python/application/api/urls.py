@@ -14,22 +14,33 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import (
     path,
     include,
 )
 from django.conf import settings
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+
+from api.views import MetricsView
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('', include('weather.urls')),
 ]
+# the admin and the documentation are only imported when they are served, see `API_ONLY`
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
+if settings.METRICS_ENABLED:
+    urlpatterns += [
+        path('metrics', MetricsView.as_view(), name='metrics'),
+    ]
 if settings.SHOW_API_DOCUMENTATION:
+    from drf_spectacular.views import (
+        SpectacularAPIView,
+        SpectacularSwaggerView,
+    )
+
     urlpatterns += [
         path('auto-open-api-spec.yaml/', SpectacularAPIView.as_view(), name='schema_auto'),
         path('auto-open-api-spec/', SpectacularSwaggerView.as_view(url_name='schema_auto')),
@@ -0,0 +1,44 @@
+from django.http import HttpResponse
+from django.views import View
+
+from api.http_client import get_http_client
+from api.local_cache import TwoTierCache
+from api.metrics import (
+    REGISTRY,
+    GaugeCollector,
+)
+from api.rate_limiter import get_rate_limiter
+from api.redis_client import get_redis
+
+
+def _collect_upstream_pool() -> dict:
+    return get_http_client().pool_stats()
+
+
+def _collect_upstream_quota() -> dict:
+    return get_rate_limiter().quota_stats()
+
+
+def _collect_cache() -> dict:
+    redis = get_redis()
+    stats = dict(getattr(redis, 'stats', {}))
+    if isinstance(redis, TwoTierCache):
+        stats.update(redis.cache_stats())
+        stats.update({f'redis_{name}': value for name, value in getattr(redis.redis, 'stats', {}).items()})
+    return stats
+
+
+REGISTRY.register(GaugeCollector(
+    'upstream_pool_connections', 'Upstream http connection pool usage.', _collect_upstream_pool, ('state',)))
+REGISTRY.register(GaugeCollector(
+    'upstream_quota', 'Upstream call quota and its usage as last seen by this worker.', _collect_upstream_quota,
+    ('stat',)))
+REGISTRY.register(GaugeCollector(
+    'cache_stats', 'Cache counters of the redis client and the local cache.', _collect_cache, ('stat',)))
+
+
+class MetricsView(View):
+    """Exposes all metrics in the prometheus text format."""
+
+    def get(self, request, *args, **kwargs) -> HttpResponse:
+        return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,18 @@
+from uvicorn.workers import UvicornWorker
+
+
+class UvloopWorker(UvicornWorker):
+    """
+    Gunicorn worker serving the ASGI application with uvicorn on uvloop and the httptools parser.
+
+    Both are C implementations of the event loop and of the HTTP/1.1 parsing, which uvicorn
+    otherwise only picks when installed. The access log is off, every request is in the metrics.
+    """
+
+    CONFIG_KWARGS = {
+        'loop': 'uvloop',
+        'http': 'httptools',
+        'lifespan': 'on',
+        'access_log': False,
+        'server_header': False,
+    }
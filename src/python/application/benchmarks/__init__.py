@@ -0,0 +1,3 @@
+"""
+Load and micro benchmarks of the weather endpoint, see `python -m benchmarks --help`.
+"""
@@ -0,0 +1,142 @@
+"""
+Benchmarks of the weather endpoint.
+
+    python -m benchmarks run --scenario all --interface both --output before.json
+    python -m benchmarks compare before.json after.json
+    python -m benchmarks importtime --max-ms 600
+
+Runs from `src/python/application`. Upstream is a local stub server, redis is fakeredis
+unless `--redis real` is given, then the `REDIS_*` settings are used.
+"""
+import argparse
+import datetime
+import os
+import platform
+import subprocess
+import sys
+
+from benchmarks import importtime
+from benchmarks.report import (
+    compare,
+    dump,
+    format_rows,
+    load,
+)
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.stub_upstream import StubUpstream
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def configure(stub_url: str, redis: str):
+    """Points the settings at the stub upstream before django is set up, explicit environment variables win."""
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
+    os.environ.setdefault('API_KEY', 'benchmark')
+    os.environ.setdefault('ALLOWED_HOSTS', 'localhost')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # the upstream quota would turn most of a run into 429s
+    os.environ.setdefault('UPSTREAM_RATE_LIMIT_PER_MINUTE', '0')
+    os.environ['URL'] = stub_url
+    os.environ['REDIS_FAKE'] = str(redis == 'fake')
+
+    import django
+    django.setup()
+
+
+def run(args) -> dict:
+    stub = StubUpstream(latency=args.upstream_latency, jitter=args.upstream_jitter,
+                        error_rate=args.upstream_error_rate, seed=args.seed)
+    configure(stub.start(), args.redis)
+    from benchmarks import runner
+
+    scenarios = list(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+    interfaces = ['asgi', 'wsgi'] if args.interface == 'both' else [args.interface]
+    results = {}
+    try:
+        for name in scenarios:
+            for interface in interfaces:
+                print(f'Running {name} over {interface} ...', file=sys.stderr)
+                results.setdefault(name, {})[interface] = runner.run(
+                    SCENARIOS[name], interface, args.requests, args.concurrency, stub,
+                    alloc_requests=args.alloc_requests, seed=args.seed)
+    finally:
+        stub.stop()
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'parameters': {
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'alloc_requests': args.alloc_requests,
+                'upstream_latency': args.upstream_latency,
+                'upstream_jitter': args.upstream_jitter,
+                'upstream_error_rate': args.upstream_error_rate,
+                'redis': args.redis,
+                'seed': args.seed,
+            },
+        },
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run benchmark scenarios and print or write the JSON results.')
+    run_parser.add_argument('--scenario', choices=['all', *SCENARIOS], default='all')
+    run_parser.add_argument('--interface', choices=['asgi', 'wsgi', 'both'], default='both')
+    run_parser.add_argument('--requests', type=int, default=1000, help='Timed requests per scenario.')
+    run_parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once.')
+    run_parser.add_argument('--alloc-requests', type=int, default=50,
+                            help='Requests of the sequential allocation pass, 0 to skip it.')
+    run_parser.add_argument('--upstream-latency', type=float, default=0.05, help='Stub upstream latency in seconds.')
+    run_parser.add_argument('--upstream-jitter', type=float, default=0.0, help='Random extra upstream latency.')
+    run_parser.add_argument('--upstream-error-rate', type=float, default=0.0, help='Share of upstream 503s.')
+    run_parser.add_argument('--redis', choices=['fake', 'real'], default='fake')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output', help='File to write the JSON results to, printed when not given.')
+
+    compare_parser = commands.add_parser('compare', help='Compare two JSON result files.')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+
+    importtime_parser = commands.add_parser(
+        'importtime', help='Summarize the import time of a worker boot, fails on a regression.')
+    importtime_parser.add_argument('--top', type=int, default=20, help='Packages to list.')
+    importtime_parser.add_argument('--max-ms', type=float, help='Budget of the total import time.')
+    importtime_parser.add_argument('--output', help='File to write the JSON summary to, printed when not given.')
+
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        print(format_rows(compare(load(args.before), load(args.after))))
+        return
+    if args.command == 'importtime':
+        modules = importtime.measure()
+        problems = importtime.check(modules, args.max_ms)
+        text = dump({**importtime.summarize(modules, args.top), 'problems': problems}, args.output)
+        if not args.output:
+            print(text)
+        if problems:
+            sys.exit('\n'.join(problems))
+        return
+
+    text = dump(run(args), args.output)
+    if not args.output:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Import time of a worker boot, from `python -X importtime`.
+
+Imports `api.asgi` in a fresh interpreter with the api-only profile and sums the self time
+of every imported module per top level package. `check` lists the modules which must not be
+loaded on boot, they are test or documentation dependencies.
+"""
+import os
+import re
+import subprocess
+import sys
+from collections import Counter
+
+BOOT = 'import django; django.setup(); import api.asgi'
+# modules a worker boot must not import
+FORBIDDEN_MODULES = (
+    'fakeredis',
+    'unittest.mock',
+    'django.contrib.admin',
+    'drf_spectacular.views',
+)
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def parse(output: str) -> dict:
+    """Returns the self and cumulative import time in microseconds of every module in `-X importtime` output."""
+
+    modules = {}
+    for line in output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules
+
+
+def measure(code: str = BOOT, env: dict = None, cwd: str = None) -> dict:
+    """Runs `code` with `-X importtime` in a fresh interpreter and returns its parsed output."""
+
+    env = {
+        'DJANGO_SETTINGS_MODULE': 'api.settings',
+        'API_ONLY': 'true',
+        'API_KEY': 'importtime',
+        **os.environ,
+        **(env or {}),
+    }
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code], env=env, cwd=cwd, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f'Import failed:\n{result.stderr[-2000:]}')
+    return parse(result.stderr)
+
+
+def summarize(modules: dict, top: int = 20) -> dict:
+    """Returns the total import time and the `top` packages by their summed self time, in milliseconds."""
+
+    packages = Counter()
+    for name, (self_time, _) in modules.items():
+        packages[name.split('.')[0]] += self_time
+    return {
+        'modules': len(modules),
+        'total_ms': round(sum(packages.values()) / 1000, 1),
+        'packages_ms': {name: round(value / 1000, 1) for name, value in packages.most_common(top)},
+    }
+
+
+def check(modules: dict, max_total_ms: float = None) -> list:
+    """Returns the regressions: forbidden modules which were imported and a total over `max_total_ms`."""
+
+    problems = [
+        f'{name} is imported' for name in FORBIDDEN_MODULES
+        if any(module == name or module.startswith(f'{name}.') for module in modules)
+    ]
+    total_ms = sum(self_time for self_time, _ in modules.values()) / 1000
+    if max_total_ms is not None and total_ms > max_total_ms:
+        problems.append(f'import time of {total_ms:.1f}ms is over the budget of {max_total_ms}ms')
+    return problems
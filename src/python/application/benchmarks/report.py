@@ -0,0 +1,92 @@
+"""
+Summaries of benchmark runs and the comparison of two result files.
+"""
+import json
+import math
+from typing import (
+    Iterable,
+    List,
+)
+
+# metrics where a higher value is the better one, for all others lower is better
+HIGHER_IS_BETTER = frozenset({'rps'})
+# run parameters rather than results
+NEUTRAL = frozenset({'requests'})
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Returns the `q` percentile (0-100) of `values` by the nearest rank."""
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float], elapsed: float) -> dict:
+    """Returns the throughput and the latency percentiles in milliseconds of a timed run."""
+
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        'max_ms': round(max(latencies, default=0) * 1000, 3),
+    }
+
+
+def load(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def dump(result: dict, path: str = None) -> str:
+    """Writes the result with sorted keys, so two result files diff line by line."""
+
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if path:
+        with open(path, 'w') as file:
+            file.write(text + '\n')
+    return text
+
+
+def compare(before: dict, after: dict) -> List[dict]:
+    """Returns the change of every numeric metric measured in both results."""
+
+    rows = []
+    for scenario, interfaces in sorted(after['results'].items()):
+        for interface, metrics in sorted(interfaces.items()):
+            previous = before['results'].get(scenario, {}).get(interface)
+            if previous is None:
+                continue
+            for metric, value in sorted(metrics.items()):
+                old = previous.get(metric)
+                if not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+                    continue
+                change = (value - old) / old * 100 if old else 0.0
+                better = change > 0 if metric in HIGHER_IS_BETTER else change < 0
+                if metric in NEUTRAL:
+                    better, change = False, 0.0
+                rows.append({
+                    'scenario': scenario,
+                    'interface': interface,
+                    'metric': metric,
+                    'before': old,
+                    'after': value,
+                    'change_pct': round(change, 1),
+                    'better': better and change != 0,
+                })
+    return rows
+
+
+def format_rows(rows: Iterable[dict]) -> str:
+    lines = [f'{"scenario":<8} {"interface":<9} {"metric":<32} {"before":>12} {"after":>12} {"change":>9}']
+    for row in rows:
+        mark = '+' if row['better'] else ('-' if row['change_pct'] else ' ')
+        lines.append(
+            f'{row["scenario"]:<8} {row["interface"]:<9} {row["metric"]:<32} {row["before"]:>12} '
+            f'{row["after"]:>12} {row["change_pct"]:>8}% {mark}')
+    return '\n'.join(lines)
@@ -0,0 +1,184 @@
+"""
+Drives the weather endpoint in-process through the ASGI or the WSGI application.
+
+Requests go through httpx transports straight into the django application, so the numbers
+cover the full request handling without a server in between, while the upstream calls go
+over the network to the stub upstream. Needs configured django settings.
+"""
+import asyncio
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from api.redis_client import get_sync_redis
+from benchmarks.report import summarize
+from benchmarks.scenarios import Scenario
+
+BASE_URL = 'http://localhost'
+
+
+class AsgiDriver:
+    """Sends requests to `api.asgi.application` on one event loop, `concurrency` at a time."""
+
+    interface = 'asgi'
+
+    def __init__(self, concurrency: int):
+        from api.asgi import application
+
+        self.application = application
+        self.concurrency = concurrency
+        self.loop = asyncio.new_event_loop()
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=application), base_url=BASE_URL)
+        # the transport sends no lifespan events, so the hooks run here
+        self._run(self._run_hooks(application.on_startup))
+
+    def _run(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    @staticmethod
+    async def _run_hooks(hooks):
+        for hook in hooks:
+            await hook()
+
+    async def _request(self, path: str) -> tuple:
+        started_at = time.perf_counter()
+        response = await self.client.get(path)
+        return time.perf_counter() - started_at, response.status_code
+
+    async def _send(self, paths: list) -> list:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def request(path):
+            async with semaphore:
+                return await self._request(path)
+
+        return await asyncio.gather(*[request(path) for path in paths])
+
+    def send(self, paths: list) -> list:
+        return self._run(self._send(paths))
+
+    def send_one(self, path: str) -> tuple:
+        return self._run(self._request(path))
+
+    def close(self):
+        self._run(self.client.aclose())
+        self._run(self._run_hooks(self.application.on_shutdown))
+        self.loop.close()
+
+
+class WsgiDriver:
+    """Sends requests to `api.wsgi.application` from `concurrency` threads, async views run through `async_to_sync`."""
+
+    interface = 'wsgi'
+
+    def __init__(self, concurrency: int):
+        from api.wsgi import application
+
+        self.client = httpx.Client(transport=httpx.WSGITransport(app=application), base_url=BASE_URL)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='benchmark')
+
+    def _request(self, path: str) -> tuple:
+        started_at = time.perf_counter()
+        response = self.client.get(path)
+        return time.perf_counter() - started_at, response.status_code
+
+    def send(self, paths: list) -> list:
+        return list(self.executor.map(self._request, paths))
+
+    def send_one(self, path: str) -> tuple:
+        return self._request(path)
+
+    def close(self):
+        self.executor.shutdown()
+        self.client.close()
+
+
+DRIVERS = {driver.interface: driver for driver in (AsgiDriver, WsgiDriver)}
+
+
+def prepare(driver, scenario: Scenario, redis):
+    """Resets the cache for the scenario and sends its priming requests."""
+
+    for path in scenario.setup(redis):
+        driver.send_one(path)
+
+
+def measure_latency(driver, scenario: Scenario, stub) -> dict:
+    """Times the rounds of the scenario, the time between rounds is not counted."""
+
+    redis = get_sync_redis()
+    prepare(driver, scenario, redis)
+    stub.reset()
+
+    latencies, statuses, elapsed = [], Counter(), 0.0
+    for index, paths in enumerate(scenario.rounds()):
+        scenario.before_round(redis, index)
+        started_at = time.perf_counter()
+        results = driver.send(paths)
+        elapsed += time.perf_counter() - started_at
+        for latency, status_code in results:
+            latencies.append(latency)
+            statuses[str(status_code)] += 1
+
+    result = summarize(latencies, elapsed)
+    result['status_codes'] = dict(statuses)
+    result['upstream_requests'] = stub.requests
+    result['upstream_errors'] = stub.errors
+    return result
+
+
+def measure_allocations(driver, scenario: Scenario) -> dict:
+    """
+    Replays the scenario one request at a time under `tracemalloc`. The peak is the memory
+    allocated on top of what was in use before the request, retained is what is still in use after.
+    """
+
+    redis = get_sync_redis()
+    prepare(driver, scenario, redis)
+
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for index, paths in enumerate(scenario.rounds()):
+            scenario.before_round(redis, index)
+            for path in paths:
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                driver.send_one(path)
+                after, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained.append(after - before)
+    finally:
+        tracemalloc.stop()
+
+    count = len(peaks) or 1
+    return {
+        'alloc_peak_kib_per_request': round(sum(peaks) / count / 1024, 2),
+        'alloc_retained_kib_per_request': round(sum(retained) / count / 1024, 2),
+    }
+
+
+def run(
+        scenario_class,
+        interface: str,
+        requests: int,
+        concurrency: int,
+        stub,
+        alloc_requests: int = 50,
+        seed: int = 0,
+) -> dict:
+    """Runs one scenario against one interface and returns its metrics."""
+
+    driver = DRIVERS[interface](concurrency)
+    try:
+        result = measure_latency(driver, scenario_class(requests, concurrency, seed), stub)
+        if alloc_requests:
+            # the same traffic in a smaller, sequential replay, tracing would distort the timings
+            result.update(measure_allocations(
+                driver, scenario_class(alloc_requests, min(concurrency, alloc_requests), seed)))
+    finally:
+        driver.close()
+    return result
@@ -0,0 +1,112 @@
+"""
+Benchmark scenarios.
+
+A scenario yields rounds of request paths, the requests of a round run concurrently and a
+round only starts once the previous one is done. `before_round` runs in between, outside of
+the measurement, with the blocking redis client to set the cache up.
+"""
+import itertools
+import random
+from typing import (
+    Iterator,
+    List,
+)
+
+from weather.cache_keys import (
+    city_index_key,
+    weather_key,
+)
+
+
+class Scenario:
+    name = ''
+    description = ''
+
+    def __init__(self, requests: int, concurrency: int, seed: int = 0):
+        self.requests = requests
+        self.concurrency = concurrency
+        self.random = random.Random(seed)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(requests={self.requests}, concurrency={self.concurrency})'
+
+    @staticmethod
+    def path(city: str) -> str:
+        return f'/weather/?q={city}'
+
+    def setup(self, redis):
+        """Prepares the cache before the run, returns the paths to request unmeasured to warm it."""
+
+        redis.flush_db()
+        return []
+
+    def rounds(self) -> Iterator[List[str]]:
+        """Yields the request paths of each round, by default all requests form one round."""
+
+        yield [self.path(city) for city in itertools.islice(self.cities(), self.requests)]
+
+    def before_round(self, redis, index: int):
+        pass
+
+    def cities(self) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class ColdCache(Scenario):
+    name = 'cold'
+    description = 'Every request is for a new city, so every request misses and goes upstream.'
+
+    def cities(self):
+        for index in itertools.count():
+            yield f'City{index}'
+
+
+class HotCache(Scenario):
+    name = 'hot'
+    description = 'A few cities which are all cached, so every request is a cache hit.'
+    hot_cities = 20
+
+    def setup(self, redis):
+        super().setup(redis)
+        return [self.path(f'Hot{index}') for index in range(self.hot_cities)]
+
+    def cities(self):
+        for index in itertools.count():
+            yield f'Hot{index % self.hot_cities}'
+
+
+class HerdOnExpiry(Scenario):
+    name = 'herd'
+    description = ('A hot city expires and `concurrency` requests for it arrive at once, '
+                   'ideally only one of them goes upstream.')
+    city = 'Herd'
+
+    def rounds(self):
+        for _ in range(max(self.requests // self.concurrency, 1)):
+            yield [self.path(self.city)] * self.concurrency
+
+    def before_round(self, redis, index: int):
+        # the entry expires right before each round
+        redis.delete(weather_key(self.city))
+        redis.delete(city_index_key(self.city))
+
+    def cities(self):
+        return itertools.repeat(self.city)
+
+
+class MixedCities(Scenario):
+    name = 'mixed'
+    description = ('Cities drawn from a Zipf like distribution over 500 cities with varied spelling, '
+                   'the hot ones hit the cache while the long tail misses.')
+    cities_count = 500
+    skew = 1.1
+
+    def cities(self):
+        weights = [1 / rank ** self.skew for rank in range(1, self.cities_count + 1)]
+        spellings = ['City{}', 'city{}', ' CITY{} ', 'City{}, GB']
+        while True:
+            rank = self.random.choices(range(self.cities_count), weights=weights)[0]
+            yield self.random.choice(spellings).format(rank).replace(' ', '%20')
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (ColdCache, HotCache, HerdOnExpiry, MixedCities)}
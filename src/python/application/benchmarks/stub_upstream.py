@@ -0,0 +1,179 @@
+"""
+Local stand-in for the OpenWeather API.
+
+Answers `GET /data/2.5/weather?q=...` (or `?id=...`) with an OpenWeather like payload, and the group
+endpoint `GET /data/2.5/group?id=...,...` with the payloads of the cities, after a configurable
+latency, and with `503` at a configurable error rate. It runs on its own event loop in a
+background thread, or standalone with `python -m benchmarks.stub_upstream --port 8081`.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import zlib
+from urllib.parse import (
+    parse_qs,
+    urlsplit,
+)
+
+
+def weather_payload(q: str) -> dict:
+    """Returns a deterministic OpenWeather like payload for a city."""
+
+    city = q.split(',')[0].strip().title() or 'Unknown'
+    seed = zlib.crc32(city.encode())
+    return {
+        'coord': {'lon': seed % 360 - 180, 'lat': seed % 180 - 90},
+        'weather': [{'id': 804, 'main': 'Clouds', 'description': 'overcast clouds', 'icon': '04d'}],
+        'main': {'temp': seed % 400 / 10 - 10, 'feels_like': 15.0, 'temp_min': 10.0, 'temp_max': 20.0,
+                 'pressure': 1000 + seed % 40, 'humidity': seed % 100},
+        'wind': {'speed': seed % 200 / 10, 'deg': seed % 359 + 1},
+        'id': seed % 10_000_000, 'name': city, 'cod': 200,
+    }
+
+
+def group_payload(city_ids: list) -> dict:
+    """Returns a payload of the group endpoint, ids which are not numbers are left out like unknown cities."""
+
+    cities = [{**weather_payload(city_id), 'id': int(city_id)} for city_id in city_ids if city_id.isdigit()]
+    return {'cnt': len(cities), 'list': cities}
+
+
+class StubUpstream:
+    """Stub upstream server, `latency` and `jitter` are in seconds, `error_rate` between 0 and 1."""
+
+    def __init__(
+            self,
+            host: str = '127.0.0.1',
+            port: int = 0,
+            latency: float = 0.05,
+            jitter: float = 0.0,
+            error_rate: float = 0.0,
+            seed: int = None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.group_requests = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._writers = set()
+        self._ready = threading.Event()
+
+    def __repr__(self):
+        return f'StubUpstream(url={self.url}, latency={self.latency}, error_rate={self.error_rate})'
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}/data/2.5/weather'
+
+    @property
+    def group_url(self) -> str:
+        return f'http://{self.host}:{self.port}/data/2.5/group'
+
+    def stats(self) -> dict:
+        return {'requests': self.requests, 'errors': self.errors, 'group_requests': self.group_requests}
+
+    def reset(self):
+        self.requests = 0
+        self.errors = 0
+        self.group_requests = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serves HTTP/1.1 keep-alive requests on one connection."""
+
+        self._writers.add(writer)
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                target = head.split(b' ', 2)[1].decode()
+                self.requests += 1
+                delay = self.latency + self.random.uniform(0, self.jitter)
+                if delay:
+                    await asyncio.sleep(delay)
+
+                if self.random.random() < self.error_rate:
+                    self.errors += 1
+                    status, body = '503 Service Unavailable', b'{"cod":503,"message":"stub error"}'
+                else:
+                    url = urlsplit(target)
+                    params = parse_qs(url.query)
+                    if url.path.endswith('/group'):
+                        self.group_requests += 1
+                        payload = group_payload(params.get('id', [''])[0].split(','))
+                    else:
+                        payload = weather_payload(params.get('q', params.get('id', ['']))[0])
+                    status, body = '200 OK', json.dumps(payload).encode()
+                writer.write(
+                    f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\n'
+                    f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def serve(self):
+        self._server = await asyncio.start_server(self.handle, self.host, self.port, backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def shutdown(self):
+        """Stops accepting connections and closes the open ones."""
+
+        for writer in list(self._writers):
+            writer.close()
+        await asyncio.sleep(0)
+        # ends `serve_forever`, and so the background thread
+        self._server.close()
+
+    def start(self) -> str:
+        """Starts the server in a background thread and returns its url."""
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self.serve())
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='stub-upstream', daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+        return self.url
+
+    def stop(self):
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self._loop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds before each response.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random extra latency up to this many seconds.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503.')
+    args = parser.parse_args()
+
+    stub = StubUpstream(args.host, args.port, args.latency, args.jitter, args.error_rate)
+    print(f'Serving the stub upstream on {stub.url}')
+    asyncio.run(stub.serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from benchmarks import importtime
+
+OUTPUT = """import time: self [us] | cumulative | imported package
+import time:      1000 |       1000 |     redis.exceptions
+import time:      2500 |       3500 |   redis
+import time:       500 |       4000 | api.redis_client
+"""
+
+
+class TestImportTime(SimpleTestCase):
+
+    def test_parse_and_summarize(self):
+        modules = importtime.parse(OUTPUT)
+
+        self.assertDictEqual(modules, {
+            'redis.exceptions': (1000, 1000), 'redis': (2500, 3500), 'api.redis_client': (500, 4000)})
+        self.assertDictEqual(importtime.summarize(modules), {
+            'modules': 3, 'total_ms': 4.0, 'packages_ms': {'redis': 3.5, 'api': 0.5}})
+
+    def test_check(self):
+        modules = importtime.parse(OUTPUT + 'import time:        10 |         10 |   fakeredis._server\n')
+
+        self.assertListEqual(importtime.check(modules, max_total_ms=1), [
+            'fakeredis is imported', 'import time of 4.0ms is over the budget of 1ms'])
+
+    def test_worker_boot_has_no_test_or_documentation_imports(self):
+        modules = importtime.measure(env={'REDIS_FAKE': 'false'}, cwd=settings.BASE_DIR)
+
+        self.assertIn('api.asgi', modules)
+        self.assertListEqual(importtime.check(modules), [])
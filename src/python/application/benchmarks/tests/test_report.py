@@ -0,0 +1,37 @@
+from django.test import SimpleTestCase
+
+from benchmarks.report import (
+    compare,
+    percentile,
+    summarize,
+)
+
+
+class TestReport(SimpleTestCase):
+
+    def test_percentile(self):
+        values = [float(value) for value in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 50.0)
+        self.assertEqual(percentile(values, 99), 99.0)
+        self.assertEqual(percentile(values, 100), 100.0)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_summarize(self):
+        summary = summarize([0.01, 0.02, 0.03, 0.04], elapsed=2)
+        self.assertEqual(summary['requests'], 4)
+        self.assertEqual(summary['rps'], 2.0)
+        self.assertEqual(summary['p50_ms'], 20.0)
+        self.assertEqual(summary['max_ms'], 40.0)
+
+    def test_compare(self):
+        before = {'results': {'hot': {'asgi': {'rps': 100, 'p99_ms': 10.0, 'status_codes': {'200': 1}}}}}
+        after = {'results': {
+            'hot': {'asgi': {'rps': 150, 'p99_ms': 12.0, 'status_codes': {'200': 1}}, 'wsgi': {'rps': 1}},
+        }}
+
+        rows = {row['metric']: row for row in compare(before, after)}
+        self.assertSetEqual(set(rows), {'rps', 'p99_ms'})
+        self.assertEqual(rows['rps']['change_pct'], 50.0)
+        self.assertTrue(rows['rps']['better'])
+        self.assertEqual(rows['p99_ms']['change_pct'], 20.0)
+        self.assertFalse(rows['p99_ms']['better'])
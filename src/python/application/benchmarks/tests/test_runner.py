@@ -0,0 +1,88 @@
+import httpx
+from django.test import (
+    TestCase,
+    override_settings,
+)
+
+from api.redis_client import get_sync_redis
+from benchmarks import runner
+from benchmarks.scenarios import (
+    ColdCache,
+    HerdOnExpiry,
+    HotCache,
+)
+from benchmarks.stub_upstream import StubUpstream
+from weather.views import AsyncWeatherView
+
+
+class TestStubUpstream(TestCase):
+
+    def setUp(self) -> None:
+        self.stub = StubUpstream(latency=0)
+        self.stub.start()
+
+    def tearDown(self) -> None:
+        self.stub.stop()
+
+    def test_answers_like_openweather(self):
+        response = httpx.get(self.stub.url, params={'q': 'london,gb'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'London')
+        self.assertDictEqual(self.stub.stats(), {'requests': 1, 'errors': 0, 'group_requests': 0})
+
+    def test_group_endpoint(self):
+        response = httpx.get(self.stub.group_url, params={'id': '2643743,2867714,unknown'})
+
+        self.assertListEqual([city['id'] for city in response.json()['list']], [2643743, 2867714])
+        self.assertDictEqual(self.stub.stats(), {'requests': 1, 'errors': 0, 'group_requests': 1})
+
+    def test_error_rate(self):
+        self.stub.error_rate = 1
+
+        response = httpx.get(self.stub.url, params={'q': 'london'})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertDictEqual(self.stub.stats(), {'requests': 1, 'errors': 1, 'group_requests': 0})
+
+
+class TestRunner(TestCase):
+
+    def setUp(self) -> None:
+        self.stub = StubUpstream(latency=0)
+        self.stub.start()
+        self.settings = override_settings(DATA_ACCESS_URL=self.stub.url, ALLOWED_HOSTS=['localhost'])
+        self.settings.enable()
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.stub.stop()
+        AsyncWeatherView.frequency_tracker.pending.clear()
+        get_sync_redis().flush_all()
+
+    def test_cold_cache_goes_upstream(self):
+        for interface in runner.DRIVERS:
+            with self.subTest(interface=interface):
+                result = runner.run(ColdCache, interface, requests=4, concurrency=2, stub=self.stub, alloc_requests=2)
+
+                self.assertEqual(result['requests'], 4)
+                self.assertDictEqual(result['status_codes'], {'200': 4})
+                self.assertEqual(result['upstream_requests'], 4)
+                self.assertGreater(result['alloc_peak_kib_per_request'], 0)
+
+    def test_hot_cache_does_not_go_upstream(self):
+        HotCache.hot_cities = 2
+        self.addCleanup(setattr, HotCache, 'hot_cities', 20)
+
+        result = runner.run(HotCache, 'asgi', requests=6, concurrency=3, stub=self.stub, alloc_requests=0)
+
+        self.assertDictEqual(result['status_codes'], {'200': 6})
+        self.assertEqual(result['upstream_requests'], 0)
+        self.assertNotIn('alloc_peak_kib_per_request', result)
+
+    def test_herd_is_coalesced(self):
+        result = runner.run(HerdOnExpiry, 'asgi', requests=8, concurrency=4, stub=self.stub, alloc_requests=0)
+
+        self.assertDictEqual(result['status_codes'], {'200': 8})
+        # one upstream request per expiry, the concurrent requests share it
+        self.assertEqual(result['upstream_requests'], 2)
@@ -0,0 +1,31 @@
+"""
+Gunicorn configuration serving `api.asgi` with the api-only settings profile.
+
+    gunicorn api.asgi:application -c gunicorn.conf.py
+
+Every setting can be overridden with its `GUNICORN_*` environment variable.
+"""
+import multiprocessing
+import os
+
+from environs import Env
+
+env = Env()
+env.read_env()
+
+bind = env.str('GUNICORN_BIND', '0.0.0.0:8000')
+# an event loop per core, each one serves many concurrent requests
+workers = env.int('GUNICORN_WORKERS', multiprocessing.cpu_count())
+worker_class = 'api.workers.UvloopWorker'
+# connections queued by the kernel while the workers are busy, capped by net.core.somaxconn
+backlog = env.int('GUNICORN_BACKLOG', 2048)
+keepalive = env.int('GUNICORN_KEEPALIVE', 5)
+timeout = env.int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env.int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+# restart workers after this many requests, 0 never does, the jitter keeps them from restarting together
+max_requests = env.int('GUNICORN_MAX_REQUESTS', 0)
+max_requests_jitter = env.int('GUNICORN_MAX_REQUESTS_JITTER', 0)
+
+os.environ.setdefault('API_ONLY', 'true')
+# every worker keeps to its share of the upstream quota while redis is down
+os.environ.setdefault('UPSTREAM_RATE_LIMIT_WORKERS', str(workers))
@@ -1,5 +1,11 @@
 #!/bin/bash
 
+# Serve the api-only profile with gunicorn and uvicorn workers
+if [ "${API_ONLY,,}" = "true" ]; then
+    echo "Starting gunicorn"
+    exec gunicorn api.asgi:application -c gunicorn.conf.py
+fi
+
 # Collect static files
 echo "Collect static files"
 python manage.py collectstatic --noinput
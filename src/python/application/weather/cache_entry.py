@@ -0,0 +1,45 @@
+"""
+Format of the weather cache entries.
+
+An entry holds the final JSON response body, so cache hits are returned as they are without
+being decoded and encoded again. Entries are written as a JSON envelope with a fixed prefix:
+
+    {"v":1,"fetched_at":1707415689.123,"data":<response body>}
+
+New readers slice the body out of the envelope, while it stays a plain JSON document for the
+older readers which decode it. Entries with an unknown version are treated as missing.
+"""
+import re
+import time
+from typing import Optional
+
+from api.codecs import (
+    dumps_json,
+    loads_json,
+)
+
+ENTRY_VERSION = 1
+ENTRY_HEADER = re.compile(rb'\{"v":(\d+),"fetched_at":([0-9.]+),"data":')
+
+
+def pack_entry(body: bytes, fetched_at: float = None) -> bytes:
+    """Wraps a JSON response body with the time it was fetched from upstream."""
+
+    fetched_at = time.time() if fetched_at is None else fetched_at
+    return b'{"v":%d,"fetched_at":%.3f,"data":%s}' % (ENTRY_VERSION, fetched_at, body)
+
+
+def unpack_entry(entry: bytes) -> Optional[tuple]:
+    """Returns the JSON response body of an entry and its age in seconds, if known."""
+
+    match = ENTRY_HEADER.match(entry)
+    if match is not None:
+        if int(match.group(1)) != ENTRY_VERSION:
+            return None
+        return entry[match.end():-1], max(time.time() - float(match.group(2)), 0)
+
+    # entries written before the body was stored as it is
+    data = loads_json(entry)
+    if isinstance(data, dict) and 'fetched_at' in data:
+        return dumps_json(data['data']), max(time.time() - data['fetched_at'], 0)
+    return dumps_json(data), None
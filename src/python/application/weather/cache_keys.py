@@ -0,0 +1,101 @@
+"""
+Keys of the weather cache.
+
+The weather of a city is stored once, in metric units and without its language dependent
+description, under a short key made of a versioned namespace and the normalized city:
+
+    w3:{london,gb}
+
+The other units are converted from it, see `weather.units`, and the descriptions of the weather
+conditions in all languages are shared by all cities in the hash `w3:descriptions`, see
+`weather.descriptions`.
+
+Each city also has a set index holding its keys, so a city can be found or dropped without
+scanning the keyspace:
+
+    w3:i:{london,gb}
+
+With a city index (`CITY_INDEX_PATH`, see `weather.city_index`) the city is its upstream city id
+instead, so all names of a city share one entry:
+
+    w3:{#2643743}    w3:i:{#2643743}
+
+The city is the hash tag of both keys, in a Redis Cluster a city's entry and its index share a
+slot, so the index and its members are dropped with a single UNLINK on one node.
+
+The request frequency of the weather keys is tracked in the sorted set `w3:hot`, see `weather.warmup`.
+
+Bump `KEY_VERSION` when the key layout changes, the old entries are then left to expire.
+"""
+import re
+from typing import Optional
+
+KEY_VERSION = 3
+KEY_PREFIX = f'w{KEY_VERSION}'
+HOT_KEYS = f'{KEY_PREFIX}:hot'
+DESCRIPTIONS_KEY = f'{KEY_PREFIX}:descriptions'
+# marks the queries of a city by its upstream id, `#2643743`
+CITY_ID_PREFIX = '#'
+
+# country codes people use which are not the ISO 3166 ones of the upstream API
+COUNTRY_ALIASES = {
+    'uk': 'gb',
+}
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_city(q: str) -> str:
+    """
+    Normalizes a `q` query so that all spellings of a city share one cache entry.
+
+    `' New  York , US '` becomes `'new york,us'`: it is case folded, whitespace is collapsed,
+    empty parts are dropped and a country suffix alias is replaced with its ISO 3166 code.
+    """
+
+    parts = [WHITESPACE.sub(' ', part).strip() for part in q.casefold().split(',')]
+    parts = [part for part in parts if part]
+    if len(parts) > 1:
+        parts[-1] = COUNTRY_ALIASES.get(parts[-1], parts[-1])
+    return ','.join(parts)
+
+
+def city_id_query(city_id: int) -> str:
+    """Returns the query of a city by its upstream id, as it is used in the cache keys."""
+
+    return f'{CITY_ID_PREFIX}{city_id}'
+
+
+def parse_city_id(q: str) -> Optional[str]:
+    """Returns the upstream city id of a query of `city_id_query`, `None` for a city name."""
+
+    if q.startswith(CITY_ID_PREFIX):
+        return q[len(CITY_ID_PREFIX):]
+    return None
+
+
+def weather_key(q: str) -> str:
+    """Returns the cache key of the weather of a city."""
+
+    return f'{KEY_PREFIX}:{{{normalize_city(q)}}}'
+
+
+def city_index_key(q: str) -> str:
+    """Returns the key of the set holding all cache keys of a city."""
+
+    return f'{KEY_PREFIX}:i:{{{normalize_city(q)}}}'
+
+
+def index_key_of(key: str) -> str:
+    """Returns the key of the city index of a weather cache key."""
+
+    return f'{KEY_PREFIX}:i:{key[len(KEY_PREFIX) + 1:]}'
+
+
+def parse_weather_key(key: str) -> Optional[dict]:
+    """Returns the query of a weather cache key, `None` for keys of another key version."""
+
+    prefix, _, rest = key.partition(':')
+    if prefix != KEY_PREFIX or not rest.startswith('{'):
+        return None
+    return {'q': rest[1:-1]}
@@ -0,0 +1,207 @@
+"""
+Offline index of the cities of the upstream API, to resolve `q` without an upstream request.
+
+It is built from OpenWeather's city list (`city.list.json.gz` of https://bulk.openweathermap.org/sample/)
+with `python manage.py build_city_index city.list.json.gz` and read through a memory map, so all
+workers share one copy of it in the page cache.
+
+Each city is indexed by its normalized names (`normalize_name`) alone, with its country and, where
+the list has one, with its state and country:
+
+    munchen -> 2867714    munchen,de -> 2867714    portland,or,us -> 5746545
+
+Names of a city in other languages are indexed too when the list has them (the `langs` of the
+extended list). A name shared by several cities resolves to the most populous one when the list
+has populations (`stat.population`), otherwise to the first one in the list.
+
+The file is a header, the offsets of the records and the records sorted by their key:
+
+    CIX1 <record count: u32>  <offset: u32> * (count + 1)  <key> \\0 <city id: u32> <country: 2 bytes> <name>
+
+so a name is found with a binary search over the memory map, and names starting with a prefix are
+next to each other.
+"""
+import gzip
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import unicodedata
+from collections import namedtuple
+from typing import (
+    Iterable,
+    Optional,
+)
+
+from django.conf import settings
+
+from weather.cache_keys import normalize_city
+
+MAGIC = b'CIX1'
+HEADER = struct.Struct('<4sI')
+OFFSET = struct.Struct('<I')
+RECORD = struct.Struct('<I2s')
+
+City = namedtuple('City', ['id', 'name', 'country'])
+
+
+def normalize_name(q: str) -> str:
+    """Normalizes a query as `normalize_city` does and folds its accents, `'München,DE'` becomes `'munchen,de'`."""
+
+    decomposed = unicodedata.normalize('NFKD', normalize_city(q))
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _names(city: dict) -> set:
+    names = {city['name']}
+    for alternate in city.get('langs') or ():
+        # e.g. `{"de": "München"}`, the extended list also links the city's wikipedia page
+        names.update(name for lang, name in alternate.items() if lang != 'link' and isinstance(name, str))
+    return {name for name in names if name}
+
+
+def _keys(city: dict) -> set:
+    country = (city.get('country') or '').strip()
+    state = (city.get('state') or '').strip()
+    keys = set()
+    for name in _names(city):
+        keys.add(name)
+        if country:
+            keys.add(f'{name},{country}')
+            if state:
+                keys.add(f'{name},{state},{country}')
+    return {normalize_name(key) for key in keys} - {''}
+
+
+def build_city_index(cities: Iterable[dict], path: str) -> int:
+    """Writes the index of the `cities` of OpenWeather's city list to `path`, returns its number of keys."""
+
+    best = {}
+    for position, city in enumerate(cities):
+        population = (city.get('stat') or {}).get('population') or 0
+        rank = (-population, position)
+        for key in _keys(city):
+            if key not in best or rank < best[key][0]:
+                best[key] = (rank, city)
+
+    records = []
+    for key in sorted(best, key=lambda key: key.encode()):
+        city = best[key][1]
+        country = (city.get('country') or '').encode('ascii', 'replace')[:2].ljust(2)
+        records.append(key.encode() + b'\0' + RECORD.pack(city['id'], country) + city['name'].encode())
+
+    offsets = [0]
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+
+    # written next to the index and renamed over it, the workers keep their memory map of the previous one
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False) as file:
+        file.write(HEADER.pack(MAGIC, len(records)))
+        file.write(b''.join(OFFSET.pack(offset) for offset in offsets))
+        file.writelines(records)
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
+    return len(records)
+
+
+def read_city_list(path: str) -> list:
+    """Reads OpenWeather's city list, gzipped or not."""
+
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as file:
+        return json.load(file)
+
+
+class CityIndex:
+    """The city index of a file written by `build_city_index`, read through a memory map."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size = HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a city index.')
+        self._records_start = HEADER.size + OFFSET.size * (self.size + 1)
+        # the offsets are little endian, read in place where that is the native byte order
+        if sys.byteorder == 'little':
+            self._offsets = memoryview(self._data)[HEADER.size:self._records_start].cast('I')
+        else:
+            self._offsets = struct.unpack_from(f'<{self.size + 1}I', self._data, HEADER.size)
+
+    def __repr__(self):
+        return f'CityIndex(path={self.path}, size={self.size})'
+
+    def __len__(self):
+        return self.size
+
+    def _bounds(self, position: int) -> tuple:
+        return self._records_start + self._offsets[position], self._records_start + self._offsets[position + 1]
+
+    def _key(self, position: int) -> bytes:
+        start = self._records_start + self._offsets[position]
+        return self._data[start:self._data.find(b'\0', start)]
+
+    def _city(self, position: int) -> City:
+        start, end = self._bounds(position)
+        name_start = self._data.find(b'\0', start, end) + 1 + RECORD.size
+        city_id, country = RECORD.unpack_from(self._data, name_start - RECORD.size)
+        return City(city_id, self._data[name_start:end].decode(), country.decode().strip())
+
+    def _lower_bound(self, key: bytes) -> int:
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def resolve(self, q: str) -> Optional[City]:
+        """Returns the city of a `q` query, `None` if there is no city of that name."""
+
+        key = normalize_name(q).encode()
+        position = self._lower_bound(key)
+        if position < self.size and self._key(position) == key:
+            return self._city(position)
+        return None
+
+    def search(self, prefix: str, limit: int = 10) -> list:
+        """Returns up to `limit` cities with a name starting with `prefix`, in the order of their names."""
+
+        key = normalize_name(prefix).encode()
+        cities = {}
+        position = self._lower_bound(key)
+        while position < self.size and len(cities) < limit and self._key(position).startswith(key):
+            city = self._city(position)
+            cities.setdefault(city.id, city)
+            position += 1
+        return list(cities.values())
+
+    def suggest(self, q: str, limit: int = 5, min_length: int = 3) -> list:
+        """Returns cities with the longest prefix of an unknown `q` as name, e.g. for a typo in its end."""
+
+        name = normalize_name(q).split(',')[0]
+        for length in range(len(name) - 1, min_length - 1, -1):
+            cities = self.search(name[:length], limit)
+            if cities:
+                return cities
+        return []
+
+
+_indexes = {}
+
+
+def get_city_index() -> Optional[CityIndex]:
+    """Returns the city index of `CITY_INDEX_PATH`, `None` if it is not set."""
+
+    path = settings.CITY_INDEX_PATH
+    if not path:
+        return None
+    if path not in _indexes:
+        _indexes[path] = CityIndex(path)
+    return _indexes[path]
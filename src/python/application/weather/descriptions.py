@@ -0,0 +1,57 @@
+"""
+Descriptions of the upstream weather conditions per language.
+
+Only the description of the weather differs between the languages of the upstream API, so the
+cached weather of a city holds the upstream condition id (e.g. `804`) instead of it. The
+descriptions are shared by all cities in the redis hash `DESCRIPTIONS_KEY`, with one field per
+condition id and language, and kept in process once read:
+
+    w3:descriptions    804:en -> overcast clouds    804:de -> Bedeckt
+
+A missing translation is filled by the upstream request for the language which misses it.
+"""
+from typing import Optional
+
+from weather.cache_keys import DESCRIPTIONS_KEY
+from weather.utils import LanguageType
+
+
+class ConditionDescriptions:
+    """The descriptions of the weather conditions, in process in front of a redis hash."""
+
+    def __init__(self, redis, key: str = DESCRIPTIONS_KEY):
+        self.redis = redis
+        self.key = key
+        # bounded by the upstream conditions times the languages, a few hundred entries
+        self.local = {}
+
+    def __repr__(self):
+        return f'ConditionDescriptions(key={self.key}, local={len(self.local)})'
+
+    @staticmethod
+    def field(condition_id: int, lang) -> str:
+        return f'{condition_id}:{LanguageType(lang).value}'
+
+    async def get_many(self, conditions) -> dict:
+        """Returns the known descriptions of `(condition id, language)` pairs by their field."""
+
+        fields = {self.field(condition_id, lang) for condition_id, lang in conditions}
+        missing = [field for field in fields if field not in self.local]
+        if missing:
+            for field, description in zip(missing, await self.redis.get_fields(self.key, missing)):
+                if description is not None:
+                    self.local[field] = description
+        return {field: self.local[field] for field in fields if field in self.local}
+
+    async def get(self, condition_id: int, lang) -> Optional[str]:
+        """Returns the description of a condition in `lang`, `None` if it is not known yet."""
+
+        return (await self.get_many([(condition_id, lang)])).get(self.field(condition_id, lang))
+
+    async def add(self, condition_id: int, lang, description: str):
+        """Stores the description of a condition in `lang`, as it was returned by upstream."""
+
+        field = self.field(condition_id, lang)
+        if self.local.get(field) != description:
+            self.local[field] = description
+            await self.redis.set_fields(self.key, {field: description})
@@ -0,0 +1,43 @@
+import time
+from collections import Counter
+
+
+class RequestFrequencyTracker:
+    """
+    Counts the requests per cache key in a redis sorted set.
+
+    Requests are counted in-process and written with one pipelined `ZINCRBY` per key at most
+    every `flush_seconds`, so tracking does not add a redis round trip to every request.
+    """
+
+    def __init__(self, redis, key: str, flush_seconds: float = 1.0, enabled: bool = True):
+        self.redis = redis
+        self.key = key
+        self.flush_seconds = flush_seconds
+        self.enabled = enabled
+        self.pending = Counter()
+        self._last_flush = time.monotonic()
+
+    def __repr__(self):
+        return f'RequestFrequencyTracker(key={self.key}, flush_seconds={self.flush_seconds})'
+
+    async def record(self, *keys):
+        """Counts one request for each of the given keys."""
+
+        if not self.enabled:
+            return
+        self.pending.update(keys)
+        if time.monotonic() - self._last_flush >= self.flush_seconds:
+            await self.flush()
+
+    async def flush(self):
+        """Writes the pending counts to redis."""
+
+        self._last_flush = time.monotonic()
+        pending, self.pending = self.pending, Counter()
+        if pending:
+            # counts are dropped when redis is not available, they are a ranking hint only
+            await self.redis.increment_scores(self.key, dict(pending))
+
+    async def aclose(self):
+        await self.flush()
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from weather.city_index import (
+    build_city_index,
+    read_city_list,
+)
+
+
+class Command(BaseCommand):
+    help = "Builds the city index from OpenWeather's city list, e.g. city.list.json.gz."
+
+    def add_arguments(self, parser):
+        parser.add_argument('city_list', help='Path of the city list, gzipped or not.')
+        parser.add_argument('--output', default=None, help='Path of the index, `CITY_INDEX_PATH` by default.')
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.CITY_INDEX_PATH
+        if not output:
+            raise CommandError('Either --output or CITY_INDEX_PATH is required.')
+
+        cities = read_city_list(options['city_list'])
+        size = build_city_index(cities, output)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {len(cities)} cities under {size} names in {output}.'))
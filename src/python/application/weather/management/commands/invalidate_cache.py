@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from api.redis_client import get_sync_redis
+from weather.cache_keys import (
+    city_id_query,
+    city_index_key,
+)
+from weather.city_index import get_city_index
+
+
+class Command(BaseCommand):
+    help = 'Deletes or lists the cache keys containing a pattern without blocking redis.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pattern', nargs='?', help='Keys containing this pattern are deleted.')
+        parser.add_argument('--city', help='Delete all cached variants of this city through its index instead.')
+        parser.add_argument('--list', action='store_true', help='Only stream the matching keys, delete nothing.')
+        parser.add_argument('--time-budget', type=float, default=None,
+                            help='Stop after this many seconds and print the cursor to resume from.')
+        parser.add_argument('--cursor', type=int, default=0, help='SCAN cursor to resume from.')
+        parser.add_argument('--lua', action='store_true', help='SCAN and UNLINK on the server with a Lua script.')
+        parser.add_argument('--scan-count', type=int, default=None, help='COUNT hint of each SCAN.')
+        parser.add_argument('--batch-size', type=int, default=None, help='Keys deleted per UNLINK.')
+
+    def handle(self, *args, **options):
+        redis = get_sync_redis()
+
+        if options['city']:
+            city = options['city']
+            city_index = get_city_index()
+            if city_index is not None:
+                # the entries are cached by the city id then
+                resolved = city_index.resolve(city)
+                if resolved is None:
+                    raise CommandError(f'Unknown city: {city}')
+                city = city_id_query(resolved.id)
+            members = redis.get_index_members(city_index_key(city))
+            deleted = redis.drop_index(city_index_key(city))
+            if members:
+                self.publish_invalidation(redis, {'keys': members})
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted or 0} keys of {options["city"]}.'))
+            return
+        if not options['pattern']:
+            raise CommandError('Either a pattern or --city is required.')
+
+        if options['list']:
+            for key in redis.iter_matching_keys(options['pattern'], scan_count=options['scan_count']):
+                self.stdout.write(key.decode() if isinstance(key, bytes) else key)
+            return
+
+        result = redis.invalidate_pattern(
+            options['pattern'],
+            time_budget=options['time_budget'],
+            progress=lambda progress: self.stdout.write(
+                f'{progress.deleted} keys deleted after {progress.elapsed:.2f}s (cursor {progress.cursor}).'),
+            use_lua=options['lua'],
+            cursor=options['cursor'],
+            scan_count=options['scan_count'],
+            batch_size=options['batch_size'],
+        )
+        if result is None:
+            self.stderr.write('Redis is not available.')
+            return
+        # also when the time budget ran out, the keys deleted until then are dropped
+        self.publish_invalidation(redis, {'pattern': options['pattern']})
+        if result.complete:
+            self.stdout.write(self.style.SUCCESS(f'Deleted {result.deleted} keys matching {result.pattern}.'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'Time budget used up after deleting {result.deleted} keys, resume with --cursor {result.cursor}.'))
+
+    @staticmethod
+    def publish_invalidation(redis, message: dict):
+        """Makes the workers drop the deleted keys from their local cache, see `api.local_cache.TwoTierCache`."""
+
+        if settings.L1_CACHE_INVALIDATION_CHANNEL:
+            redis.publish(settings.L1_CACHE_INVALIDATION_CHANNEL, message)
@@ -0,0 +1,94 @@
+import itertools
+import time
+
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from api.codecs import (
+    COMPRESSOR_HEADERS,
+    COMPRESSORS,
+    ValueCompression,
+    decompress_value,
+    get_compressor,
+)
+from api.redis_client import get_sync_redis
+
+
+def percentile(values: list, share: float):
+    return values[min(int(len(values) * share), len(values) - 1)] if values else 0
+
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GiB'
+
+
+class Command(BaseCommand):
+    help = ('Samples keys with MEMORY USAGE and reports their size distribution and the memory each value '
+            'compression would save.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('pattern', nargs='?', default='', help='Only sample keys containing this pattern.')
+        parser.add_argument('--sample', type=int, default=1000, help='Number of keys to sample.')
+        parser.add_argument('--threshold', type=int, default=None,
+                            help='Values of at least this many bytes are compressed, '
+                                 '`REDIS_VALUE_COMPRESSION_THRESHOLD` by default.')
+        parser.add_argument('--compression', action='append', choices=list(COMPRESSORS), default=None,
+                            help='Compression to compare, all installed ones by default.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Keys read per pipeline.')
+
+    def handle(self, *args, **options):
+        redis = get_sync_redis()
+        threshold = options['threshold'] if options['threshold'] is not None else redis.compression.threshold
+        compressions = {'none': ValueCompression(None, threshold)}
+        for name in options['compression'] or COMPRESSORS:
+            try:
+                compressions[name] = ValueCompression(get_compressor(name), threshold)
+            except ValueError as e:
+                if options['compression']:
+                    raise CommandError(str(e))
+
+        keys = itertools.islice(redis.iter_matching_keys(options['pattern']), options['sample'])
+        usages = []
+        values = []
+        for batch in iter(lambda: list(itertools.islice(keys, options['batch_size'])), []):
+            for usage, stored in redis.get_memory_usage(batch):
+                # keys which expired since they were scanned
+                if usage is None:
+                    continue
+                usages.append(usage)
+                if stored is not None:
+                    values.append(stored)
+        if not usages:
+            self.stdout.write('No keys to sample.')
+            return
+
+        usages.sort()
+        value_sizes = sorted(len(decompress_value(stored)) for stored in values)
+        total = sum(usages)
+        self.stdout.write(f'Sampled {len(usages)} keys, {len(values)} of them strings, '
+                          f'using {format_bytes(total)}.')
+        for label, sizes in (('Memory usage', usages), ('Value size', value_sizes)):
+            self.stdout.write(
+                f'{label}: p50 {format_bytes(percentile(sizes, 0.5))}, p90 {format_bytes(percentile(sizes, 0.9))}, '
+                f'p99 {format_bytes(percentile(sizes, 0.99))}, max {format_bytes(sizes[-1] if sizes else 0)}.')
+
+        self.stdout.write(f'Compression of the values of at least {format_bytes(threshold)}:')
+        self.stdout.write(f'{"codec":<8}{"compressed":>12}{"memory":>14}{"saved":>14}{"saved %":>10}{"us/value":>10}')
+        for name, compression in compressions.items():
+            estimated = total
+            compressed = 0
+            start = time.perf_counter()
+            for stored in values:
+                packed = compression.pack(decompress_value(stored))
+                compressed += packed[:1] in COMPRESSOR_HEADERS
+                estimated += len(packed) - len(stored)
+            duration = (time.perf_counter() - start) / max(len(values), 1) * 1e6
+            saved = total - estimated
+            self.stdout.write(f'{name:<8}{compressed:>12}{format_bytes(estimated):>14}{format_bytes(saved):>14}'
+                              f'{saved / total:>10.1%}{duration:>10.1f}')
@@ -0,0 +1,39 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from weather.warmup import (
+    WarmupScheduler,
+    WeatherCacheWarmer,
+)
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the most requested weather cache keys before they expire.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=None, help='Number of hottest keys to keep warm.')
+        parser.add_argument('--concurrency', type=int, default=None, help='Concurrent upstream requests.')
+        parser.add_argument('--rate', type=float, default=None, help='Upstream requests started per second.')
+        parser.add_argument('--refresh-before', type=int, default=None,
+                            help='Refresh keys expiring within this many seconds.')
+        parser.add_argument('--loop', action='store_true', help='Keep running the warm-up every --interval seconds.')
+        parser.add_argument('--interval', type=int, default=None, help='Seconds between two runs with --loop.')
+
+    def handle(self, *args, **options):
+        warmer = WeatherCacheWarmer(
+            top_n=options['top'],
+            concurrency=options['concurrency'],
+            rate_per_second=options['rate'],
+            refresh_before_seconds=options['refresh_before'],
+        )
+        if options['loop']:
+            scheduler = WarmupScheduler(warmer, interval_seconds=options['interval'])
+            self.stdout.write(f'Warming up the weather cache every {scheduler.interval_seconds}s.')
+            asyncio.run(scheduler.run_forever())
+            return
+
+        result = asyncio.run(warmer.run())
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed {result["refreshed"]} of {result["due"]} due keys '
+            f'({result["tracked"]} tracked, {result["failed"]} failed).'))
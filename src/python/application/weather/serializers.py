@@ -2,6 +2,7 @@ from enum import Enum
 
 from rest_framework import serializers
 
+from weather.cache_keys import CITY_ID_PREFIX
 from weather.utils import (
     UnitType,
     LanguageType,
@@ -55,6 +56,12 @@ class WeatherQuerySerializer(QuerySerializer):
     lang = EnumField(help_text='Language type for the weather data.', required=False, enum=LanguageType,
                      default=LanguageType.ENGLISH)
 
+    def validate_q(self, value):
+        # `#` marks the cities by their upstream id in the cache keys, see `weather.cache_keys`
+        if value.strip().startswith(CITY_ID_PREFIX):
+            raise serializers.ValidationError(f'City must not start with `{CITY_ID_PREFIX}`.')
+        return value
+
 
 class WeatherSerializer(BaseSerializer):
     """Weather Serializer."""
@@ -68,3 +75,12 @@ class WeatherSerializer(BaseSerializer):
     wind_speed = serializers.FloatField(help_text='Current day wind speed in the city.', required=False)
     direction = serializers.CharField(help_text='Current day wind direction in the city.', required=False)
     description = serializers.CharField(help_text='Current day weather description in the city.', required=False)
+
+
+class WeatherBatchResultSerializer(BaseSerializer):
+    """Result of a single query of a weather batch request."""
+
+    query = serializers.DictField(help_text='The query this result belongs to.')
+    status = serializers.IntegerField(help_text='HTTP status code of this query.')
+    data = WeatherSerializer(help_text='Weather data, present if the query succeeded.', required=False)
+    errors = serializers.DictField(help_text='Errors, present if the query failed.', required=False)
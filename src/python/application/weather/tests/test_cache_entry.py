@@ -0,0 +1,32 @@
+import time
+
+from django.test import TestCase
+
+from weather.cache_entry import (
+    pack_entry,
+    unpack_entry,
+)
+
+
+class TestCacheEntry(TestCase):
+
+    def test_pack_and_unpack_entry(self):
+        body = b'{"city_name":"Texarkana","temperature":17.87}'
+        entry = pack_entry(body, fetched_at=time.time() - 10)
+
+        self.assertTrue(entry.startswith(b'{"v":1,"fetched_at":'))
+        unpacked_body, age = unpack_entry(entry)
+        self.assertEqual(unpacked_body, body)
+        self.assertAlmostEqual(age, 10, delta=1)
+
+    def test_unpack_legacy_entries(self):
+        body, age = unpack_entry(b'{"fetched_at": %.3f, "data": {"temperature": 17.87}}' % (time.time() - 5))
+        self.assertEqual(body, b'{"temperature":17.87}')
+        self.assertAlmostEqual(age, 5, delta=1)
+
+        body, age = unpack_entry(b'{"temperature": 17.87}')
+        self.assertEqual(body, b'{"temperature":17.87}')
+        self.assertIsNone(age)
+
+    def test_unknown_version_is_a_miss(self):
+        self.assertIsNone(unpack_entry(b'{"v":99,"fetched_at":1707415689.000,"data":{}}'))
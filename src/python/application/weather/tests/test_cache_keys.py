@@ -0,0 +1,48 @@
+from django.test import TestCase
+from redis.crc import key_slot
+
+from weather.cache_keys import (
+    HOT_KEYS,
+    city_id_query,
+    city_index_key,
+    index_key_of,
+    normalize_city,
+    parse_city_id,
+    parse_weather_key,
+    weather_key,
+)
+
+
+class TestCacheKeys(TestCase):
+
+    def test_normalize_city(self):
+        self.assertEqual(normalize_city('London'), 'london')
+        self.assertEqual(normalize_city(' New  York , US '), 'new york,us')
+        self.assertEqual(normalize_city('London,,UK'), 'london,gb')
+        self.assertEqual(normalize_city('Straße'), 'strasse')
+
+    def test_weather_key(self):
+        self.assertEqual(weather_key('London'), 'w3:{london}')
+        self.assertEqual(weather_key('London, UK'), 'w3:{london,gb}')
+
+    def test_city_index_key(self):
+        self.assertEqual(city_index_key(' LONDON , uk'), 'w3:i:{london,gb}')
+
+    def test_city_id_query(self):
+        self.assertEqual(weather_key(city_id_query(2643743)), 'w3:{#2643743}')
+        self.assertEqual(parse_city_id(city_id_query(2643743)), '2643743')
+        self.assertIsNone(parse_city_id('london'))
+
+    def test_index_key_of(self):
+        self.assertEqual(index_key_of(weather_key('London, UK')), city_index_key('london,gb'))
+        self.assertEqual(index_key_of(weather_key(city_id_query(2643743))), 'w3:i:{#2643743}')
+
+    def test_keys_of_a_city_share_a_cluster_slot(self):
+        self.assertEqual(key_slot(weather_key('London, GB').encode()), key_slot(city_index_key('london,uk').encode()))
+
+    def test_parse_weather_key(self):
+        self.assertDictEqual(parse_weather_key(weather_key('New York, US')), {'q': 'new york,us'})
+        self.assertIsNone(parse_weather_key('lang_en_q_London_units_metric'))
+        self.assertIsNone(parse_weather_key('w2:{london}:m:en'))
+        self.assertIsNone(parse_weather_key(city_index_key('London')))
+        self.assertIsNone(parse_weather_key(HOT_KEYS))
@@ -0,0 +1,84 @@
+import os
+import tempfile
+
+from django.test import (
+    TestCase,
+    override_settings,
+)
+
+from weather.city_index import (
+    City,
+    CityIndex,
+    build_city_index,
+    get_city_index,
+    normalize_name,
+)
+
+CITIES = [
+    {'id': 6058560, 'name': 'London', 'state': 'ON', 'country': 'CA', 'stat': {'population': 346765}},
+    {'id': 2643743, 'name': 'London', 'state': '', 'country': 'GB', 'stat': {'population': 7556900},
+     'langs': [{'de': 'London'}, {'link': 'https://en.wikipedia.org/wiki/London'}]},
+    {'id': 2867714, 'name': 'Munich', 'country': 'DE', 'langs': [{'de': 'München'}, {'it': 'Monaco di Baviera'}]},
+    {'id': 5746545, 'name': 'Portland', 'state': 'OR', 'country': 'US'},
+    {'id': 4975802, 'name': 'Portland', 'state': 'ME', 'country': 'US'},
+    {'id': 4133367, 'name': 'Texarkana', 'state': 'AR', 'country': 'US'},
+]
+
+
+def make_city_index(directory: str, cities=CITIES) -> str:
+    path = os.path.join(directory, 'cities.idx')
+    build_city_index(cities, path)
+    return path
+
+
+class TestCityIndex(TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = CityIndex(make_city_index(self.directory.name))
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name(' München , DE'), 'munchen,de')
+        self.assertEqual(normalize_name('Zürich,uk'), 'zurich,gb')
+
+    def test_resolve(self):
+        munich = City(2867714, 'Munich', 'DE')
+        for q in ('Munich', 'München', 'munich,de', 'Munchen, DE', 'Monaco di Baviera'):
+            self.assertEqual(self.index.resolve(q), munich, q)
+        self.assertEqual(self.index.resolve('portland,me,us'), City(4975802, 'Portland', 'US'))
+        self.assertEqual(self.index.resolve('London, CA'), City(6058560, 'London', 'CA'))
+        self.assertIsNone(self.index.resolve('Lodon'))
+        self.assertIsNone(self.index.resolve('Munich,FR'))
+        self.assertIsNone(self.index.resolve(''))
+
+    def test_ambiguous_names(self):
+        # the most populous city, the first one in the list without populations
+        self.assertEqual(self.index.resolve('London').id, 2643743)
+        self.assertEqual(self.index.resolve('Portland').id, 5746545)
+
+    def test_search(self):
+        self.assertListEqual([city.id for city in self.index.search('Lon')], [2643743, 6058560])
+        self.assertListEqual([city.id for city in self.index.search('port', limit=1)], [5746545])
+        self.assertListEqual(self.index.search('xyz'), [])
+
+    def test_suggest(self):
+        self.assertListEqual([city.id for city in self.index.suggest('Londno')], [2643743, 6058560])
+        self.assertListEqual(self.index.suggest('Xylophone'), [])
+
+    def test_invalid_file(self):
+        path = os.path.join(self.directory.name, 'other')
+        with open(path, 'wb') as file:
+            file.write(b'{"cities": []}')
+
+        with self.assertRaises(ValueError):
+            CityIndex(path)
+
+    def test_get_city_index(self):
+        self.assertIsNone(get_city_index())
+
+        with override_settings(CITY_INDEX_PATH=self.index.path):
+            self.assertEqual(len(get_city_index()), len(self.index))
+            self.assertIs(get_city_index(), get_city_index())
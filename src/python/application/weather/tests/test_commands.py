@@ -0,0 +1,154 @@
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import (
+    CommandError,
+    call_command,
+)
+from django.test import (
+    TestCase,
+    override_settings,
+)
+
+from api.redis_client import get_sync_redis
+from weather.cache_keys import (
+    city_id_query,
+    city_index_key,
+    weather_key,
+)
+from weather.city_index import CityIndex
+from weather.tests.test_city_index import (
+    CITIES,
+    make_city_index,
+)
+
+
+class TestInvalidateCacheCommand(TestCase):
+
+    def setUp(self) -> None:
+        self.redis = get_sync_redis()
+        self.redis.set('lang_en_q_London_units_metric', 'data1')
+        self.redis.set('lang_de_q_London_units_metric', 'data2')
+        self.redis.set('lang_en_q_Paris_units_metric', 'data3')
+
+    def tearDown(self) -> None:
+        self.redis.flush_all()
+
+    def test_list_keys(self):
+        out = StringIO()
+        call_command('invalidate_cache', 'London', '--list', stdout=out)
+
+        self.assertListEqual(sorted(out.getvalue().split()),
+                             ['lang_de_q_London_units_metric', 'lang_en_q_London_units_metric'])
+        self.assertEqual(len(self.redis.get_all_keys()), 3)
+
+    def test_invalidate_city(self):
+        self.redis.set(weather_key('London'), 'data1', index=city_index_key('London'))
+        self.redis.set(weather_key('London, GB'), 'data2', index=city_index_key('London'))
+        out = StringIO()
+        call_command('invalidate_cache', '--city', 'london', stdout=out)
+
+        self.assertIn('Deleted 2 keys of london.', out.getvalue())
+        self.assertEqual(len(self.redis.get_all_keys()), 3)
+
+    def test_invalidate_city_of_the_city_index(self):
+        self.redis.set(weather_key(city_id_query(2867714)), 'data', index=city_index_key(city_id_query(2867714)))
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(CITY_INDEX_PATH=make_city_index(directory)):
+            call_command('invalidate_cache', '--city', 'München', stdout=StringIO())
+
+            with self.assertRaises(CommandError):
+                call_command('invalidate_cache', '--city', 'Atlantis')
+
+        self.assertEqual(len(self.redis.get_all_keys()), 3)
+
+    def test_invalidations_are_published(self):
+        self.redis.set(weather_key('London'), 'data1', index=city_index_key('London'))
+        with mock.patch.object(self.redis, 'publish') as publish:
+            call_command('invalidate_cache', '--city', 'london', stdout=StringIO())
+            call_command('invalidate_cache', 'Paris', stdout=StringIO())
+
+        self.assertListEqual(publish.call_args_list, [
+            mock.call(settings.L1_CACHE_INVALIDATION_CHANNEL, {'keys': [weather_key('London')]}),
+            mock.call(settings.L1_CACHE_INVALIDATION_CHANNEL, {'pattern': 'Paris'}),
+        ])
+
+    def test_pattern_or_city_required(self):
+        with self.assertRaises(CommandError):
+            call_command('invalidate_cache')
+
+    def test_invalidate_keys(self):
+        out = StringIO()
+        call_command('invalidate_cache', 'London', '--batch-size', '1', stdout=out)
+
+        self.assertIn('Deleted 2 keys matching *London*.', out.getvalue())
+        self.assertListEqual(self.redis.get_all_keys(), ['lang_en_q_Paris_units_metric'])
+
+
+class TestBuildCityIndexCommand(TestCase):
+
+    def test_build_city_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            city_list = os.path.join(directory, 'city.list.json.gz')
+            with gzip.open(city_list, 'wt') as file:
+                json.dump(CITIES, file)
+            out = StringIO()
+            with override_settings(CITY_INDEX_PATH=os.path.join(directory, 'cities.idx')):
+                call_command('build_city_index', city_list, stdout=out)
+
+            self.assertIn('Indexed 6 cities', out.getvalue())
+            self.assertEqual(CityIndex(os.path.join(directory, 'cities.idx')).resolve('München').id, 2867714)
+
+    def test_output_required(self):
+        with self.assertRaises(CommandError):
+            call_command('build_city_index', 'city.list.json')
+
+
+class TestRedisMemoryReportCommand(TestCase):
+
+    def setUp(self) -> None:
+        self.redis = get_sync_redis()
+        for index in range(10):
+            self.redis.set(weather_key(f'city{index}'), {'description': 'overcast clouds ' * index * 10})
+        self.redis.increment_scores('w3:hot', {'a': 1})
+
+    def tearDown(self) -> None:
+        self.redis.flush_all()
+
+    def test_report(self):
+        out = StringIO()
+        call_command('redis_memory_report', '--threshold', '256', '--compression', 'zlib', stdout=out)
+
+        report = out.getvalue()
+        self.assertIn('Sampled 11 keys, 10 of them strings', report)
+        self.assertIn('Memory usage: p50', report)
+        self.assertRegex(report, r'none +0 .* 0 B +0.0%')
+        # the 8 values of at least 256 bytes
+        self.assertRegex(report, r'zlib +8 ')
+
+    def test_sample_and_pattern(self):
+        out = StringIO()
+        call_command('redis_memory_report', 'hot', '--sample', '5', stdout=out)
+        self.assertIn('Sampled 1 keys, 0 of them strings', out.getvalue())
+
+        out = StringIO()
+        call_command('redis_memory_report', 'missing', stdout=out)
+        self.assertIn('No keys to sample.', out.getvalue())
+
+
+class TestWarmWeatherCacheCommand(TestCase):
+
+    @mock.patch('weather.management.commands.warm_weather_cache.WeatherCacheWarmer')
+    def test_warm_up(self, mock_warmer):
+        mock_warmer.return_value.run = mock.AsyncMock(
+            return_value={'tracked': 3, 'due': 2, 'refreshed': 1, 'failed': 1})
+        out = StringIO()
+        call_command('warm_weather_cache', '--top', '3', '--rate', '2', stdout=out)
+
+        self.assertIn('Refreshed 1 of 2 due keys (3 tracked, 1 failed).', out.getvalue())
+        mock_warmer.assert_called_once_with(top_n=3, concurrency=None, rate_per_second=2.0, refresh_before_seconds=None)
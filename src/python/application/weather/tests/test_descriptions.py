@@ -0,0 +1,49 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from api.redis_client import get_redis
+from weather.cache_keys import DESCRIPTIONS_KEY
+from weather.descriptions import ConditionDescriptions
+from weather.utils import LanguageType
+
+
+class TestConditionDescriptions(TestCase):
+
+    def setUp(self) -> None:
+        self.redis = get_redis()
+        self.descriptions = ConditionDescriptions(self.redis)
+
+    def tearDown(self) -> None:
+        async_to_sync(self.redis.flush_all)()
+
+    async def test_add_and_get(self):
+        self.assertIsNone(await self.descriptions.get(804, 'de'))
+
+        await self.descriptions.add(804, LanguageType.GERMAN, 'Bedeckt')
+
+        self.assertEqual(await self.descriptions.get(804, 'de'), 'Bedeckt')
+        self.assertListEqual(await self.redis.get_fields(DESCRIPTIONS_KEY, ['804:de']), ['Bedeckt'])
+        # other workers read it from redis
+        self.assertEqual(await ConditionDescriptions(self.redis).get(804, 'de'), 'Bedeckt')
+
+    async def test_known_descriptions_are_read_once(self):
+        await self.redis.set_fields(DESCRIPTIONS_KEY, {'800:en': 'clear sky', '804:en': 'overcast clouds'})
+
+        with mock.patch.object(self.redis, 'get_fields', wraps=self.redis.get_fields) as get_fields:
+            self.assertDictEqual(await self.descriptions.get_many([(800, 'en'), (804, 'en'), (804, 'it')]),
+                                 {'800:en': 'clear sky', '804:en': 'overcast clouds'})
+            self.assertEqual(await self.descriptions.get(800, 'en'), 'clear sky')
+
+        self.assertEqual(get_fields.await_count, 1)
+
+    async def test_unchanged_descriptions_are_not_written_again(self):
+        await self.descriptions.add(800, 'en', 'clear sky')
+
+        with mock.patch.object(self.redis, 'set_fields', wraps=self.redis.set_fields) as set_fields:
+            await self.descriptions.add(800, 'en', 'clear sky')
+            await self.descriptions.add(800, 'en', 'sunny')
+
+        self.assertEqual(set_fields.await_count, 1)
+        self.assertEqual(await self.descriptions.get(800, 'en'), 'sunny')
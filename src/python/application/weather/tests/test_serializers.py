@@ -40,6 +40,13 @@ class TestSerializers(TestCase):
         with self.assertRaises(Exception):
             serializer.is_valid(raise_exception=True)
 
+    def test_weather_query_serializer_rejects_city_ids(self):
+        # `#` marks the cities by their upstream id in the cache keys
+        for q in ('#2643743', ' #2643743'):
+            serializer = WeatherQuerySerializer(data={'q': q})
+            self.assertFalse(serializer.is_valid())
+            self.assertIn('q', serializer.errors)
+
     def test_weather_serializer(self):
         data = {
             'city_name': 'Texarkana',
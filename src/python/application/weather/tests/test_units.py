@@ -0,0 +1,45 @@
+from django.test import TestCase
+
+from weather.units import (
+    convert_speed,
+    convert_temperature,
+    convert_weather,
+)
+from weather.utils import UnitType
+
+
+class TestUnits(TestCase):
+
+    def test_convert_temperature(self):
+        self.assertEqual(convert_temperature(17.87, UnitType.METRIC), 17.87)
+        self.assertEqual(convert_temperature(17.87, UnitType.STANDARD), 291.02)
+        self.assertEqual(convert_temperature(-273.15, 'standard'), 0.0)
+        self.assertEqual(convert_temperature(17.87, UnitType.IMPERIAL), 64.17)
+        self.assertEqual(convert_temperature(-40, 'imperial'), -40.0)
+        self.assertEqual(convert_temperature(0, 'imperial'), 32.0)
+        self.assertIsNone(convert_temperature(None, 'imperial'))
+
+    def test_rounding_is_half_up_on_the_exact_value(self):
+        # 0.075 °C are exactly 32.135 °F, binary floats would round it down to 32.13
+        self.assertEqual(convert_temperature(0.075, 'imperial'), 32.14)
+        self.assertEqual(convert_temperature(1.025, 'imperial'), 33.85)
+        self.assertEqual(convert_temperature(0.025, 'standard'), 273.18)
+        # negative halves round away from zero, -0.445 °F
+        self.assertEqual(convert_temperature(-18.025, 'imperial'), -0.45)
+
+    def test_convert_speed(self):
+        self.assertEqual(convert_speed(5.14, UnitType.METRIC), 5.14)
+        self.assertEqual(convert_speed(5.14, UnitType.STANDARD), 5.14)
+        self.assertEqual(convert_speed(5.14, UnitType.IMPERIAL), 11.5)
+        self.assertEqual(convert_speed(0.44704, 'imperial'), 1.0)
+        self.assertIsNone(convert_speed(None, 'imperial'))
+
+    def test_convert_weather(self):
+        data = {'city_name': 'Texarkana', 'temperature': 17.87, 'max_temperature': None, 'wind_speed': 5.14,
+                'humidity': 74}
+
+        self.assertDictEqual(convert_weather(data, 'imperial'),
+                             {'city_name': 'Texarkana', 'temperature': 64.17, 'max_temperature': None,
+                              'wind_speed': 11.5, 'humidity': 74})
+        self.assertEqual(data['temperature'], 17.87)
+
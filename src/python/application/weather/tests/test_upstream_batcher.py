@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from unittest import mock
+
+import httpx
+from django.test import TestCase
+
+from benchmarks.stub_upstream import StubUpstream
+from weather.upstream_batcher import (
+    CityNotInGroup,
+    UpstreamBatcher,
+)
+
+
+class TestUpstreamBatcher(TestCase):
+
+    def setUp(self) -> None:
+        self.stub = StubUpstream(latency=0)
+        self.stub.start()
+        self.batcher = UpstreamBatcher(self.stub.group_url, window_seconds=0.01)
+
+    def tearDown(self) -> None:
+        self.stub.stop()
+
+    async def test_concurrent_requests_share_group_requests(self):
+        query = {'units': 'metric', 'lang': 'en', 'appid': 'key'}
+        city_ids = list(range(1, 31)) + [1]
+
+        payloads = await asyncio.gather(*[self.batcher.fetch({**query, 'id': city_id}) for city_id in city_ids])
+
+        self.assertListEqual([payload['id'] for payload in payloads], city_ids)
+        # a full group of 20 cities right away, then the other 10 after the window
+        self.assertDictEqual(self.stub.stats(), {'requests': 2, 'errors': 0, 'group_requests': 2})
+
+    async def test_queries_are_grouped_by_their_parameters(self):
+        english, german = await asyncio.gather(
+            self.batcher.fetch({'id': 1, 'lang': 'en'}), self.batcher.fetch({'id': 2, 'lang': 'de'}))
+
+        self.assertEqual((english['id'], german['id']), (1, 2))
+        self.assertEqual(self.stub.group_requests, 2)
+
+    def test_requests_are_grouped_per_event_loop(self):
+        started = threading.Barrier(2)
+
+        async def fetch(city_id):
+            started.wait()
+            return await asyncio.wait_for(self.batcher.fetch({'id': city_id}), timeout=3)
+
+        results = {}
+
+        def run(city_id):
+            results[city_id] = asyncio.run(fetch(city_id))
+
+        threads = [threading.Thread(target=run, args=(city_id,)) for city_id in (1, 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({city_id: result['id'] for city_id, result in results.items()}, {1: 1, 2: 2})
+        # each loop sends its own group
+        self.assertEqual(self.stub.group_requests, 2)
+
+    async def test_city_not_in_group(self):
+        results = await asyncio.gather(
+            self.batcher.fetch({'id': 1}), self.batcher.fetch({'id': 'unknown'}), return_exceptions=True)
+
+        self.assertEqual(results[0]['id'], 1)
+        self.assertIsInstance(results[1], CityNotInGroup)
+        self.assertEqual(self.stub.group_requests, 1)
+
+    @mock.patch('weather.upstream_batcher.get_upstream_client')
+    async def test_errors_are_raised_in_all_requests(self, mock_upstream_client):
+        mock_upstream_client.return_value.get = mock.AsyncMock(side_effect=httpx.ConnectError('refused'))
+
+        results = await asyncio.gather(
+            self.batcher.fetch({'id': 1}), self.batcher.fetch({'id': 2}), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, httpx.ConnectError) for result in results))
+        self.assertEqual(mock_upstream_client.return_value.get.await_count, 1)
+        self.assertEqual(mock_upstream_client.return_value.get.call_args.kwargs['params'], {'id': '1,2'})
@@ -1,5 +1,9 @@
+import asyncio
+import tempfile
+import time
 from unittest import mock
 
+from asgiref.sync import async_to_sync
 from django.test import (
     override_settings,
     AsyncClient,
@@ -7,7 +11,20 @@ from django.test import (
 from rest_framework.test import APITestCase
 from django.urls import reverse
 
+from api.codecs import loads_json
+from api.rate_limiter import RateLimitExceeded
 from api.redis_client import get_redis
+from api.upstream import UpstreamUnavailable
+from weather.views import AsyncWeatherView
+from weather.cache_keys import (
+    DESCRIPTIONS_KEY,
+    HOT_KEYS,
+    KEY_PREFIX,
+    city_id_query,
+    city_index_key,
+    weather_key,
+)
+from weather.tests.test_city_index import make_city_index
 
 data = {'coord': {'lon': -94.04, 'lat': 33.44},
         'weather': [{'id': 804, 'main': 'Clouds', 'description': 'overcast clouds', 'icon': '04d'}], 'base': 'stations',
@@ -25,15 +42,16 @@ class TestAsyncWeather(APITestCase):
         super().setUp()
 
     def tearDown(self) -> None:
-        self.fake_redis.flush_all()
+        async_to_sync(self.fake_redis.flush_all)()
+        AsyncWeatherView.descriptions.local.clear()
 
-    @mock.patch('weather.views.httpx.AsyncClient')
-    async def test_async_weather_view_with_200_ok(self, mock_async_client):
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_view_with_200_ok(self, mock_http_client):
         mock_response = mock.MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = data
 
-        mock_async_client.return_value.__aenter__.return_value.get.return_value = mock_response
+        mock_http_client.return_value.get = mock.AsyncMock(return_value=mock_response)
 
         url = reverse('weather') + f'?q=Texarkana'
         client = AsyncClient()
@@ -45,20 +63,480 @@ class TestAsyncWeather(APITestCase):
                                                'wind_speed': 5.14, 'direction': 'South',
                                                'description': 'overcast clouds'}
                              )
-        # test cache generated
-        self.assertListEqual(self.fake_redis.get_all_keys(),
-                             ['lang_en_q_Texarkana_units_metric'])
+        # test cache generated, with the index of the city
+        self.assertCountEqual(await self.fake_redis.get_pattern_keys(KEY_PREFIX),
+                              [weather_key('Texarkana'), city_index_key('Texarkana'), DESCRIPTIONS_KEY])
+        self.assertListEqual(await self.fake_redis.get_index_members(city_index_key('Texarkana')),
+                             [weather_key('Texarkana')])
+        self.assertTrue((await self.fake_redis.get(weather_key('Texarkana'), raw=True)).startswith(b'{"v":1,'))
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_view_shares_entries_between_spellings(self, mock_http_client):
+        mock_response = mock.MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = data
+        mock_http_client.return_value.get = mock.AsyncMock(return_value=mock_response)
+
+        client = AsyncClient()
+        response = await client.get(reverse('weather') + '?q=Texarkana, US', format='json')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(mock_http_client.return_value.get.call_args.kwargs['params']['q'], 'texarkana,us')
+
+        response = await client.get(reverse('weather') + '?q=  texarkana,us', format='json')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(mock_http_client.return_value.get.await_count, 1)
+
+        await client.get(reverse('weather') + '?q=Texarkana,US&units=imperial&lang=de', format='json')
+        self.assertEqual(mock_http_client.return_value.get.call_args.kwargs['params']['units'], 'metric')
+        self.assertListEqual(await self.fake_redis.get_index_members(city_index_key('TEXARKANA, us')),
+                             [weather_key('texarkana,us')])
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_view_shares_entries_between_languages(self, mock_http_client):
+        mock_response = mock.MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = data
+        german = mock.MagicMock()
+        german.status_code = 200
+        german.json.return_value = {**data, 'weather': [{'id': 804, 'main': 'Clouds', 'description': 'Bedeckt'}]}
+        mock_http_client.return_value.get = mock.AsyncMock(return_value=mock_response)
+
+        client = AsyncClient()
+        await client.get(reverse('weather') + '?q=Texarkana', format='json')
+        # the entry holds the condition id instead of the description
+        entry = await self.fake_redis.get(weather_key('Texarkana'))
+        self.assertEqual(entry['data']['condition_id'], 804)
+        self.assertNotIn('description', entry['data'])
+        self.assertListEqual(await self.fake_redis.get_fields(DESCRIPTIONS_KEY, ['804:en']), ['overcast clouds'])
+
+        # the German description is not known yet, it is fetched once
+        mock_http_client.return_value.get.return_value = german
+        response = await client.get(reverse('weather') + '?q=Texarkana&lang=de', format='json')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['description'], 'Bedeckt')
+        self.assertEqual(mock_http_client.return_value.get.call_args.kwargs['params']['lang'], 'de')
+
+        # then all cities with that condition are served in German from their cached entry
+        await self.fake_redis.set(weather_key('London'), {'fetched_at': time.time(), 'data': {
+            'city_name': 'London', 'temperature': 10.0, 'condition_id': 804}})
+        response = await client.get(reverse('weather') + '?q=London&lang=de', format='json')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertDictEqual(response.json(), {'city_name': 'London', 'temperature': 10.0, 'description': 'Bedeckt'})
+        response = await client.get(reverse('weather') + '?q=London', format='json')
+        self.assertEqual(response.json()['description'], 'overcast clouds')
+        self.assertEqual(mock_http_client.return_value.get.await_count, 2)
+
+    async def test_async_weather_view_reads_descriptions_from_redis(self):
+        await self.fake_redis.set_fields(DESCRIPTIONS_KEY, {'804:it': 'cielo coperto'})
+        await self.fake_redis.set(weather_key('Rome'), {'fetched_at': time.time(), 'data': {
+            'city_name': 'Rome', 'condition_id': 804}})
+
+        client = AsyncClient()
+        response = await client.get(reverse('weather') + '?q=Rome&lang=it', format='json')
 
-    @mock.patch('weather.views.httpx.AsyncClient')
-    async def test_async_weather_view_with_exception(self, mock_async_client):
-        self.fake_redis.flush_all()
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['description'], 'cielo coperto')
+        self.assertEqual(AsyncWeatherView.descriptions.local['804:it'], 'cielo coperto')
+
+    async def test_metric_bodies_are_not_decoded(self):
+        view = AsyncWeatherView()
+        await self.fake_redis.set_fields(DESCRIPTIONS_KEY, {'804:en': 'overcast clouds'})
+        bodies = [b'{"city_name":"Rome","temperature":10.0,"condition_id":804}', b'{"condition_id":804}',
+                  b'{"city_name":"Rome","temperature":10.0}']
+
+        for body in bodies:
+            with mock.patch('weather.views.loads_json') as decode:
+                rendered = await view._render(body, 'metric', 'en')
+            decode.assert_not_called()
+            # the same body as the decoded one
+            self.assertEqual(rendered, await view._render_data(loads_json(body), 'metric', 'en'))
+        self.assertIsNone(await view._render(bodies[0], 'metric', 'de'))
+        self.assertEqual(await view._render(bodies[0], 'metric', 'de', fallback=True),
+                         b'{"city_name":"Rome","temperature":10.0,"description":null}')
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_view_converts_units_locally(self, mock_http_client):
+        mock_response = mock.MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = data
+        mock_http_client.return_value.get = mock.AsyncMock(return_value=mock_response)
+
+        client = AsyncClient()
+        response = await client.get(reverse('weather') + '?q=Texarkana&units=imperial', format='json')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertDictEqual(response.json(), {'city_name': 'Texarkana', 'temperature': 64.17, 'min_temperature': 62.69,
+                                               'max_temperature': 65.25, 'humidity': 74, 'pressure': 1015,
+                                               'wind_speed': 11.5, 'direction': 'South',
+                                               'description': 'overcast clouds'})
+
+        # all units are served from the one metric entry
+        response = await client.get(reverse('weather') + '?q=Texarkana&units=standard', format='json')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['temperature'], 291.02)
+        self.assertEqual(response.json()['wind_speed'], 5.14)
+        response = await client.get(reverse('weather') + '?q=Texarkana', format='json')
+        self.assertEqual(response.json()['temperature'], 17.87)
+        self.assertEqual(mock_http_client.return_value.get.await_count, 1)
+        self.assertListEqual(await self.fake_redis.get_index_members(city_index_key('Texarkana')),
+                             [weather_key('Texarkana')])
+
+    async def test_async_weather_view_tracks_request_frequency(self):
+        await self.fake_redis.set(weather_key('Texarkana'), {'city_name': 'Texarkana'})
+        tracker = AsyncWeatherView.frequency_tracker
+        tracker.pending.clear()
+
+        client = AsyncClient()
+        for q in ('Texarkana', 'texarkana ', 'Texarkana'):
+            await client.get(reverse('weather') + f'?q={q}', format='json')
+        await tracker.flush()
+
+        self.assertListEqual(await self.fake_redis.get_top_scores(HOT_KEYS, 10), [(weather_key('Texarkana'), 3.0)])
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_view_when_rate_limited(self, mock_upstream_client):
+        mock_upstream_client.return_value.get = mock.AsyncMock(side_effect=RateLimitExceeded(1.5))
+
+        client = AsyncClient()
+        response = await client.get(reverse('weather') + '?q=Texarkana', format='json')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(response.json()['retry_after'], 1.5)
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_view_when_upstream_is_unavailable(self, mock_upstream_client):
+        mock_upstream_client.return_value.get = mock.AsyncMock(side_effect=UpstreamUnavailable(10))
+
+        client = AsyncClient()
+        response = await client.get(reverse('weather') + '?q=Texarkana', format='json')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '10')
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_view_with_exception(self, mock_http_client):
+        await self.fake_redis.flush_all()
         mock_response = mock.MagicMock()
         mock_response.status_code = 400
 
-        mock_async_client.return_value.__aenter__.return_value.get.return_value = mock_response
+        mock_http_client.return_value.get = mock.AsyncMock(return_value=mock_response)
 
         url = reverse('weather') + f'?q=Texarkana????'
         client = AsyncClient()
         response = await client.get(url, format='json')
 
         self.assertEqual(response.status_code, 400)
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_view_coalesces_concurrent_misses(self, mock_http_client):
+        mock_response = mock.MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = data
+
+        async def slow_get(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return mock_response
+
+        mock_http_client.return_value.get = mock.AsyncMock(side_effect=slow_get)
+
+        url = reverse('weather') + f'?q=Texarkana'
+        client = AsyncClient()
+        # nothing gets cached, so only coalescing can avoid the extra upstream calls
+        with mock.patch.object(self.fake_redis, 'set', mock.AsyncMock(return_value=True)):
+            responses = await asyncio.gather(*[client.get(url, format='json') for _ in range(5)])
+
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        self.assertEqual(mock_http_client.return_value.get.await_count, 1)
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_view_coalesces_misses_in_other_languages(self, mock_http_client):
+        descriptions = {'en': 'overcast clouds', 'de': 'Bedeckt'}
+
+        async def slow_get(*args, params, **kwargs):
+            await asyncio.sleep(0.05)
+            mock_response = mock.MagicMock()
+            mock_response.status_code = 200
+            mock_response.json.return_value = {
+                **data, 'weather': [{'id': 804, 'main': 'Clouds', 'description': descriptions[params['lang']]}]}
+            return mock_response
+
+        mock_http_client.return_value.get = mock.AsyncMock(side_effect=slow_get)
+
+        client = AsyncClient()
+        english, german = await asyncio.gather(client.get(reverse('weather') + '?q=Texarkana', format='json'),
+                                               client.get(reverse('weather') + '?q=Texarkana&lang=de', format='json'))
+
+        self.assertEqual(english.json()['description'], 'overcast clouds')
+        self.assertEqual(german.json()['description'], 'Bedeckt')
+        # the German request joined the English one and fetched once more for its description
+        self.assertEqual(mock_http_client.return_value.get.await_count, 2)
+        self.assertFalse(AsyncWeatherView.single_flight.in_flight(weather_key('Texarkana')))
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_view_serves_cached_data(self, mock_http_client):
+        cached = {'city_name': 'Texarkana', 'temperature': 10.0}
+        await self.fake_redis.set(weather_key('Texarkana'), {'fetched_at': time.time() - 5, 'data': cached})
+        mock_http_client.return_value.get = mock.AsyncMock()
+
+        url = reverse('weather') + f'?q=Texarkana'
+        client = AsyncClient()
+        response = await client.get(url, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(response.json(), cached)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response['Age'], '5')
+        mock_http_client.return_value.get.assert_not_awaited()
+
+    @override_settings(CACHE_SOFT_TTL_SECONDS=60)
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_view_revalidates_stale_data(self, mock_http_client):
+        cached = {'city_name': 'Texarkana', 'temperature': 10.0}
+        await self.fake_redis.set(weather_key('Texarkana'), {'fetched_at': time.time() - 120, 'data': cached})
+        mock_response = mock.MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = data
+
+        async def slow_get(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return mock_response
+
+        mock_http_client.return_value.get = mock.AsyncMock(side_effect=slow_get)
+
+        url = reverse('weather') + f'?q=Texarkana'
+        client = AsyncClient()
+        responses = [await client.get(url, format='json') for _ in range(3)]
+
+        # stale data is served immediately while a single refresh runs in the background
+        for response in responses:
+            self.assertDictEqual(response.json(), cached)
+            self.assertEqual(response['X-Cache'], 'STALE')
+            self.assertGreaterEqual(int(response['Age']), 120)
+        await asyncio.sleep(0.1)
+        self.assertEqual(mock_http_client.return_value.get.await_count, 1)
+
+        response = await client.get(url, format='json')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['temperature'], 17.87)
+
+    async def test_async_weather_view_serves_legacy_entries(self):
+        cached = {'city_name': 'Texarkana', 'temperature': 10.0}
+        await self.fake_redis.set(weather_key('Texarkana'), cached)
+
+        url = reverse('weather') + f'?q=Texarkana'
+        client = AsyncClient()
+        response = await client.get(url, format='json')
+
+        self.assertDictEqual(response.json(), cached)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertFalse(response.has_header('Age'))
+
+
+@override_settings(ROOT_URLCONF='api.urls')
+class TestAsyncWeatherBatch(APITestCase):
+
+    def setUp(self) -> None:
+        self.fake_redis = get_redis()
+        super().setUp()
+
+    def tearDown(self) -> None:
+        async_to_sync(self.fake_redis.flush_all)()
+        AsyncWeatherView.descriptions.local.clear()
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_batch_view(self, mock_http_client):
+        cached = {'city_name': 'London', 'temperature': 10.0}
+        await self.fake_redis.set(weather_key('London'), {'fetched_at': time.time(), 'data': cached})
+        mock_response = mock.MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = data
+        mock_http_client.return_value.get = mock.AsyncMock(return_value=mock_response)
+
+        queries = [{'q': 'London'}, {'q': 'Texarkana'}, {'q': 'Texarkana'}, {'units': 'kelvin'},
+                   {'q': 'London', 'units': 'standard'}, {'q': 'Texarkana', 'units': 'imperial'}]
+        client = AsyncClient()
+        response = await client.post(reverse('weather-batch'), data=queries, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results[4]['data']['temperature'], 283.15)
+        self.assertEqual(results[5]['data']['temperature'], 64.17)
+        self.assertDictEqual(results[0], {'query': {'q': 'London', 'units': 'metric', 'lang': 'en'},
+                                          'status': 200, 'data': cached})
+        self.assertEqual(results[1]['status'], 200)
+        self.assertEqual(results[1]['data']['temperature'], 17.87)
+        self.assertDictEqual(results[1], results[2])
+        self.assertEqual(results[3]['status'], 400)
+        self.assertIn('q', results[3]['errors'])
+        # only the miss went upstream, once, and was written back to the cache
+        self.assertEqual(mock_http_client.return_value.get.await_count, 1)
+        self.assertEqual((await self.fake_redis.get(weather_key('Texarkana')))['data']['temperature'], 17.87)
+        self.assertListEqual(await self.fake_redis.get_index_members(city_index_key('Texarkana')),
+                             [weather_key('Texarkana')])
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_batch_view_fetches_missing_descriptions(self, mock_http_client):
+        await self.fake_redis.set(weather_key('London'), {'fetched_at': time.time(), 'data': {
+            'city_name': 'London', 'condition_id': 804}})
+        await self.fake_redis.set_fields(DESCRIPTIONS_KEY, {'804:en': 'overcast clouds'})
+        german = mock.MagicMock()
+        german.status_code = 200
+        german.json.return_value = {**data, 'name': 'London', 'weather': [{'id': 804, 'description': 'Bedeckt'}]}
+        mock_http_client.return_value.get = mock.AsyncMock(return_value=german)
+
+        queries = [{'q': 'London'}, {'q': 'London', 'lang': 'de'}, {'q': 'london', 'lang': 'de', 'units': 'imperial'}]
+        client = AsyncClient()
+        response = await client.post(reverse('weather-batch'), data=queries, content_type='application/json')
+
+        results = response.json()
+        self.assertDictEqual(results[0]['data'], {'city_name': 'London', 'description': 'overcast clouds'})
+        self.assertEqual(results[1]['data']['description'], 'Bedeckt')
+        self.assertEqual(results[2]['data']['description'], 'Bedeckt')
+        self.assertEqual(results[2]['data']['temperature'], 64.17)
+        # one upstream request for the missing German description of both German queries
+        self.assertEqual(mock_http_client.return_value.get.await_count, 1)
+        self.assertEqual(mock_http_client.return_value.get.call_args.kwargs['params']['lang'], 'de')
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_batch_view_with_upstream_error(self, mock_http_client):
+        mock_http_client.return_value.get = mock.AsyncMock(side_effect=Exception('upstream down'))
+
+        client = AsyncClient()
+        response = await client.post(reverse('weather-batch'), data=[{'q': 'Texarkana'}],
+                                     content_type='application/json')
+
+        result = response.json()[0]
+        self.assertEqual(result['status'], 502)
+        self.assertEqual(result['errors']['error_message'], 'Error making request to API: upstream down')
+        self.assertListEqual(await self.fake_redis.get_pattern_keys(KEY_PREFIX), [])
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_async_weather_batch_view_when_rate_limited(self, mock_upstream_client):
+        mock_upstream_client.return_value.get = mock.AsyncMock(side_effect=RateLimitExceeded(1))
+
+        client = AsyncClient()
+        response = await client.post(reverse('weather-batch'), data=[{'q': 'Texarkana'}],
+                                     content_type='application/json')
+
+        result = response.json()[0]
+        self.assertEqual(result['status'], 429)
+        self.assertEqual(result['errors']['retry_after'], 1)
+
+    async def test_async_weather_batch_view_with_invalid_body(self):
+        client = AsyncClient()
+        response = await client.post(reverse('weather-batch'), data={'q': 'Texarkana'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        response = await client.post(reverse('weather-batch'), data='not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        with override_settings(WEATHER_BATCH_MAX_SIZE=1):
+            response = await client.post(reverse('weather-batch'), data=[{'q': 'a'}, {'q': 'b'}],
+                                         content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='api.urls')
+class TestAsyncWeatherCityIndex(APITestCase):
+
+    def setUp(self) -> None:
+        self.fake_redis = get_redis()
+        self.directory = tempfile.TemporaryDirectory()
+        self.city_index = override_settings(CITY_INDEX_PATH=make_city_index(self.directory.name))
+        self.city_index.enable()
+        super().setUp()
+
+    def tearDown(self) -> None:
+        self.city_index.disable()
+        self.directory.cleanup()
+        async_to_sync(self.fake_redis.flush_all)()
+        AsyncWeatherView.descriptions.local.clear()
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_aliases_share_the_entry_of_the_city_id(self, mock_http_client):
+        mock_response = mock.MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {**data, 'id': 2867714, 'name': 'Munich'}
+        mock_http_client.return_value.get = mock.AsyncMock(return_value=mock_response)
+
+        client = AsyncClient()
+        response = await client.get(reverse('weather') + '?q=Munich', format='json')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        params = mock_http_client.return_value.get.call_args.kwargs['params']
+        self.assertEqual(params['id'], '2867714')
+        self.assertNotIn('q', params)
+
+        for q in ('München', 'munich,de'):
+            response = await client.get(reverse('weather') + f'?q={q}', format='json')
+            self.assertEqual(response['X-Cache'], 'HIT')
+            self.assertEqual(response.json()['city_name'], 'Munich')
+        self.assertEqual(mock_http_client.return_value.get.await_count, 1)
+        self.assertListEqual(await self.fake_redis.get_index_members(city_index_key(city_id_query(2867714))),
+                             [weather_key(city_id_query(2867714))])
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_city_ids_are_not_taken_from_the_query(self, mock_http_client):
+        mock_http_client.return_value.get = mock.AsyncMock()
+
+        client = AsyncClient()
+        response = await client.get(reverse('weather') + '?q=%232643743', format='json')
+
+        self.assertEqual(response.status_code, 400)
+        mock_http_client.return_value.get.assert_not_awaited()
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_unknown_cities_are_rejected_locally(self, mock_http_client):
+        mock_http_client.return_value.get = mock.AsyncMock()
+
+        client = AsyncClient()
+        response = await client.get(reverse('weather') + '?q=Londno', format='json')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['error_message'], 'Unknown city: Londno')
+        self.assertListEqual([city['id'] for city in response.json()['suggestions']], [2643743, 6058560])
+        mock_http_client.return_value.get.assert_not_awaited()
+        self.assertListEqual(await self.fake_redis.get_pattern_keys(KEY_PREFIX), [])
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_batch(self, mock_http_client):
+        mock_response = mock.MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = data
+        mock_http_client.return_value.get = mock.AsyncMock(return_value=mock_response)
+
+        queries = [{'q': 'Texarkana'}, {'q': 'texarkana, ar, us'}, {'q': 'Atlantis'}]
+        client = AsyncClient()
+        response = await client.post(reverse('weather-batch'), data=queries, content_type='application/json')
+
+        results = response.json()
+        self.assertEqual(results[0]['status'], 200)
+        self.assertDictEqual(results[0]['data'], results[1]['data'])
+        self.assertEqual(results[1]['query']['q'], 'texarkana, ar, us')
+        self.assertEqual(results[2]['status'], 404)
+        self.assertEqual(results[2]['errors']['error_message'], 'Unknown city: Atlantis')
+        self.assertEqual(mock_http_client.return_value.get.await_count, 1)
+        self.assertEqual(mock_http_client.return_value.get.call_args.kwargs['params']['id'], '4133367')
+
+    @override_settings(UPSTREAM_GROUP_ENABLED=True)
+    @mock.patch('weather.upstream_batcher.get_upstream_client')
+    async def test_misses_are_fetched_in_groups(self, mock_upstream_client):
+        mock_response = mock.MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'cnt': 2, 'list': [
+            {**data, 'id': 2867714, 'name': 'Munich'}, {**data, 'id': 2643743, 'name': 'London'}]}
+        mock_upstream_client.return_value.get = mock.AsyncMock(return_value=mock_response)
+
+        queries = [{'q': 'London'}, {'q': 'München'}, {'q': 'Munich', 'units': 'imperial'}]
+        client = AsyncClient()
+        response = await client.post(reverse('weather-batch'), data=queries, content_type='application/json')
+
+        results = response.json()
+        self.assertListEqual([result['data']['city_name'] for result in results], ['London', 'Munich', 'Munich'])
+        self.assertEqual(results[2]['data']['temperature'], 64.17)
+        mock_upstream_client.return_value.get.assert_awaited_once()
+        self.assertEqual(mock_upstream_client.return_value.get.call_args.kwargs['params']['id'], '2643743,2867714')
+
+        response = await client.get(reverse('weather') + '?q=London,GB', format='json')
+        self.assertEqual(response['X-Cache'], 'HIT')
@@ -0,0 +1,95 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import (
+    TestCase,
+    override_settings,
+)
+
+from api.redis_client import get_redis
+from weather.cache_keys import (
+    HOT_KEYS,
+    weather_key,
+)
+from weather.frequency import RequestFrequencyTracker
+from weather.tests.test_views import data
+from weather.warmup import (
+    WARMUP_LOCK,
+    WeatherCacheWarmer,
+)
+
+
+class TestRequestFrequencyTracker(TestCase):
+
+    def setUp(self) -> None:
+        self.redis = get_redis()
+
+    def tearDown(self) -> None:
+        async_to_sync(self.redis.flush_all)()
+
+    async def test_counts_are_flushed_in_batches(self):
+        tracker = RequestFrequencyTracker(self.redis, HOT_KEYS, flush_seconds=60)
+        await tracker.record('a', 'b')
+        await tracker.record('a')
+        self.assertListEqual(await self.redis.get_top_scores(HOT_KEYS, 10), [])
+
+        await tracker.flush()
+        self.assertListEqual(await self.redis.get_top_scores(HOT_KEYS, 10), [('a', 2.0), ('b', 1.0)])
+
+    async def test_disabled(self):
+        tracker = RequestFrequencyTracker(self.redis, HOT_KEYS, flush_seconds=0, enabled=False)
+        await tracker.record('a')
+        self.assertListEqual(await self.redis.get_top_scores(HOT_KEYS, 10), [])
+
+
+class TestWeatherCacheWarmer(TestCase):
+
+    def setUp(self) -> None:
+        self.redis = get_redis()
+        self.warmer = WeatherCacheWarmer(top_n=2, rate_per_second=1000, refresh_before_seconds=300)
+        # counts left over by the view tests
+        self.warmer.view.frequency_tracker.pending.clear()
+
+    def tearDown(self) -> None:
+        async_to_sync(self.redis.flush_all)()
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_refreshes_hot_keys_before_expiry(self, mock_http_client):
+        mock_response = mock.MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = data
+        mock_http_client.return_value.get = mock.AsyncMock(return_value=mock_response)
+
+        expiring, fresh, missing, cold = (
+            weather_key('Texarkana'), weather_key('London'), weather_key('Paris'), weather_key('Rome'))
+        await self.redis.increment_scores(HOT_KEYS, {missing: 10, expiring: 5, fresh: 4, cold: 1})
+        await self.redis.set(expiring, b'{}', ex_seconds=10, raw=True)
+        await self.redis.set(fresh, b'{}', ex_seconds=3600, raw=True)
+
+        with override_settings(WARMUP_SCORE_DECAY=0.5, WARMUP_TRACKED_KEYS=3):
+            result = await self.warmer.run()
+
+        self.assertDictEqual(result, {'tracked': 2, 'due': 2, 'refreshed': 2, 'failed': 0})
+        params = [call.kwargs['params'] for call in mock_http_client.return_value.get.call_args_list]
+        self.assertCountEqual([(param['q'], param['units'], param['lang']) for param in params],
+                              [('texarkana', 'metric', 'en'), ('paris', 'metric', 'en')])
+        self.assertEqual((await self.redis.get(expiring))['data']['temperature'], 17.87)
+        self.assertEqual(await self.redis.get(fresh, raw=True), b'{}')
+        self.assertEqual((await self.redis.get(missing))['data']['city_name'], 'Texarkana')
+        # scores decay and only the hottest keys stay tracked
+        self.assertListEqual(await self.redis.get_top_scores(HOT_KEYS, 10),
+                             [(missing, 5.0), (expiring, 2.5), (fresh, 2.0)])
+
+    @mock.patch('weather.views.get_upstream_client')
+    async def test_failed_refresh(self, mock_http_client):
+        mock_http_client.return_value.get = mock.AsyncMock(side_effect=Exception('upstream down'))
+        await self.redis.increment_scores(HOT_KEYS, {weather_key('London'): 1, 'lang_en_q_London_units_metric': 1})
+
+        result = await self.warmer.run()
+
+        self.assertDictEqual(result, {'tracked': 2, 'due': 2, 'refreshed': 0, 'failed': 2})
+        self.assertEqual(mock_http_client.return_value.get.await_count, 1)
+
+    async def test_one_run_per_lock(self):
+        await self.redis.set(WARMUP_LOCK, 1, ex_seconds=60, nx=True)
+        self.assertDictEqual(await self.warmer.run(lock_seconds=60), {'skipped': True})
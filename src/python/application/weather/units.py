@@ -0,0 +1,63 @@
+"""
+Local conversion of the canonical metric weather data to the other unit types.
+
+Upstream is always asked for metric data and the cache holds one metric entry per city and
+language, the standard and imperial responses are converted from it when they are built.
+Conversions are computed on decimals and rounded half up to two decimal places, the precision of
+the upstream data, e.g. 17.87 °C are 291.02 K and 64.17 °F (64.166) and 5.14 m/s are 11.5 mph
+(11.4979...).
+"""
+from decimal import (
+    ROUND_HALF_UP,
+    Decimal,
+)
+from typing import Optional
+
+from weather.utils import UnitType
+
+CANONICAL_UNITS = UnitType.METRIC
+TEMPERATURE_FIELDS = ('temperature', 'min_temperature', 'max_temperature')
+SPEED_FIELDS = ('wind_speed',)
+
+KELVIN_OFFSET = Decimal('273.15')
+# a mile per hour in metres per second, exact by definition
+MILE_PER_HOUR = Decimal('0.44704')
+PRECISION = Decimal('0.01')
+
+
+def _round(value: Decimal) -> float:
+    return float(value.quantize(PRECISION, rounding=ROUND_HALF_UP))
+
+
+def convert_temperature(celsius: Optional[float], units) -> Optional[float]:
+    """Converts a temperature in degrees Celsius to the temperature unit of `units`."""
+
+    units = UnitType(units)
+    if celsius is None or units == CANONICAL_UNITS:
+        return celsius
+    value = Decimal(str(celsius))
+    if units == UnitType.STANDARD:
+        return _round(value + KELVIN_OFFSET)
+    return _round(value * 9 / 5 + 32)
+
+
+def convert_speed(metres_per_second: Optional[float], units) -> Optional[float]:
+    """Converts a speed in metres per second to the speed unit of `units`, standard units use m/s too."""
+
+    if metres_per_second is None or UnitType(units) != UnitType.IMPERIAL:
+        return metres_per_second
+    return _round(Decimal(str(metres_per_second)) / MILE_PER_HOUR)
+
+
+def convert_weather(data: dict, units) -> dict:
+    """Returns the metric weather data of a `WeatherSerializer` in `units`."""
+
+    converted = dict(data)
+    for field in TEMPERATURE_FIELDS:
+        if field in converted:
+            converted[field] = convert_temperature(converted[field], units)
+    for field in SPEED_FIELDS:
+        if field in converted:
+            converted[field] = convert_speed(converted[field], units)
+    return converted
+
@@ -0,0 +1,101 @@
+"""
+Micro-batching of the upstream requests of cities by their id.
+
+OpenWeather's group endpoint (`/data/2.5/group?id=2643743,2867714,...`) returns the current weather
+of up to 20 cities in one request. The `UpstreamBatcher` collects the requests of the cities which
+come in within `window_seconds` of the first one, or until there are `max_size` of them, and sends
+them as one group request. Only requests with the same units, language and api key are grouped.
+Each waiting request gets the payload of its city, the same as the one of the single city endpoint.
+
+Cities are only requested by id with a city index, see `weather.city_index`.
+"""
+import asyncio
+import weakref
+
+from api.metrics import (
+    UPSTREAM_GROUP_SIZE,
+    UPSTREAM_REQUEST_DURATION,
+)
+from api.upstream import get_upstream_client
+
+# the most city ids the group endpoint takes
+MAX_GROUP_SIZE = 20
+
+
+class CityNotInGroup(Exception):
+    """The group response has no weather of a requested city."""
+
+    def __init__(self, city_id: str):
+        super().__init__(f'No weather of the city {city_id} in the group response.')
+        self.city_id = city_id
+
+
+class UpstreamBatcher:
+    """Groups the concurrent upstream requests of cities by id into requests to the group endpoint."""
+
+    def __init__(self, url: str, window_seconds: float = 0.005, max_size: int = MAX_GROUP_SIZE):
+        self.url = url
+        self.window_seconds = window_seconds
+        self.max_size = min(max_size, MAX_GROUP_SIZE)
+        # the collecting group of each query, by the city ids of its requests, per event loop since the
+        # flush and the group request run on the loop of the group
+        self._pending = weakref.WeakKeyDictionary()
+        self._tasks = set()
+
+    def __repr__(self):
+        return f'UpstreamBatcher(url={self.url}, window_seconds={self.window_seconds}, max_size={self.max_size})'
+
+    async def fetch(self, query_params: dict) -> dict:
+        """
+        Returns the upstream payload of the city of `query_params['id']`, requested together with the
+        concurrent requests of other cities. Raises the error of the group request, `CityNotInGroup`
+        when it has no weather of the city.
+        """
+
+        loop = asyncio.get_running_loop()
+        pending = self._pending.setdefault(loop, {})
+        query = tuple(sorted((name, value) for name, value in query_params.items() if name != 'id'))
+        group = pending.get(query)
+        if group is None:
+            group = pending[query] = {}
+            loop.call_later(self.window_seconds, self._flush, pending, query, group)
+
+        city_id = str(query_params['id'])
+        future = group.get(city_id)
+        if future is None:
+            future = group[city_id] = loop.create_future()
+            if len(group) >= self.max_size:
+                self._flush(pending, query, group)
+        # a cancelled request leaves the group request to the others
+        return await asyncio.shield(future)
+
+    def _flush(self, pending: dict, query: tuple, group: dict):
+        if pending.get(query) is not group:
+            # already sent when it was full
+            return
+        del pending[query]
+        task = asyncio.ensure_future(self._send(dict(query), group))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, query_params: dict, group: dict):
+        UPSTREAM_GROUP_SIZE.observe(len(group))
+        try:
+            with UPSTREAM_REQUEST_DURATION.time(status_code='error') as labels:
+                response = await get_upstream_client().get(self.url, params={**query_params, 'id': ','.join(group)})
+                labels['status_code'] = response.status_code
+            response.raise_for_status()
+            payloads = {str(city.get('id')): city for city in response.json().get('list', [])}
+        except Exception as e:
+            for future in group.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for city_id, future in group.items():
+            if future.done():
+                continue
+            if city_id in payloads:
+                future.set_result(payloads[city_id])
+            else:
+                future.set_exception(CityNotInGroup(city_id))
@@ -1,6 +1,10 @@
 from django.urls import path
-from .views import AsyncWeatherView
+from .views import (
+    AsyncWeatherBatchView,
+    AsyncWeatherView,
+)
 
 urlpatterns = [
     path('weather/', AsyncWeatherView.as_view(), name='weather'),
+    path('weather/batch/', AsyncWeatherBatchView.as_view(), name='weather-batch'),
 ]
@@ -1,66 +1,363 @@
-import httpx
+import asyncio
+import contextlib
+import json
+from typing import Optional
+
+from django.utils.decorators import method_decorator
 from django.views import View
-from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.http import (
+    HttpResponse,
+    JsonResponse,
+)
 from django.conf import settings
 from rest_framework import status
-from drf_spectacular.utils import extend_schema
 
+from api.codecs import (
+    dumps_json,
+    loads_json,
+)
+from api.lazy import cached_classproperty
+from api.metrics import (
+    CACHE_LOOKUPS,
+    SERIALIZER_VALIDATION_DURATION,
+    UPSTREAM_REQUEST_DURATION,
+)
+from api.rate_limiter import (
+    RateLimitExceeded,
+    retry_after_header,
+)
 from api.redis_client import get_redis
+from api.singleflight import SingleFlight
+from api.upstream import (
+    UpstreamUnavailable,
+    get_upstream_client,
+)
+from weather.cache_entry import (
+    pack_entry,
+    unpack_entry,
+)
+from weather.cache_keys import (
+    HOT_KEYS,
+    city_id_query,
+    index_key_of,
+    normalize_city,
+    weather_key,
+)
+from weather.city_index import get_city_index
+from weather.descriptions import ConditionDescriptions
+from weather.frequency import RequestFrequencyTracker
 from weather.serializers import (
+    WeatherBatchResultSerializer,
     WeatherQuerySerializer,
     WeatherSerializer,
 )
-from weather.utils import get_cardinal_direction
+from weather.units import (
+    CANONICAL_UNITS,
+    convert_weather,
+)
+from weather.upstream_batcher import UpstreamBatcher
+from weather.utils import (
+    UnitType,
+    get_cardinal_direction,
+)
+
+if settings.SHOW_API_DOCUMENTATION:
+    from drf_spectacular.utils import extend_schema
+else:
+    def extend_schema(**kwargs):
+        """Leaves the view as it is, applying the schema imports most of DRF and the admin."""
+
+        return lambda func: func
+
+# upstream errors answered with a `Retry-After` instead of an upstream call
+RETRY_LATER_ERRORS = (RateLimitExceeded, UpstreamUnavailable)
+# the last field of an observation, see `AsyncWeatherView._observation`
+CONDITION_ID_FIELD = b'"condition_id":'
 
 
 class AsyncWeatherView(View):
-    redis = get_redis()
+    # the clients are built on first use, not when the module is imported
+
+    @cached_classproperty
+    def redis(cls):
+        return get_redis()
+
+    @cached_classproperty
+    def single_flight(cls):
+        # the locks stay in redis, without the L1 cache and its invalidations
+        return SingleFlight(redis=get_redis(local_cache=False), lock_seconds=settings.SINGLE_FLIGHT_LOCK_SECONDS)
+
+    @cached_classproperty
+    def descriptions(cls):
+        # the descriptions of the weather conditions per language, see `weather.descriptions`
+        return ConditionDescriptions(cls.redis)
+
+    @cached_classproperty
+    def upstream_batcher(cls):
+        # groups the concurrent upstream requests of cities by id, see `weather.upstream_batcher`
+        return UpstreamBatcher(settings.GROUP_DATA_ACCESS_URL, window_seconds=settings.UPSTREAM_GROUP_WINDOW_SECONDS,
+                               max_size=settings.UPSTREAM_GROUP_MAX_SIZE)
+
+    @cached_classproperty
+    def frequency_tracker(cls):
+        # ranks the keys for the warm-up, see `weather.warmup`
+        return RequestFrequencyTracker(
+            cls.redis, HOT_KEYS, flush_seconds=settings.WARMUP_TRACKING_FLUSH_SECONDS,
+            enabled=settings.WARMUP_TRACKING_ENABLED)
 
     @extend_schema(methods=('GET',), responses=WeatherSerializer, parameters=[WeatherQuerySerializer])
-    async def get(self, request, *args, **kwargs) -> JsonResponse:
+    async def get(self, request, *args, **kwargs) -> HttpResponse:
         # Extract query parameters from the request
         query_serializer = WeatherQuerySerializer(data=request.GET.dict())
-        if not query_serializer.is_valid():
+        if not self._is_valid(query_serializer):
             return JsonResponse(data=query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         query_params = query_serializer.data
-        sorted_query_params = dict(sorted(query_params.items()))
-        redis_key = '_'.join([f'{key}_{value}' for key, value in sorted_query_params.items()])
-        from_redis = self.redis.get(redis_key)
+        units, lang = query_params['units'], query_params['lang']
+        city = self._resolve_city(query_params['q'])
+        if city is None:
+            return self._json_response(self._unknown_city_body(query_params['q']), status.HTTP_404_NOT_FOUND)
+        city, city_id = city
+        query_params = {**query_params, 'q': city}
+        redis_key = self._get_redis_key(query_params)
+        await self.frequency_tracker.record(redis_key)
+        entry = await self._read_entry(redis_key)
+
+        # all spellings, units and languages of the city share the cache entry and so the upstream query
+        query_params = self._upstream_params(query_params, city_id)
+
+        body = None
+        if entry is not None:
+            observation, age = entry
+            # `None` while the description is missing in `lang`, it is then fetched with the weather
+            body = await self._render(observation, units, lang)
+        if body is not None:
+            is_stale = age is not None and 0 < settings.CACHE_SOFT_TTL_SECONDS <= age
+            CACHE_LOOKUPS.inc(result='stale' if is_stale else 'hit')
+            if is_stale:
+                # serve the stale data right away and refresh it once in the background, unless another
+                # worker holds the lock of the key and refreshes it
+                self.single_flight.start(redis_key, lambda: self._fetch_and_cache(redis_key, query_params))
+            response = self._json_response(body, status.HTTP_200_OK)
+            response['X-Cache'] = 'STALE' if is_stale else 'HIT'
+            if age is not None:
+                response['Age'] = int(age)
+            return response
 
+        CACHE_LOOKUPS.inc(result='miss')
+        try:
+            # concurrent misses of the entry share a single upstream request, whatever their language
+            joined = self.single_flight.in_flight(redis_key)
+            body, status_code = await self._fetch_shared(redis_key, query_params)
+            if joined and status_code == status.HTTP_200_OK and await self._render(body, units, lang) is None:
+                # the joined request was in another language, fetch once more for the description in `lang`
+                body, status_code = await self._fetch_shared(redis_key, query_params)
+        except RETRY_LATER_ERRORS as e:
+            # fail fast while the upstream budget is used up or upstream is failing
+            response = self._json_response(self._retry_later_body(e), self._retry_later_status(e))
+            response['Retry-After'] = retry_after_header(e.retry_after)
+            return response
+        if status_code == status.HTTP_200_OK:
+            body = await self._render(body, units, lang, fallback=True)
+        response = self._json_response(body, status_code)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def _read_entry(self, redis_key: str):
+        from_redis = await self.redis.get(redis_key, raw=True)
         if from_redis:
-            return JsonResponse(status=status.HTTP_200_OK, data=from_redis)
+            return unpack_entry(from_redis)
+        return None
+
+    async def _fetch_shared(self, redis_key: str, query_params: dict) -> tuple:
+        """
+        Fetches and caches the entry once for the concurrent callers of this worker and, with the lock, of
+        the other workers. The flight is keyed by the entry alone, like the stale refresh, the callers of
+        the other workers wait until the entry has the description in their language.
+        """
+
+        return await self.single_flight.do(
+            redis_key,
+            lambda: self._fetch_and_cache(redis_key, query_params),
+            read_cached=lambda: self._read_cached(redis_key, query_params['lang']),
+        )
+
+    async def _read_cached(self, redis_key: str, lang):
+        entry = await self._read_entry(redis_key)
+        if entry is not None and await self._render(entry[0], CANONICAL_UNITS, lang) is not None:
+            return entry[0], status.HTTP_200_OK
+        return None
+
+    async def _render(self, body: bytes, units, lang, fallback: bool = False) -> Optional[bytes]:
+        """
+        Builds the response body of a cached metric observation in `units` and `lang`. Returns `None`
+        while the description of its condition is not known in `lang`, unless it is left empty as `fallback`.
+        """
+
+        if UnitType(units) == CANONICAL_UNITS:
+            # metric bodies are not decoded, only their trailing condition id is replaced with the description
+            if CONDITION_ID_FIELD not in body:
+                return body
+            head, _, condition_id = body.rpartition(CONDITION_ID_FIELD)
+            if condition_id[:-1].isdigit() and condition_id.endswith(b'}'):
+                description = await self.descriptions.get(int(condition_id[:-1]), lang)
+                if description is None and not fallback:
+                    return None
+                return b'%s"description":%s}' % (head, dumps_json(description))
+        return await self._render_data(loads_json(body), units, lang, fallback)
+
+    async def _render_data(self, data, units, lang, fallback: bool = False) -> Optional[bytes]:
+        if not isinstance(data, dict):
+            return dumps_json(data)
+        # entries without a condition id have their description, e.g. the ones written before the split
+        if 'condition_id' in data:
+            data = dict(data)
+            condition_id = data.pop('condition_id')
+            description = None
+            if condition_id is not None:
+                description = await self.descriptions.get(condition_id, lang)
+                if description is None and not fallback:
+                    return None
+            data['description'] = description
+        return dumps_json(convert_weather(data, units))
+
+    @staticmethod
+    def _condition_id(observation) -> Optional[int]:
+        if isinstance(observation, dict):
+            return observation.get('condition_id')
+        return None
+
+    @staticmethod
+    def _json_response(body: bytes, status_code: int) -> HttpResponse:
+        return HttpResponse(body, content_type='application/json', status=status_code)
+
+    @staticmethod
+    def _retry_later_body(error: Exception) -> bytes:
+        return dumps_json({'status': 'error', 'error_message': str(error), 'retry_after': error.retry_after})
+
+    @staticmethod
+    def _retry_later_status(error: Exception) -> int:
+        if isinstance(error, RateLimitExceeded):
+            return settings.UPSTREAM_RATE_LIMIT_STATUS
+        return status.HTTP_503_SERVICE_UNAVAILABLE
+
+    @staticmethod
+    def _resolve_city(q: str) -> Optional[tuple]:
+        """
+        Returns the query of the city of `q` by its upstream id with a city index, see `weather.city_index`,
+        and that id, `None` for a city which is not in it. Without an index `q` is used as it is, without id.
+        """
 
-        # adds api key into query parameter
-        query_params['appid'] = settings.API_KEY
+        city_index = get_city_index()
+        if city_index is None:
+            return q, None
+        city = city_index.resolve(q)
+        return (city_id_query(city.id), city.id) if city is not None else None
+
+    @staticmethod
+    def _unknown_city_body(q: str) -> bytes:
+        suggestions = [city._asdict() for city in get_city_index().suggest(q)]
+        return dumps_json({'status': 'error', 'error_message': f'Unknown city: {q}', 'suggestions': suggestions})
+
+    @staticmethod
+    def _get_redis_key(query_params: dict) -> str:
+        # one entry per city, in metric units and without the description, see `weather.cache_keys`
+        return weather_key(query_params['q'])
+
+    @staticmethod
+    def _upstream_params(query_params: dict, city_id=None) -> dict:
+        """
+        Returns the upstream query of a validated query, with the normalized city or the `city_id` of
+        `_resolve_city`, metric units and the api key.
+        """
+
+        upstream_params = {**query_params, 'units': CANONICAL_UNITS.value, 'appid': settings.API_KEY}
+        if city_id is None:
+            upstream_params['q'] = normalize_city(query_params['q'])
+        else:
+            del upstream_params['q']
+            upstream_params['id'] = str(city_id)
+        return upstream_params
+
+    async def _fetch_and_cache(self, redis_key: str, query_params: dict) -> tuple:
+        body, status_code, cacheable = await self._fetch_weather(query_params)
+        if cacheable:
+            await self._store(redis_key, body)
+        return body, status_code
+
+    async def _store(self, redis_key: str, body: bytes):
+        # store in redis cache, its TTL is the hard TTL of the entry
+        return await self.redis.set(redis_key, pack_entry(body), raw=True, index=index_key_of(redis_key))
+
+    async def _fetch_weather(self, query_params: dict) -> tuple:
+        """
+        Fetches the weather data, returns the JSON body of its observation with its status code and if it
+        can be cached, see `_observation`.
+        Raises `RateLimitExceeded` when the upstream call budget is used up and
+        `UpstreamUnavailable` while upstream is failing.
+        """
 
         # Make an asynchronous HTTPS request with query parameters
         try:
-            response = await self._fetch_data(query_params)
+            data, status_code = await self._fetch_payload(query_params)
+        except RETRY_LATER_ERRORS:
+            raise
         except Exception as e:
             error_message = f'Error making request to API: {str(e)}'
-            return JsonResponse({'status': 'error', 'error_message': error_message})
+            return dumps_json({'status': 'error', 'error_message': error_message}), status.HTTP_200_OK, False
 
-        data = response.json()
         processed_data = await self._process_data(data=data)
         serializer = WeatherSerializer(data=processed_data)
-        if serializer.is_valid():
-            data = serializer.data
-            # store in redis cache
-            self.redis.set(redis_key, data)
-            return JsonResponse(data=data, status=response.status_code)
+        if self._is_valid(serializer):
+            # the validated data already has the representation of these fields, skip `.data`
+            observation = await self._observation(serializer.validated_data, data, query_params['lang'])
+            return observation, status_code, True
 
-        return JsonResponse(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return dumps_json(serializer.errors), status.HTTP_400_BAD_REQUEST, False
+
+    async def _observation(self, weather: dict, data: dict, lang) -> bytes:
+        """Returns the language independent body of the weather, the description is stored by its condition id."""
+
+        observation = dict(weather)
+        description = observation.pop('description', None)
+        conditions = data.get('weather') or [{}]
+        # last, so `_render` finds it at the end of the body
+        observation['condition_id'] = conditions[0].get('id')
+        if observation['condition_id'] is not None and description is not None:
+            await self.descriptions.add(observation['condition_id'], lang, description)
+        return dumps_json(observation)
+
+    @staticmethod
+    def _is_valid(serializer) -> bool:
+        serializer_name = serializer.__class__.__name__
+        with SERIALIZER_VALIDATION_DURATION.time(serializer=serializer_name, outcome='invalid') as labels:
+            is_valid = serializer.is_valid()
+            labels['outcome'] = 'valid' if is_valid else 'invalid'
+        return is_valid
+
+    async def _fetch_payload(self, query_params: dict) -> tuple:
+        """Returns the upstream payload of a query with its status code, cities by id are requested in groups."""
+
+        if self._is_grouped(query_params):
+            return await self.upstream_batcher.fetch(query_params), status.HTTP_200_OK
+        response = await self._fetch_data(query_params)
+        return response.json(), response.status_code
+
+    @staticmethod
+    def _is_grouped(query_params: dict) -> bool:
+        return settings.UPSTREAM_GROUP_ENABLED and 'id' in query_params
 
     @staticmethod
     async def _fetch_data(query_params: dict):
-        async with httpx.AsyncClient() as client:
-            # Make the asynchronous GET request with query parameters
-            response = await client.get(settings.DATA_ACCESS_URL, params=query_params)
+        with UPSTREAM_REQUEST_DURATION.time(status_code='error') as labels:
+            # Make the asynchronous GET request with query parameters, retried within its deadline
+            response = await get_upstream_client().get(settings.DATA_ACCESS_URL, params=query_params)
+            labels['status_code'] = response.status_code
 
-            # Check if the request was successful (status code 2xx)
-            response.raise_for_status()
+        # Check if the request was successful (status code 2xx)
+        response.raise_for_status()
 
-            return response
+        return response
 
     @staticmethod
     async def _process_data(data: dict) -> dict:
@@ -78,3 +375,134 @@ class AsyncWeatherView(View):
         }
 
         return processed_data
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncWeatherBatchView(AsyncWeatherView):
+    http_method_names = ['post', 'options']
+
+    @extend_schema(methods=('POST',), request=WeatherQuerySerializer(many=True),
+                   responses=WeatherBatchResultSerializer(many=True))
+    async def post(self, request, *args, **kwargs) -> HttpResponse:
+        try:
+            queries = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'status': 'error', 'error_message': 'Request body must be valid JSON.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(queries, list):
+            return JsonResponse({'status': 'error', 'error_message': 'Request body must be a list of queries.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        if len(queries) > settings.WEATHER_BATCH_MAX_SIZE:
+            error_message = f'A batch can have at most {settings.WEATHER_BATCH_MAX_SIZE} queries.'
+            return JsonResponse({'status': 'error', 'error_message': error_message},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        results = [None] * len(queries)
+        valid_queries = {}
+        redis_keys = {}
+        query_params_by_key = {}
+        for index, query in enumerate(queries):
+            query_serializer = WeatherQuerySerializer(data=query)
+            if not self._is_valid(query_serializer):
+                results[index] = self._batch_item(
+                    query, status.HTTP_400_BAD_REQUEST, 'errors', dumps_json(query_serializer.errors))
+                continue
+            city = self._resolve_city(query_serializer.data['q'])
+            if city is None:
+                results[index] = self._batch_item(query_serializer.data, status.HTTP_404_NOT_FOUND, 'errors',
+                                                  self._unknown_city_body(query_serializer.data['q']))
+                continue
+            city, city_id = city
+            valid_queries[index] = query_serializer.data
+            query_params = {**valid_queries[index], 'q': city}
+            redis_keys[index] = self._get_redis_key(query_params)
+            query_params_by_key[redis_keys[index]] = self._upstream_params(query_params, city_id)
+
+        await self.frequency_tracker.record(*redis_keys.values())
+        # resolve all cache keys in one round trip
+        unique_keys = list(query_params_by_key)
+        entries = {
+            redis_key: unpack_entry(entry) if entry else None
+            for redis_key, entry in zip(unique_keys, await self.redis.get_many(unique_keys, raw=True))
+        }
+        observations = {redis_key: loads_json(entry[0]) for redis_key, entry in entries.items() if entry is not None}
+        # and the descriptions of their conditions in the requested languages in at most one more
+        conditions = set()
+        for index, redis_key in redis_keys.items():
+            condition_id = self._condition_id(observations.get(redis_key))
+            if condition_id is not None:
+                conditions.add((condition_id, valid_queries[index]['lang']))
+        await self.descriptions.get_many(conditions)
+
+        bodies = {}
+        misses = {}
+        for index, redis_key in redis_keys.items():
+            query = valid_queries[index]
+            if redis_key in observations:
+                bodies[index] = await self._render_data(observations[redis_key], query['units'], query['lang'])
+            if bodies.get(index) is None:
+                # a missing entry or a description missing in the language, both come with the upstream query
+                misses[redis_key, query['lang']] = {**query_params_by_key[redis_key], 'lang': query['lang']}
+        lookups = {(redis_key, valid_queries[index]['lang']) for index, redis_key in redis_keys.items()}
+        CACHE_LOOKUPS.inc(len(lookups) - len(misses), result='hit')
+        CACHE_LOOKUPS.inc(len(misses), result='miss')
+
+        for redis_key, entry in entries.items():
+            if entry is not None and entry[1] is not None and 0 < settings.CACHE_SOFT_TTL_SECONDS <= entry[1]:
+                query_params = query_params_by_key[redis_key]
+                self.single_flight.start(
+                    redis_key, lambda key=redis_key, params=query_params: self._fetch_and_cache(key, params))
+        fetched = await self._fetch_many(misses)
+
+        for index, redis_key in redis_keys.items():
+            query = valid_queries[index]
+            if bodies.get(index) is not None:
+                results[index] = self._batch_item(query, status.HTTP_200_OK, 'data', bodies[index])
+                continue
+
+            body, status_code, cacheable = fetched[redis_key, query['lang']]
+            if cacheable:
+                body = await self._render(body, query['units'], query['lang'], fallback=True)
+                results[index] = self._batch_item(query, status_code, 'data', body)
+            else:
+                error_status = status_code if status_code >= 400 else status.HTTP_502_BAD_GATEWAY
+                results[index] = self._batch_item(query, error_status, 'errors', body)
+
+        return self._json_response(b'[%s]' % b','.join(results), status.HTTP_200_OK)
+
+    @staticmethod
+    def _batch_item(query, status_code: int, field: str, body: bytes) -> bytes:
+        """Builds the JSON of a batch result around an already encoded body."""
+
+        return b'{"query":%s,"status":%d,"%s":%s}' % (dumps_json(query), status_code, field.encode(), body)
+
+    async def _fetch_many(self, query_params_by_key: dict) -> dict:
+        """
+        Fetches the misses by their `(redis key, language)` concurrently and writes the new entries back
+        in one pipeline.
+        """
+
+        if not query_params_by_key:
+            return {}
+
+        semaphore = asyncio.Semaphore(settings.WEATHER_BATCH_UPSTREAM_CONCURRENCY)
+
+        async def fetch(query_params: dict) -> tuple:
+            # grouped requests all wait for the window together, they are bounded by the group size instead
+            async with contextlib.nullcontext() if self._is_grouped(query_params) else semaphore:
+                try:
+                    return await self._fetch_weather(query_params)
+                except RETRY_LATER_ERRORS as e:
+                    return self._retry_later_body(e), self._retry_later_status(e), False
+
+        responses = await asyncio.gather(*[fetch(query_params) for query_params in query_params_by_key.values()])
+        fetched = dict(zip(query_params_by_key, responses))
+        entries = {}
+        indexes = {}
+        for (redis_key, lang), (body, _, cacheable) in fetched.items():
+            if cacheable:
+                entries[redis_key] = pack_entry(body)
+                indexes[redis_key] = index_key_of(redis_key)
+        if entries:
+            await self.redis.set_many(entries, raw=True, indexes=indexes)
+        return fetched
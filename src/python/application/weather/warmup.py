@@ -0,0 +1,148 @@
+"""
+Warm-up of the hottest weather cache keys.
+
+`AsyncWeatherView` counts the requests per cache key in the sorted set `HOT_KEYS`. A warm-up run
+refreshes the top keys which are missing or expire soon through the view's upstream fetch, so
+the hot cities never miss, then decays all scores so the ranking follows recent traffic.
+"""
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+
+from api.metrics import CACHE_WARMUP_REFRESHES
+from weather.cache_keys import (
+    HOT_KEYS,
+    parse_city_id,
+    parse_weather_key,
+)
+from weather.utils import LanguageType
+from weather.views import (
+    RETRY_LATER_ERRORS,
+    AsyncWeatherView,
+)
+
+logger = logging.getLogger(__name__)
+
+WARMUP_LOCK = f'lock:{HOT_KEYS}'
+
+
+class WeatherCacheWarmer:
+    """Refreshes the `top_n` hottest keys with at most `concurrency` requests and `rate_per_second` starts."""
+
+    def __init__(
+            self,
+            top_n: int = None,
+            concurrency: int = None,
+            rate_per_second: float = None,
+            refresh_before_seconds: int = None,
+            view: AsyncWeatherView = None,
+    ):
+        self.top_n = top_n or settings.WARMUP_TOP_N
+        self.concurrency = concurrency or settings.WARMUP_CONCURRENCY
+        self.rate_per_second = rate_per_second or settings.WARMUP_RATE_PER_SECOND
+        if refresh_before_seconds is None:
+            refresh_before_seconds = settings.WARMUP_REFRESH_BEFORE_SECONDS
+        self.refresh_before_seconds = refresh_before_seconds
+        self.view = view or AsyncWeatherView()
+        self.redis = self.view.redis
+        self._next_start = 0.0
+
+    def __repr__(self):
+        return f'WeatherCacheWarmer(top_n={self.top_n}, concurrency={self.concurrency})'
+
+    async def run(self, lock_seconds: int = 0) -> dict:
+        """
+        Refreshes the hot keys which are due and returns the counts of the run.
+        With `lock_seconds`, only one run per that many seconds happens across all workers.
+        """
+
+        if lock_seconds and not await self.redis.set(WARMUP_LOCK, 1, ex_seconds=lock_seconds, nx=True):
+            return {'skipped': True}
+
+        started_at = time.monotonic()
+        await self.view.frequency_tracker.flush()
+        keys = [key for key, _ in await self.redis.get_top_scores(HOT_KEYS, self.top_n)]
+        ttls = await self.redis.get_ttls(keys)
+        # -2 is a missing key, -1 a key without expiry which never needs a refresh
+        due = [key for key, ttl in zip(keys, ttls) if ttl == -2 or 0 <= ttl < self.refresh_before_seconds]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        self._next_start = time.monotonic()
+        refreshed = await asyncio.gather(*[self._refresh(key, semaphore) for key in due])
+
+        await self.redis.decay_scores(HOT_KEYS, settings.WARMUP_SCORE_DECAY, settings.WARMUP_TRACKED_KEYS)
+        result = {
+            'tracked': len(keys),
+            'due': len(due),
+            'refreshed': sum(refreshed),
+            'failed': len(due) - sum(refreshed),
+        }
+        logger.info('Warmed up %d of %d due keys in %.2fs, %d failed.',
+                    result['refreshed'], result['due'], time.monotonic() - started_at, result['failed'])
+        return result
+
+    async def _wait_for_start(self):
+        """Spaces the upstream requests out to `rate_per_second`, on top of the shared upstream rate limit."""
+
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + 1 / self.rate_per_second
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _refresh(self, redis_key: str, semaphore: asyncio.Semaphore) -> bool:
+        query = parse_weather_key(redis_key)
+        if query is None:
+            CACHE_WARMUP_REFRESHES.inc(outcome='skipped')
+            return False
+
+        async with semaphore:
+            await self._wait_for_start()
+            # the entry is the same in all languages, the description of the refresh is stored in English
+            # the ids in the keys were written by `_resolve_city`, user queries can not start with `#`
+            query_params = self.view._upstream_params(
+                {'lang': LanguageType.ENGLISH.value, **query}, parse_city_id(query['q']))
+            try:
+                body, status_code, cacheable = await self.view._fetch_weather(query_params)
+            except RETRY_LATER_ERRORS:
+                # the upstream budget goes to the user requests first, nothing is sent while upstream is failing
+                CACHE_WARMUP_REFRESHES.inc(outcome='limited')
+                return False
+            if cacheable:
+                await self.view._store(redis_key, body)
+            else:
+                logger.warning('Could not refresh %s: %s', redis_key, body)
+
+        CACHE_WARMUP_REFRESHES.inc(outcome='ok' if cacheable else 'error')
+        return cacheable
+
+
+class WarmupScheduler:
+    """Runs the warm-up every `interval_seconds` in the background, one run per interval across all workers."""
+
+    def __init__(self, warmer: WeatherCacheWarmer = None, interval_seconds: int = None):
+        self.warmer = warmer or WeatherCacheWarmer()
+        self.interval_seconds = interval_seconds or settings.WARMUP_INTERVAL_SECONDS
+        self._task = None
+
+    def __repr__(self):
+        return f'WarmupScheduler(interval_seconds={self.interval_seconds})'
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.warmer.run(lock_seconds=self.interval_seconds)
+            except Exception:
+                logger.exception('Cache warm-up failed.')
+            await asyncio.sleep(self.interval_seconds)